@@ -5,13 +5,15 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from .forms import SignUpForm, EmailLoginForm, EmailChangeForm, CustomPasswordChangeForm
 from .models import User
 from django.contrib.auth.decorators import login_required
-from restaurants.models import Visit
-from django.db.models import Avg
+from restaurants.models import Restaurant
+from restaurants.page_cache import conditional_page
 from django.shortcuts import render
 from django.views.generic import UpdateView, View
 from django.contrib import messages, auth
 from django.contrib.auth import get_user_model, update_session_auth_hash
 from django.shortcuts import redirect
+from django.conf import settings
+from django.db.models import Count, Max
 
 User = get_user_model()
 
@@ -50,18 +52,34 @@ class CustomLogoutView(LogoutView):
 class HomeView(LoginRequiredMixin, TemplateView):
     template_name = "accounts/home.html"
 
-    
+
+def mypage_validators(user_id, **kwargs):
+    # 上位3件・グラフはお店と訪問から作るので、お店の件数と最終更新日時で足りる
+    # （訪問の追加・削除は訪問サマリーの更新でお店の updated_at も動く）
+    row = Restaurant.objects.filter(user_id=user_id).aggregate(updated_at=Max("updated_at"), count=Count("id"))
+    return row["updated_at"], row["count"]
+
+
 @login_required
+@conditional_page(mypage_validators)
 def mypage(request):
-    top3_visits = (
-        Visit.objects
-        .filter(restaurant__user=request.user, rating__isnull=False)
-        .values("restaurant__store_name", "restaurant__genre")
-        .annotate(avg_rating=Avg("rating"))
+    # ★ Restaurant.avg_rating（訪問サマリー）のインデックスで上位3件を取る
+    top3_restaurants = (
+        Restaurant.objects
+        .filter(user=request.user, avg_rating__isnull=False)
+        .only("store_name", "genre", "avg_rating")
         .order_by("-avg_rating")[:3]
     )
 
-    return render(request, "accounts/mypage.html", {"top3_visits": top3_visits})
+    # ★ グラフの描画方法（server: PNG画像 / client: ブラウザで描画）
+    chart_mode = request.GET.get("charts", settings.CHART_RENDER_MODE)
+    if chart_mode not in ("server", "client"):
+        chart_mode = settings.CHART_RENDER_MODE
+
+    return render(request, "accounts/mypage.html", {
+        "top3_restaurants": top3_restaurants,
+        "chart_mode": chart_mode,
+    })
 
 
 class EmailChangeView(LoginRequiredMixin, View):
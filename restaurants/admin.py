@@ -1,10 +1,12 @@
 from django.contrib import admin
-from .models import Restaurant, Visit, VisitImage, Tag, SuggestWord
+from .models import Restaurant, Visit, VisitImage, Tag, SuggestWord, Job, DeadJob
 
 admin.site.register(Restaurant)
 admin.site.register(Visit)
 admin.site.register(VisitImage)
 admin.site.register(Tag)
 admin.site.register(SuggestWord)
+admin.site.register(Job)
+admin.site.register(DeadJob)
 
 # Register your models here.
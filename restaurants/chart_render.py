@@ -0,0 +1,231 @@
+"""訪問グラフのPNG描画エンジン
+
+pyplot のグローバル状態を使わず Figure / FigureCanvasAgg だけで描画する。
+matplotlib の読み込みは重いため、このモジュールは最初にグラフが要求されたときに
+charts.chart_response から読み込まれる（通常のページを返すワーカーは読み込まない）。
+描画はプロセスプールで行い、同時に受け付ける数（キューの深さ）と待ち時間に
+上限を設けている。CHART_RENDER_WORKERS = 0 のときはリクエストのスレッド内で描画する。
+"""
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import matplotlib
+from matplotlib import font_manager
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from django.conf import settings
+
+
+FONT_FAMILY = ['Noto Sans CJK JP', 'IPAexGothic', 'TakaoGothic', 'Meiryo', 'sans-serif']
+
+
+class ChartRenderError(Exception):
+    pass
+
+
+class ChartRenderBusy(ChartRenderError):
+    """描画待ちが上限に達している"""
+
+
+class ChartRenderTimeout(ChartRenderError):
+    """描画が制限時間内に終わらなかった"""
+
+
+_fonts_ready = False
+
+
+def configure_fonts():
+    """日本語フォントの設定とフォントキャッシュの読み込みをプロセスごとに1回だけ行う"""
+    global _fonts_ready
+    if _fonts_ready:
+        return
+
+    matplotlib.rcParams['font.family'] = FONT_FAMILY
+    # 最初の描画でフォント探索が走らないよう、ここで解決しておく
+    font_manager.findfont(font_manager.FontProperties(family=FONT_FAMILY))
+    _fonts_ready = True
+
+
+# -----------------------------
+# ★ 描画処理（ワーカープロセス内で実行される）
+# -----------------------------
+def _new_figure(figsize):
+    fig = Figure(figsize=figsize, facecolor="white")
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _to_png(fig, **kwargs):
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight", facecolor="white", **kwargs)
+    return buf.getvalue()
+
+
+def render_message(data):
+    fig = _new_figure(data.get("figsize", (6, 3)))
+    ax = fig.add_subplot()
+    ax.text(0.5, 0.5, data["text"], fontsize=data.get("fontsize", 20), ha="center", va="center")
+    ax.set_axis_off()
+    return _to_png(fig, dpi=data.get("dpi"))
+
+
+def render_monthly(series):
+    months = [s["label"] for s in series]
+    counts = [s["count"] for s in series]
+
+    fig = _new_figure((9, 4))
+    ax = fig.add_subplot()
+    x_positions = range(len(months))
+    bars = ax.bar(x_positions, counts, color="#5a8dee", width=0.6)
+
+    ax.set_title("月別訪問数", fontsize=30, fontweight="bold")
+
+    ax.tick_params(axis='x', labelsize=30, width=1.2)
+    ax.tick_params(axis='y', labelsize=30, width=1.2)
+
+    ax.set_xticks(x_positions)
+    ax.set_xticklabels(months, fontsize=30, fontweight="bold")
+
+    ax.set_ylim(0, 20)
+    ax.set_yticks(range(0, 21, 5))
+
+    ax.grid(axis="y", linestyle="--", alpha=0.4)
+    ax.set_facecolor("white")
+
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(
+            bar.get_x() + bar.get_width() / 2,
+            height + 0.4,
+            f"{int(height)}",
+            ha="center",
+            va="bottom",
+            fontsize=30,
+            fontweight="bold",
+            color="#333"
+        )
+
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def render_top3_genre(series):
+    genres = [s["genre"] for s in series]
+    counts = [s["count"] for s in series]
+
+    fig = _new_figure((5, 3))
+    ax = fig.add_subplot()
+    ax.bar(genres, counts, color="orange")
+    for i, v in enumerate(counts):
+        ax.text(i, v + 0.2, str(v), ha="center")
+
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def render_genre(series):
+    genres = [s["genre"] for s in series]
+    counts = [s["count"] for s in series]
+
+    fig = _new_figure((5, 3))
+    ax = fig.add_subplot()
+    bars = ax.barh(genres, counts, color="#4a6cf7", alpha=0.85, height=0.5)
+
+    ax.set_title("")
+    fig.text(0, 0.95, "ジャンル別訪問数", fontsize=19, fontweight="bold", ha="left", va="center")
+
+    ax.tick_params(axis='y', labelsize=16, length=0)
+    ax.tick_params(axis='x', bottom=False, labelbottom=False)
+    ax.invert_yaxis()
+
+    for i, bar in enumerate(bars):
+        ax.text(bar.get_width() + 0.05, bar.get_y() + bar.get_height() / 2,
+                str(counts[i]), va='center', fontsize=20, fontweight="bold", color="#333")
+
+    ax.set_xlabel("")
+    ax.set_ylabel("")
+    ax.grid(False)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+
+    fig.subplots_adjust(left=0.2, right=0.95, top=0.9, bottom=0.1)
+    return _to_png(fig, dpi=150)
+
+
+RENDERERS = {
+    "message": render_message,
+    "monthly": render_monthly,
+    "genre": render_genre,
+    "top3_genre": render_top3_genre,
+}
+
+
+def _render(kind, data):
+    configure_fonts()
+    return RENDERERS[kind](data)
+
+
+# -----------------------------
+# ★ プロセスプール
+# -----------------------------
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+
+
+def _get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.CHART_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=configure_fonts,
+            )
+            _slots = threading.BoundedSemaphore(settings.CHART_RENDER_MAX_QUEUE)
+        return _pool, _slots
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def render_chart(kind, data):
+    """グラフをPNGのバイト列として描画する
+
+    待ちが CHART_RENDER_MAX_QUEUE 件に達していれば ChartRenderBusy、
+    CHART_RENDER_TIMEOUT 秒で終わらなければ ChartRenderTimeout を送出する。
+    """
+    if not settings.CHART_RENDER_WORKERS:
+        return _render(kind, data)
+
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise ChartRenderBusy(kind)
+
+    try:
+        future = pool.submit(_render, kind, data)
+    except BrokenProcessPool:
+        slots.release()
+        _reset_pool(pool)
+        raise ChartRenderError(kind)
+
+    # 枠は描画が実際に終わった時点で返す（タイムアウトしても走り続けるため）
+    future.add_done_callback(lambda _: slots.release())
+
+    try:
+        return future.result(timeout=settings.CHART_RENDER_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise ChartRenderTimeout(kind)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise ChartRenderError(kind)
@@ -0,0 +1,146 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import GenreVisitStat, MonthlyVisitStat, Restaurant
+
+
+# 描画済みPNGの保持期間（キーにデータ指紋が入るので古いものは自然に使われなくなる）
+CHART_CACHE_TIMEOUT = 60 * 60 * 24
+
+DATA_VERSION_KEY = "savoiry:data_version:{user_id}"
+
+
+def get_data_version(user_id):
+    """ユーザーごとのデータ版数（最終更新時刻のミリ秒）を返す"""
+    key = DATA_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns() // 1_000_000
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def _next_data_version(user_id):
+    key = DATA_VERSION_KEY.format(user_id=user_id)
+    version = max(time.time_ns() // 1_000_000, (cache.get(key) or 0) + 1)
+    cache.set(key, version, None)
+    return version
+
+
+def bump_data_version(user_id):
+    """お店・訪問・写真・タグが変わったときに呼び、キャッシュ済みのグラフとページを無効にする"""
+    version = _next_data_version(user_id)
+    if transaction.get_connection().in_atomic_block:
+        # コミット前に別のリクエストが古い内容を新しい版数で保存しても使われないよう、コミット後にもう一度上げる
+        transaction.on_commit(lambda: _next_data_version(user_id))
+    return version
+
+
+def chart_fingerprint(user):
+    """(訪問件数, お店の最終更新日時, データ版数) をグラフの指紋として返す
+
+    件数はジャンル別の集計表の合計。訪問の追加・変更・削除は訪問サマリーの更新でお店の
+    updated_at も進めるので、データ版数がワーカーごと（locmem）でも古いグラフを返さない。
+    """
+    count = GenreVisitStat.objects.filter(user=user).aggregate(total=Sum("count"))["total"] or 0
+    updated_at = Restaurant.objects.filter(user=user).aggregate(last=Max("updated_at"))["last"]
+    return count, updated_at, get_data_version(user.pk)
+
+
+def visit_stats(user):
+    """月別・ジャンル別・ジャンルTOP3の集計を返す
+
+    訪問履歴ではなく集計表（restaurants.rollups）を読むので、履歴の長さによらず
+    月数・ジャンル数の行を読むだけで済む。
+    """
+    monthly_series = [
+        {
+            "month": month.strftime("%Y-%m"),
+            "label": f"{month.year}年{month.month}月",
+            "count": count,
+        }
+        for month, count in (
+            MonthlyVisitStat.objects.filter(user=user, count__gt=0)
+            .order_by("month")
+            .values_list("month", "count")
+        )
+    ]
+    genre_series = [
+        {"genre": genre, "count": count}
+        for genre, count in (
+            GenreVisitStat.objects.filter(user=user, count__gt=0)
+            .order_by("-count", "genre")
+            .values_list("genre", "count")
+        )
+    ]
+
+    return {
+        "monthly": monthly_series,
+        "genre": genre_series,
+        "top3_genre": genre_series[:3],
+    }
+
+
+def chart_response(kind, data):
+    """描画エンジンでPNGを作りレスポンスにする（混雑・タイムアウト時は 503）"""
+    # matplotlib ごと、最初のグラフ要求時にだけ読み込む
+    from .chart_render import ChartRenderError, render_chart
+
+    try:
+        png = render_chart(kind, data)
+    except ChartRenderError:
+        response = HttpResponse(status=503)
+        response["Retry-After"] = "2"
+        return response
+    return HttpResponse(png, content_type="image/png")
+
+
+def cached_chart(chart_type):
+    """グラフ画像（集計JSON）ビューを指紋つきキャッシュと ETag / Last-Modified で包む
+
+    キャッシュに当たれば matplotlib には一切触れず、ブラウザが同じ ETag を
+    送ってきた場合は 304 を返す。
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+
+            count, updated_at, version = chart_fingerprint(request.user)
+            raw = f"{request.user.pk}:{chart_type}:{count}:{updated_at}:{version}"
+            etag = quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+            last_modified = max(int(updated_at.timestamp()) if updated_at else 0, version // 1000)
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+            if response is None:
+                cache_key = f"savoiry:chart:{hashlib.sha1(raw.encode()).hexdigest()}"
+                cached = cache.get(cache_key)
+
+                if cached is None:
+                    response = view_func(request, *args, **kwargs)
+                    if response.status_code == 200:
+                        cached = (response.content, response["Content-Type"])
+                        cache.set(cache_key, cached, CHART_CACHE_TIMEOUT)
+                else:
+                    content, content_type = cached
+                    response = HttpResponse(content, content_type=content_type)
+
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
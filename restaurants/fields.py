@@ -0,0 +1,125 @@
+"""曜日などの複数選択を1つの整数（ビット列）で持つフィールド
+
+DAY_CHOICES の n 番目の選択肢を 1 << n のビットに割り当てる（月 = 1、火 = 2、水 = 4 …）。
+値は DaySet（int のサブクラス）で、文字列にすると「月、火」になる。
+
+    Restaurant.objects.filter(holiday__has_any=["月", "火"])   # 月曜か火曜が休み
+    Restaurant.objects.filter(holiday__has_all=["土", "日"])   # 土日とも休み
+
+どちらも「holiday & マスク」の1つの条件になる。
+"""
+import re
+
+from django import forms
+from django.db import models
+
+_SPLIT = re.compile(r"[、,，\s]+")
+
+
+class DaySet(int):
+    """選択された値のビット列（int として保存・比較できる）"""
+
+    def __new__(cls, value, choices):
+        self = super().__new__(cls, value)
+        self.choices = choices
+        return self
+
+    def __iter__(self):
+        return (value for bit, (value, _) in enumerate(self.choices) if self & (1 << bit))
+
+    def __str__(self):
+        return "、".join(self)
+
+    def __repr__(self):
+        return f"<DaySet {str(self) or '-'}>"
+
+    def __reduce__(self):
+        # pickle / copy で choices も渡す（キャッシュ・セッション・setUpTestData で使われる）
+        return (DaySet, (int(self), self.choices))
+
+
+def to_mask(value, choices):
+    """値のリスト・「月、火」のような文字列・整数をビット列にする（知らない値は無視）"""
+    if value is None or value == "":
+        return 0
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, str):
+        value = _SPLIT.split(value)
+
+    bits = {}
+    for bit, (key, label) in enumerate(choices):
+        bits[key] = bits[label] = 1 << bit
+
+    mask = 0
+    for item in value:
+        mask |= bits.get(str(item).strip(), 0)
+    return mask
+
+
+class DaySetFormField(forms.MultipleChoiceField):
+    """複数選択をそのまま受け取り、DaySet にして返す"""
+
+    def prepare_value(self, value):
+        if isinstance(value, int):
+            return list(DaySet(value, self.choices))
+        return value
+
+    def clean(self, value):
+        value = super().clean(value)
+        return DaySet(to_mask(value, self.choices), self.choices)
+
+    def has_changed(self, initial, data):
+        return to_mask(initial, self.choices) != to_mask(data, self.choices)
+
+
+class DaySetField(models.PositiveSmallIntegerField):
+
+    def __init__(self, *args, days=(), **kwargs):
+        self.days = list(days)
+        kwargs.setdefault("default", 0)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["days"] = self.days
+        if kwargs.get("default") == 0:
+            del kwargs["default"]
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else DaySet(value, self.days)
+
+    def to_python(self, value):
+        return DaySet(to_mask(value, self.days), self.days)
+
+    def get_prep_value(self, value):
+        return super().get_prep_value(to_mask(value, self.days))
+
+    def formfield(self, **kwargs):
+        # IntegerField の min_value などは複数選択には渡さない
+        return models.Field.formfield(self, **{
+            "form_class": DaySetFormField,
+            "choices": self.days,
+            **kwargs,
+        })
+
+
+class BitmaskLookup(models.Lookup):
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return self.template % {"lhs": lhs, "rhs": rhs}, lhs_params + rhs_params * self.template.count("%(rhs)s")
+
+
+@DaySetField.register_lookup
+class HasAny(BitmaskLookup):
+    lookup_name = "has_any"
+    template = "(%(lhs)s & %(rhs)s) != 0"
+
+
+@DaySetField.register_lookup
+class HasAll(BitmaskLookup):
+    lookup_name = "has_all"
+    template = "(%(lhs)s & %(rhs)s) = %(rhs)s"
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Restaurant, Visit
+from .fields import DaySetFormField
 from django.forms.widgets import  DateInput, ClearableFileInput
 from django import forms
 from .models import Tag
@@ -11,7 +12,7 @@ class MultiFileInput(ClearableFileInput):
 
 
 class RestaurantForm(forms.ModelForm):
-    holiday = forms.MultipleChoiceField(
+    holiday = DaySetFormField(
         choices=Restaurant.DAY_CHOICES,
          widget=forms.SelectMultiple(attrs={
             "class": "input-field",  # ← ここを追加（共通スタイル指定）
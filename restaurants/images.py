@@ -0,0 +1,156 @@
+"""訪問写真の取り込み
+
+アップロード時は check_image() で写真として開けることだけ確かめて保存し、
+ワーカー（restaurants.tasks.process_visit_image）が次の処理を行う。
+  1. 向き（EXIF Orientation）を画素に反映し、EXIF を捨て、長辺を VISIT_IMAGE_MAX_EDGE に収めた
+     JPEG に作り直して VisitImage.image に保存する（原本）
+  2. VISIT_IMAGE_RENDITIONS の固定サイズに切り抜いた縮小版を、VISIT_IMAGE_FORMATS（AVIF / WebP）と
+     JPEG（フォールバック）で原本と同じ場所に保存し、VisitImage.renditions に記録する
+     （例: visit_images/abc.jpg → visit_images/abc.card.webp）
+テンプレートは {% visit_picture %} で縮小版を <picture> として出す。
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+
+JPEG_QUALITY = 85
+
+# 形式ごとの Pillow の保存オプションと MIME タイプ
+FORMATS = {
+    "avif": ("AVIF", "image/avif", {"quality": 60}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": JPEG_QUALITY, "optimize": True, "progressive": True}),
+}
+
+
+def enabled_formats():
+    """縮小版を作る形式（この Pillow で書けないものは除き、最後に必ず JPEG）"""
+    formats = [fmt for fmt in settings.VISIT_IMAGE_FORMATS if fmt in FORMATS and fmt != "jpg" and features.check(fmt)]
+    return formats + ["jpg"]
+
+
+def open_image(file):
+    """写真を開き、向きを直した RGB 画像にする（写真として読めなければ ValidationError）"""
+    try:
+        image = Image.open(file)
+        icc_profile = image.info.get("icc_profile")
+        image = ImageOps.exif_transpose(image)
+
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            # 透過部分は白で塗る（JPEG に透過が無いため）
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", image.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            image = image.convert("RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValidationError("画像ファイルとして読み込めませんでした。")
+
+    if icc_profile:
+        image.info["icc_profile"] = icc_profile
+    return image
+
+
+def check_image(file):
+    """ヘッダーだけ読んで写真として開けるか確かめる（画素は展開しない）"""
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        image_format = None
+    finally:
+        file.seek(0)
+
+    if image_format is None:
+        raise ValidationError("画像ファイルとして読み込めませんでした。")
+    return image_format
+
+
+def encode(image, fmt):
+    pil_format, _, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    # exif を渡さないので撮影場所などのメタデータは残らない（色の再現に必要な ICC だけ残す）
+    icc_profile = image.info.get("icc_profile")
+    if icc_profile:
+        options = {**options, "icc_profile": icc_profile}
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+class IngestedImage:
+    """取り込み済みの写真（保存用の原本と、縮小版を作るための画像）"""
+
+    def __init__(self, file, image):
+        self.file = file
+        self.image = image
+
+
+def ingest(upload):
+    """アップロードされたファイルを原本用の JPEG にする"""
+    image = open_image(upload)
+
+    max_edge = settings.VISIT_IMAGE_MAX_EDGE
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    stem = os.path.splitext(os.path.basename(upload.name or "photo"))[0] or "photo"
+    file = ContentFile(encode(image, "jpg"), name=f"{stem}.jpg")
+    return IngestedImage(file, image)
+
+
+def rendition_name(name, rendition, fmt):
+    """原本の隣に置く縮小版のパス（visit_images/abc.jpg → visit_images/abc.card.webp）"""
+    return f"{os.path.splitext(name)[0]}.{rendition}.{fmt}"
+
+
+def make_renditions(visit_image, image=None):
+    """縮小版を保存し、{rendition: {format: パス}} を返す（visit_image には保存しない）
+
+    image を渡さなければ保存済みの原本を読み直す。
+    """
+    storage = visit_image.image.storage
+    if image is None:
+        with visit_image.image.open("rb") as file:
+            image = open_image(file)
+
+    renditions = {}
+    try:
+        for rendition, size in settings.VISIT_IMAGE_RENDITIONS.items():
+            resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+            renditions[rendition] = {}
+            for fmt in enabled_formats():
+                renditions[rendition][fmt] = storage.save(
+                    rendition_name(visit_image.image.name, rendition, fmt),
+                    ContentFile(encode(resized, fmt)),
+                )
+    except Exception:
+        # 途中まで書き出した分の参照を残さない
+        for paths in renditions.values():
+            for path in paths.values():
+                storage.delete(path)
+        raise
+    return renditions
+
+
+def rendition_sources(visit_image, rendition):
+    """(<source> 用の [(MIME, URL)], <img> 用の URL) を返す
+
+    縮小版がまだ無い写真は原本をそのまま使う。
+    """
+    storage = visit_image.image.storage
+    paths = (visit_image.renditions or {}).get(rendition)
+    if not paths:
+        return [], visit_image.image.url
+
+    sources = [
+        (FORMATS[fmt][1], storage.url(path))
+        for fmt, path in paths.items()
+        if fmt != "jpg" and fmt in FORMATS
+    ]
+    fallback = storage.url(paths["jpg"]) if "jpg" in paths else visit_image.image.url
+    return sources, fallback
@@ -0,0 +1,150 @@
+"""DB を使ったバックグラウンドジョブ
+
+外部のブローカーを使わず、Job テーブルに積んだジョブを `manage.py run_jobs` のワーカーが実行する。
+
+- 積む: enqueue("process_visit_image", image_id=1)。呼び出し側のトランザクションと一緒に
+  コミットされるため、ロールバックされた処理のジョブは残らない
+- 取る: status = pending の行を「pending なら running にする」条件つき UPDATE で確保する
+  （SELECT ... FOR UPDATE が無い SQLite でも複数ワーカーで二重に実行しない）
+- 失敗: JOB_RETRY_DELAY 秒から倍々に待って再試行し、max_attempts 回失敗したら DeadJob に移す
+- 実行中のままワーカーが落ちたジョブは JOB_STALE_TIMEOUT 秒後に pending に戻す
+
+タスクは @register("名前") で登録する（restaurants.tasks）。DeadJob に移したときの後始末は
+@register("名前", on_dead=関数) で渡す（ジョブと同じ引数で呼ばれる）。
+"""
+import datetime
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DeadJob, Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+DEAD_HANDLERS = {}
+
+
+def register(name, on_dead=None):
+    def decorator(func):
+        TASKS[name] = func
+        if on_dead is not None:
+            DEAD_HANDLERS[name] = on_dead
+        return func
+    return decorator
+
+
+def enqueue(task, **payload):
+    return enqueue_many(task, [payload])[0]
+
+
+def enqueue_many(task, payloads):
+    """ジョブをまとめて積む（INSERT 1回）"""
+    jobs = Job.objects.bulk_create([
+        Job(task=task, payload=payload, max_attempts=settings.JOB_MAX_ATTEMPTS)
+        for payload in payloads
+    ])
+
+    if settings.JOB_QUEUE_EAGER:
+        # 開発用：ワーカーを動かさずにコミット後すぐ実行する
+        transaction.on_commit(lambda: run_pending())
+    return jobs
+
+
+def claim_next():
+    """実行できるジョブを1件確保して返す（無ければ None）"""
+    now = timezone.now()
+    candidates = (
+        Job.objects
+        .filter(status="pending", run_after__lte=now)
+        .order_by("run_after", "id")
+        .values_list("id", flat=True)[:10]
+    )
+    for job_id in candidates:
+        claimed = Job.objects.filter(pk=job_id, status="pending").update(
+            status="running",
+            locked_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    """確保したジョブを実行する（成功なら True）"""
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f"未登録のタスクです: {job.task}")
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("job %s failed (attempt %s/%s)", job, job.attempts, job.max_attempts, exc_info=True)
+
+        if func is None or job.attempts >= job.max_attempts:
+            with transaction.atomic():
+                DeadJob.objects.create(
+                    task=job.task,
+                    payload=job.payload,
+                    attempts=job.attempts,
+                    last_error=error,
+                    created_at=job.created_at,
+                )
+                job.delete()
+                on_dead = DEAD_HANDLERS.get(job.task)
+                if on_dead is not None:
+                    on_dead(**job.payload)
+        else:
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk).update(
+                status="pending",
+                locked_at=None,
+                run_after=timezone.now() + datetime.timedelta(seconds=delay),
+                last_error=error,
+            )
+        return False
+
+    job.delete()
+    return True
+
+
+def run_pending(limit=None):
+    """今実行できるジョブを無くなるまで（または limit 件）実行し、実行した件数を返す"""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def recover_stale():
+    """実行中のまま止まったジョブを待ちに戻す"""
+    threshold = timezone.now() - datetime.timedelta(seconds=settings.JOB_STALE_TIMEOUT)
+    return Job.objects.filter(status="running", locked_at__lt=threshold).update(
+        status="pending",
+        locked_at=None,
+    )
+
+
+def requeue_dead(task=None):
+    """DeadJob を Job に戻す（試行回数は 0 から）"""
+    queryset = DeadJob.objects.all()
+    if task:
+        queryset = queryset.filter(task=task)
+
+    with transaction.atomic():
+        dead = list(queryset)
+        Job.objects.bulk_create([
+            Job(task=job.task, payload=job.payload, max_attempts=settings.JOB_MAX_ATTEMPTS)
+            for job in dead
+        ])
+        DeadJob.objects.filter(pk__in=[job.pk for job in dead]).delete()
+    return len(dead)
@@ -0,0 +1,45 @@
+"""ベンチマーク用コマンドの共通処理"""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def benchmark_database(test_name=None):
+    """本番の DB を汚さないよう、テスト用 DB を作って計測し、終わったら破棄する
+
+    SQLite のテスト用 DB は既定でメモリ上に作られるため、ジャーナルや fsync を
+    含めて測りたいときは test_name にファイルのパスを渡す。
+    """
+    test_settings = connection.settings_dict.setdefault("TEST", {})
+    old_test_name = test_settings.get("NAME")
+    if test_name is not None:
+        test_settings["NAME"] = test_name
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings["NAME"] = old_test_name
+
+
+def measure(func, samples):
+    """func を samples 回実行し、1回ごとの所要時間（ミリ秒）のリストを返す"""
+    timings = []
+    for i in range(samples):
+        start = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings):
+    """p50 / p95 / 最大（ミリ秒）"""
+    if len(timings) < 2:
+        value = timings[0] if timings else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return cuts[49], cuts[94], max(timings)
@@ -0,0 +1,100 @@
+import datetime
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.loader import render_to_string
+
+from restaurants.management.bench import benchmark_database, measure, summarize
+from restaurants.models import Restaurant, Tag, Visit
+
+User = get_user_model()
+
+GENRES = ["ラーメン", "カフェ", "焼肉", "寿司", "イタリアン", "中華", "居酒屋", "カレー"]
+AREAS = ["渋谷", "新宿", "天神", "博多", "梅田", "難波", "栄", "札幌"]
+TEMPLATE = "restaurants/partials/card_page.html"
+
+
+class Command(BaseCommand):
+    help = (
+        "テスト用DBにお店を投入し、カード N 枚のページの描画時間（テンプレートのみ）の p50/p95 を"
+        "断片キャッシュなし（毎回作り直し）・全部当たり・一部だけ変更で比較する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cards", type=int, default=500)
+        parser.add_argument("--samples", type=int, default=30)
+        parser.add_argument("--changed", type=float, default=0.05, help="毎回変更されるカードの割合")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        samples = options["samples"]
+
+        with benchmark_database():
+            restaurants = self.seed(options["cards"])
+            context = {"restaurants": restaurants}
+            render = lambda i: render_to_string(TEMPLATE, context)  # noqa: E731
+
+            def cold(i):
+                cache.clear()
+                render(i)
+
+            changed = max(1, int(len(restaurants) * options["changed"]))
+
+            def partly_changed(i):
+                # 変更されたお店は updated_at が進み、キーが変わる
+                for restaurant in self.random.sample(restaurants, changed):
+                    restaurant.updated_at += datetime.timedelta(microseconds=1)
+                render(i)
+
+            cache.clear()
+            render(0)
+            results = {
+                "no fragment hits": summarize(measure(cold, samples)),
+                "all cards cached": summarize(measure(render, samples)),
+                f"{changed} cards changed": summarize(measure(partly_changed, samples)),
+            }
+
+        loaders = engines["django"].engine.loaders
+        self.stdout.write(f"template loaders: {loaders[0][0] if loaders else '-'}")
+        self.stdout.write(f"{len(restaurants)} cards")
+        self.stdout.write(f"{'case':<24}{'p50':>10}{'p95':>10}{'max':>10}  (ms)")
+        for name, (p50, p95, worst) in results.items():
+            self.stdout.write(f"{name:<24}{p50:>10.2f}{p95:>10.2f}{worst:>10.2f}")
+
+    def seed(self, count):
+        user = User.objects.create(email="bench@example.com", password="!")
+        tags = [Tag.objects.create(name=name) for name in ("個室", "カウンター", "テラス")]
+
+        Restaurant.objects.bulk_create([
+            Restaurant(
+                user=user,
+                store_name=f"店{i}",
+                area=self.random.choice(AREAS),
+                genre=self.random.choice(GENRES),
+                scene="ランチ",
+                status="went" if i % 2 else "want",
+                holiday=["月", "火"] if i % 3 else [],
+            )
+            for i in range(count)
+        ])
+        restaurants = Restaurant.objects.filter(user=user)
+        Restaurant.tags.through.objects.bulk_create([
+            Restaurant.tags.through(restaurant_id=restaurant_id, tag_id=self.random.choice(tags).pk)
+            for restaurant_id in restaurants.values_list("id", flat=True)
+        ])
+        Visit.objects.bulk_create([
+            Visit(
+                restaurant_id=restaurant_id,
+                date=datetime.date(2025, 1, 1) + datetime.timedelta(days=self.random.randint(0, 300)),
+                rating=self.random.randint(1, 5),
+                comment="また行きたい。" * self.random.randint(1, 5),
+            )
+            for restaurant_id in restaurants.filter(status="went").values_list("id", flat=True)
+        ])
+
+        # クエリの時間を混ぜないよう、カードに必要なものを先に全部読んでおく
+        return list(restaurants.with_card_data().order_by("-created_at", "-id"))
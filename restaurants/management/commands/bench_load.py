@@ -0,0 +1,165 @@
+import datetime
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import OperationalError, connection, transaction
+from django.test.utils import override_settings
+
+from restaurants.management.bench import benchmark_database, summarize
+from restaurants.models import Restaurant, Visit
+
+User = get_user_model()
+
+PAGE_SIZE = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "複数スレッドから一覧の表示と訪問の登録を同時に行い、"
+        "DATABASE_PROFILES の各プロファイルのスループットとロック失敗数を比較する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=10)
+        parser.add_argument("--write-ratio", type=float, default=0.2)
+        parser.add_argument("--restaurants", type=int, default=2000)
+        parser.add_argument("--profile", action="append", dest="profiles")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("SQLite 用の負荷試験です")
+
+        profiles = options["profiles"] or list(settings.DATABASE_PROFILES)
+        unknown = set(profiles) - set(settings.DATABASE_PROFILES)
+        if unknown:
+            raise CommandError(f"未定義のプロファイル: {', '.join(sorted(unknown))}")
+
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for profile in profiles:
+                # WAL はファイルに記録されて残るため、プロファイルごとに DB を作り直す
+                with benchmark_database(os.path.join(tmp, f"{profile}.sqlite3")):
+                    user_ids = self.seed(options["restaurants"])
+                    results[profile] = self.run_profile(profile, user_ids, options)
+
+        self.stdout.write(
+            f"{options['threads']} threads, {options['seconds']:.0f}s, "
+            f"write ratio {options['write_ratio']:.0%}"
+        )
+        self.stdout.write(
+            f"{'profile':<10}{'req/s':>10}{'read p50':>10}{'p95':>9}"
+            f"{'write p50':>11}{'p95':>9}{'locked':>8}"
+        )
+        for profile, (rps, reads, writes, locked) in results.items():
+            r50, r95, _ = summarize(reads)
+            w50, w95, _ = summarize(writes)
+            self.stdout.write(
+                f"{profile:<10}{rps:>10.1f}{r50:>10.2f}{r95:>9.2f}{w50:>11.2f}{w95:>9.2f}{locked:>8}"
+            )
+
+    def seed(self, restaurant_count):
+        User.objects.bulk_create(
+            [User(email=f"load{i}@example.com", password="!") for i in range(20)]
+        )
+        user_ids = list(User.objects.values_list("id", flat=True))
+        Restaurant.objects.bulk_create(
+            [
+                Restaurant(
+                    user_id=user_ids[i % len(user_ids)],
+                    store_name=f"店{i}",
+                    area="渋谷",
+                    genre="ラーメン",
+                    status="want" if i % 2 else "went",
+                )
+                for i in range(restaurant_count)
+            ],
+            batch_size=1000,
+        )
+        return user_ids
+
+    def run_profile(self, profile, user_ids, options):
+        """プロファイルの設定で接続し直し、スレッドごとにリクエスト相当の処理を繰り返す"""
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict.get(key) for key in ("CONN_MAX_AGE", "CONN_HEALTH_CHECKS", "OPTIONS")}
+        settings_dict.update({
+            key: value
+            for key, value in settings.DATABASE_PROFILES[profile].items()
+            if key != "PRAGMAS"
+        })
+
+        reads, writes = [], []
+        locked = 0
+        count = 0
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options["seconds"]
+
+        def worker(seed):
+            nonlocal locked, count
+            rnd = random.Random(seed)
+            my_reads, my_writes, my_locked = [], [], 0
+
+            while time.perf_counter() < deadline:
+                is_write = rnd.random() < options["write_ratio"]
+                user_id = rnd.choice(user_ids)
+
+                # リクエストの開始・終了時の接続の扱い（CONN_MAX_AGE）も再現する
+                request_started.send(sender=self.__class__)
+                start = time.perf_counter()
+                try:
+                    if is_write:
+                        self.write(user_id)
+                    else:
+                        self.read(user_id)
+                except OperationalError:
+                    my_locked += 1
+                else:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    (my_writes if is_write else my_reads).append(elapsed)
+                finally:
+                    request_finished.send(sender=self.__class__)
+
+            connection.close()
+            with lock:
+                reads.extend(my_reads)
+                writes.extend(my_writes)
+                locked += my_locked
+                count += len(my_reads) + len(my_writes)
+
+        connection.close()
+        try:
+            with override_settings(DATABASE_PROFILE=profile):
+                threads = [threading.Thread(target=worker, args=(i,)) for i in range(options["threads"])]
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+        finally:
+            connection.close()
+            settings_dict.update(saved)
+
+        return count / elapsed, reads, writes, locked
+
+    def read(self, user_id):
+        """気になる一覧の1ページ目"""
+        list(
+            Restaurant.objects.filter(user_id=user_id, status="want")
+            .with_card_data().order_by("-created_at", "-id")[:PAGE_SIZE]
+        )
+
+    def write(self, user_id):
+        """訪問記録の登録（ビューと同じく1トランザクション）"""
+        restaurant = Restaurant.objects.filter(user_id=user_id).order_by("?").first()
+        with transaction.atomic():
+            Visit.objects.create(restaurant=restaurant, date=datetime.date.today(), rating=4)
+            restaurant.status = "went"
+            restaurant.save(update_fields=["status"])
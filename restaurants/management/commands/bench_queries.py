@@ -0,0 +1,172 @@
+import datetime
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from restaurants import rollups
+from restaurants.charts import visit_stats
+from restaurants.management.bench import benchmark_database, measure, summarize
+from restaurants.models import Restaurant, Visit
+from restaurants.pagination import paginate_keyset
+
+User = get_user_model()
+
+GENRES = ["ラーメン", "カフェ", "焼肉", "寿司", "イタリアン", "中華", "居酒屋", "カレー"]
+AREAS = ["渋谷", "新宿", "天神", "博多", "梅田", "難波", "栄", "札幌"]
+PAGE_SIZE = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "テスト用DBに大量データを投入し、一覧・検索・グラフ用クエリの p50/p95 を"
+        "Meta.indexes あり／なしで比較する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--restaurants", type=int, default=100_000)
+        parser.add_argument("--visits", type=int, default=1_000_000)
+        parser.add_argument("--samples", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+
+        with benchmark_database():
+            self.stdout.write("seeding ...")
+            user_ids = self.seed(options["users"], options["restaurants"], options["visits"])
+
+            queries = self.build_queries(user_ids)
+            samples = options["samples"]
+
+            self.drop_indexes()
+            before = {name: summarize(measure(query, samples)) for name, query in queries.items()}
+
+            self.create_indexes()
+            after = {name: summarize(measure(query, samples)) for name, query in queries.items()}
+
+        self.stdout.write(f"{'query':<28}{'before p50':>12}{'p95':>10}{'after p50':>12}{'p95':>10}  (ms)")
+        for name in queries:
+            b50, b95, _ = before[name]
+            a50, a95, _ = after[name]
+            self.stdout.write(f"{name:<28}{b50:>12.2f}{b95:>10.2f}{a50:>12.2f}{a95:>10.2f}")
+
+    # -----------------------------
+    # データ投入
+    # -----------------------------
+    def seed(self, user_count, restaurant_count, visit_count):
+        User.objects.bulk_create(
+            [User(email=f"bench{i}@example.com", password="!") for i in range(user_count)],
+            batch_size=1000,
+        )
+        user_ids = list(User.objects.values_list("id", flat=True))
+
+        batch = []
+        for i in range(restaurant_count):
+            batch.append(Restaurant(
+                user_id=user_ids[i % len(user_ids)],
+                store_name=f"店{i}",
+                area=self.random.choice(AREAS),
+                genre=self.random.choice(GENRES),
+                status="went" if i % 2 else "want",
+                avg_rating=self.random.randint(1, 5) if i % 2 else None,
+            ))
+            if len(batch) == 5000:
+                Restaurant.objects.bulk_create(batch)
+                batch = []
+        Restaurant.objects.bulk_create(batch)
+
+        went_ids = list(Restaurant.objects.filter(status="went").values_list("id", flat=True))
+        start = datetime.date(2023, 1, 1)
+        batch = []
+        for i in range(visit_count):
+            batch.append(Visit(
+                restaurant_id=went_ids[i % len(went_ids)],
+                date=start + datetime.timedelta(days=self.random.randint(0, 1000)),
+                rating=self.random.randint(1, 5),
+            ))
+            if len(batch) == 5000:
+                Visit.objects.bulk_create(batch)
+                batch = []
+        Visit.objects.bulk_create(batch)
+
+        # bulk_create はシグナルを送らないので、集計表はまとめて作る
+        rollups.rebuild()
+        return user_ids
+
+    # -----------------------------
+    # 計測するクエリ
+    # -----------------------------
+    def build_queries(self, user_ids):
+        users = [User(pk=user_id) for user_id in user_ids]
+        pick = lambda i: users[(i * 7919) % len(users)]  # noqa: E731
+
+        # 深いページ（50ページ目）の cursor を事前に作っておく
+        deep_cursors = {}
+        for user in users:
+            page = None
+            for _ in range(50):
+                page = paginate_keyset(
+                    Restaurant.objects.filter(user=user, status="want"),
+                    page.next_cursor if page else None,
+                    PAGE_SIZE,
+                    ("-created_at", "-id"),
+                )
+                if not page.has_next:
+                    break
+            deep_cursors[user.pk] = page.next_cursor
+
+        restaurant_ids = list(Restaurant.objects.filter(status="went").values_list("id", flat=True)[:1000])
+
+        return {
+            "want list": lambda i: list(
+                Restaurant.objects.filter(user=pick(i), status="want").order_by("-created_at", "-id")[:PAGE_SIZE]
+            ),
+            "want list (page 50)": lambda i: paginate_keyset(
+                Restaurant.objects.filter(user=pick(i), status="want"),
+                deep_cursors[pick(i).pk],
+                PAGE_SIZE,
+                ("-created_at", "-id"),
+            ).object_list,
+            "went list + latest visit": lambda i: list(
+                Restaurant.objects.filter(user=pick(i), status="went")
+                .with_card_data().order_by("-created_at", "-id")[:PAGE_SIZE]
+            ),
+            "search (all, newest)": lambda i: list(
+                Restaurant.objects.filter(user=pick(i)).order_by("-created_at", "-id")[:PAGE_SIZE]
+            ),
+            "search (genre)": lambda i: list(
+                Restaurant.objects.filter(user=pick(i), genre__icontains="ラーメン")
+                .order_by("-created_at", "-id")[:PAGE_SIZE]
+            ),
+            "visit history (detail)": lambda i: list(
+                Visit.objects.filter(restaurant_id=restaurant_ids[i % len(restaurant_ids)]).order_by("-date")
+            ),
+            "chart stats": lambda i: visit_stats(pick(i)),
+            "mypage top3": lambda i: list(
+                Restaurant.objects.filter(user=pick(i), avg_rating__isnull=False).order_by("-avg_rating")[:3]
+            ),
+        }
+
+    # -----------------------------
+    # インデックスの付け外し
+    # -----------------------------
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in (Restaurant, Visit):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+        self.analyze()
+
+    def create_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in (Restaurant, Visit):
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+        self.analyze()
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
@@ -0,0 +1,82 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# ワーカー起動相当の処理（WSGIアプリ生成 + URLconf 読み込み）を別プロセスで計測する
+BOOT_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "savoiry_project.settings")
+if {eager!r}:
+    import matplotlib.pyplot
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+application = get_wsgi_application()
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+
+rss_kb = None
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_kb": rss_kb,
+    "matplotlib": "matplotlib" in sys.modules,
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = "manage.py check とワーカー起動の所要時間・RSS を計測する（matplotlib 先読みとの比較付き）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        manage_py = str(settings.BASE_DIR / "manage.py")
+
+        check_times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, manage_py, "check"],
+                check=True,
+                capture_output=True,
+                cwd=settings.BASE_DIR,
+            )
+            check_times.append(time.perf_counter() - start)
+
+        self.stdout.write(f"manage.py check: median {statistics.median(check_times) * 1000:.0f} ms")
+
+        for label, eager in (("lazy (current)", False), ("eager matplotlib", True)):
+            runs = [self._boot(eager) for _ in range(repeat)]
+            self.stdout.write(
+                f"worker boot [{label}]: "
+                f"median {statistics.median(r['seconds'] for r in runs) * 1000:.0f} ms, "
+                f"RSS {statistics.median(r['rss_kb'] for r in runs) / 1024:.1f} MiB, "
+                f"matplotlib loaded={runs[0]['matplotlib']}"
+            )
+
+    def _boot(self, eager):
+        result = subprocess.run(
+            [sys.executable, "-c", BOOT_SCRIPT.format(eager=eager)],
+            check=True,
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
@@ -0,0 +1,79 @@
+import datetime
+import io
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from restaurants.management.bench import benchmark_database, measure, summarize
+from restaurants.models import Restaurant, Visit, VisitImage
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "写真つきの訪問記録1件の保存時間を、SQLite の WAL あり／なしと"
+        "1行ずつ autocommit（従来）／1トランザクション + bulk_create（現在）で比較する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=50)
+        parser.add_argument("--photos", type=int, default=5)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("SQLite 用のベンチマークです")
+
+        samples = options["samples"]
+        photo = self.make_photo()
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=tmp):
+            with benchmark_database(os.path.join(tmp, "bench.sqlite3")):
+                user = User.objects.create(email="bench@example.com", password="!")
+                restaurant = Restaurant.objects.create(
+                    user=user, store_name="店", area="渋谷", genre="ラーメン", status="went",
+                )
+
+                def files():
+                    return [
+                        SimpleUploadedFile(f"photo{n}.jpg", photo, content_type="image/jpeg")
+                        for n in range(options["photos"])
+                    ]
+
+                def autocommit(i):
+                    visit = Visit.objects.create(restaurant=restaurant, date=datetime.date.today(), rating=4)
+                    for file in files():
+                        VisitImage.objects.create(visit=visit, image=file)
+                    restaurant.save()
+
+                def atomic(i):
+                    with transaction.atomic():
+                        visit = Visit(restaurant=restaurant, date=datetime.date.today(), rating=4)
+                        visit.save()
+                        visit.add_images(files())
+                        restaurant.save(update_fields=["status"])
+
+                results = {}
+                for journal_mode in ("delete", "wal"):
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+                    for name, func in (("autocommit", autocommit), ("atomic + bulk", atomic)):
+                        results[(journal_mode, name)] = summarize(measure(func, samples))
+
+        self.stdout.write(f"visit with {options['photos']} photos, {samples} samples")
+        self.stdout.write(f"{'journal':<10}{'write path':<16}{'p50':>10}{'p95':>10}{'max':>10}  (ms)")
+        for (journal_mode, name), (p50, p95, worst) in results.items():
+            self.stdout.write(f"{journal_mode:<10}{name:<16}{p50:>10.2f}{p95:>10.2f}{worst:>10.2f}")
+
+    def make_photo(self):
+        """スマホ写真の代わりの JPEG（中身は計測に影響しないので単色）"""
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (1280, 960), (200, 120, 60)).save(buffer, "JPEG", quality=85)
+        return buffer.getvalue()
@@ -0,0 +1,60 @@
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+
+class Command(BaseCommand):
+    help = (
+        "static/icons の PNG から縮小した WebP を作り、collectstatic でハッシュ付きの名前と "
+        ".gz / .br を STATIC_ROOT に書き出す（本番の DEBUG = False のときに実行する）"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--icons-only", action="store_true", help="アイコンの WebP だけ作り直す")
+        parser.add_argument("--size", type=int, default=settings.ICON_WEBP_SIZE, help="WebP の長辺（px）")
+        parser.add_argument("--force", action="store_true", help="WebP が新しくても作り直す")
+
+    def handle(self, *args, **options):
+        before = after = 0
+        for png in sorted(Path(settings.STATICFILES_DIRS[0], "icons").glob("*.png")):
+            webp = png.with_suffix(".webp")
+            if options["force"] or not webp.exists() or webp.stat().st_mtime < png.stat().st_mtime:
+                self.make_webp(png, webp, options["size"])
+            before += png.stat().st_size
+            after += webp.stat().st_size
+        self.stdout.write(f"icons: {before / 1024:.0f} KB (png) -> {after / 1024:.0f} KB (webp)")
+
+        if options["icons_only"]:
+            return
+
+        call_command("collectstatic", interactive=False, verbosity=options["verbosity"])
+        self.report()
+
+    def make_webp(self, png, webp, size):
+        with Image.open(png) as image:
+            image = image.convert("RGBA")
+            image.thumbnail((size, size), Image.LANCZOS)
+            image.save(webp, "WEBP", quality=90, method=6)
+
+    def report(self):
+        """ハッシュ付きのファイルについて、元の大きさと圧縮版の大きさを合計して出す"""
+        totals = {"": 0, ".gz": 0, ".br": 0}
+        for root, _, files in os.walk(settings.STATIC_ROOT):
+            for name in files:
+                path = os.path.join(root, name)
+                stem, ext = os.path.splitext(path)
+                if ext in (".gz", ".br"):
+                    totals[ext] += os.path.getsize(path)
+                    continue
+                if os.path.exists(path + ".gz"):
+                    totals[""] += os.path.getsize(path)
+
+        self.stdout.write(
+            f"compressed assets: {totals[''] / 1024:.0f} KB -> "
+            f"gzip {totals['.gz'] / 1024:.0f} KB"
+            + (f" / brotli {totals['.br'] / 1024:.0f} KB" if totals[".br"] else " (brotli not installed)")
+        )
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from restaurants.models import ImageBlob, VisitImage
+from restaurants.storage import visit_image_storage
+
+# 参照中のパスの見積もりがこれを超えたら、--index auto はセットの代わりにブルームフィルタを使う
+BLOOM_THRESHOLD = 1_000_000
+
+
+class BloomFilter:
+    """参照中のパスの集合（偽陽性はあるが偽陰性は無いので、参照中のファイルを消すことはない）"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "little")
+        b = int.from_bytes(digest[8:], "little") | 1
+        return ((a + i * b) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class Command(BaseCommand):
+    help = (
+        "どの訪問写真（原本・縮小版）からも ImageBlob からも参照されていないファイルを "
+        "MEDIA_ROOT から探して消す（--quarantine で退避、--dry-run で数えるだけ）。"
+        "中断しても --state のファイルから続きを再開する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="消さずに件数だけ数える")
+        parser.add_argument("--quarantine", help="消す代わりに移すディレクトリ（MEDIA_ROOT の外を指定する）")
+        parser.add_argument(
+            "--min-age", type=float, default=24,
+            help="これより新しい（時間）ファイルは保存中かもしれないので残す",
+        )
+        parser.add_argument("--index", choices=["auto", "set", "bloom"], default="auto")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--state", default=os.path.join(settings.BASE_DIR, ".gc_media_state.json"),
+            help="再開用に進み具合を書くファイル",
+        )
+        parser.add_argument("--restart", action="store_true", help="前回の続きからではなく最初から")
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        root = visit_image_storage.path(visit_image_storage.directory)
+        if not os.path.isdir(root):
+            self.stdout.write("写真のディレクトリがありません")
+            return
+
+        quarantine = options["quarantine"]
+        if quarantine and os.path.abspath(quarantine).startswith(os.path.abspath(root) + os.sep):
+            raise CommandError("--quarantine は写真のディレクトリの外を指定してください")
+
+        dry_run = options["dry_run"]
+        state_path = options["state"]
+        # 数えるだけのときは進み具合を残さない（本番の実行で飛ばされないように）
+        state = {} if dry_run or options["restart"] else self.load_state(state_path, root)
+        stats = state.get("stats", {"scanned": 0, "orphans": 0, "bytes": 0, "recent": 0})
+        resume_after = tuple(state["last"].split("/")) if state.get("last") else None
+        if resume_after:
+            self.stdout.write(f"{state['last']} の続きから再開します")
+
+        cutoff = time.time() - options["min_age"] * 60 * 60
+        index = self.build_index(options["index"])
+
+        chunk = []
+        for name, path in self.walk(root, (visit_image_storage.directory,), resume_after):
+            chunk.append((name, path))
+            if len(chunk) >= options["chunk_size"]:
+                self.process(chunk, index, cutoff, stats, dry_run, quarantine)
+                if not dry_run:
+                    self.save_state(state_path, root, chunk[-1][0], stats)
+                chunk = []
+        self.process(chunk, index, cutoff, stats, dry_run, quarantine)
+
+        if not dry_run and os.path.exists(state_path):
+            os.remove(state_path)
+
+        verb = "消せます" if dry_run else ("退避しました" if quarantine else "消しました")
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['scanned']} ファイルを調べ、参照の無い {stats['orphans']} ファイル"
+            f"（{stats['bytes'] / 1024 / 1024:.1f}MB）を{verb}"
+            f"（新しいため残した {stats['recent']} ファイルを除く）"
+        ))
+
+    def referenced_names(self):
+        """参照中のパスを少しずつ読む（ImageBlob の全行と、VisitImage の原本・縮小版）"""
+        yield from ImageBlob.objects.values_list("name", flat=True).iterator(chunk_size=2000)
+        for name, renditions in VisitImage.objects.values_list("image", "renditions").iterator(chunk_size=2000):
+            yield name
+            for formats in (renditions or {}).values():
+                yield from formats.values()
+
+    def build_index(self, kind):
+        per_image = 1 + len(settings.VISIT_IMAGE_RENDITIONS) * (len(settings.VISIT_IMAGE_FORMATS) + 1)
+        capacity = ImageBlob.objects.count() + VisitImage.objects.count() * per_image
+        if kind == "auto":
+            kind = "bloom" if capacity > BLOOM_THRESHOLD else "set"
+
+        index = BloomFilter(capacity) if kind == "bloom" else set()
+        for name in self.referenced_names():
+            index.add(name)
+        return index
+
+    def walk(self, path, parts, resume_after):
+        """(ストレージ上の名前, パス) を名前順に返す（resume_after 以前は飛ばす）
+
+        並べ替えのために持つのは1ディレクトリ分の名前だけ。
+        """
+        with os.scandir(path) as entries:
+            names = sorted(entry.name for entry in entries)
+
+        for entry_name in names:
+            entry_parts = parts + (entry_name,)
+            entry_path = os.path.join(path, entry_name)
+            if os.path.isdir(entry_path) and not os.path.islink(entry_path):
+                # 再開位置より前のディレクトリは丸ごと飛ばす
+                if resume_after and entry_parts < resume_after[:len(entry_parts)]:
+                    continue
+                yield from self.walk(entry_path, entry_parts, resume_after)
+            elif os.path.isfile(entry_path):
+                if resume_after and entry_parts <= resume_after:
+                    continue
+                yield "/".join(entry_parts), entry_path
+
+    def process(self, chunk, index, cutoff, stats, dry_run, quarantine):
+        for name, path in chunk:
+            stats["scanned"] += 1
+            if name in index:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > cutoff:
+                stats["recent"] += 1
+                continue
+
+            if not dry_run and not self.remove_unreferenced(name, path, stat.st_size, quarantine):
+                continue
+            stats["orphans"] += 1
+            stats["bytes"] += stat.st_size
+            if self.verbosity >= 2:
+                self.stdout.write(name)
+
+    def remove_unreferenced(self, name, path, size, quarantine):
+        """索引を作った後に参照されていなければファイルを消す（退避する）。消したら True
+
+        内容で名前が決まるので、実行中に同じ写真が添付されると古いファイルがまた参照される
+        （mtime は変わらない）。消す間は ImageBlob の仮の行を作り（purge_orphans と同じ）、
+        同じファイルを参照しようとする保存を待たせてから、参照が無いことを確かめ直す。
+        """
+        with transaction.atomic():
+            blob, created = ImageBlob.objects.get_or_create(name=name, defaults={"size": size})
+            if not created:
+                return False
+            referenced = VisitImage.objects.filter(Q(image=name) | Q(renditions__icontains=f'"{name}"')).exists()
+            if not referenced:
+                if quarantine:
+                    target = os.path.join(quarantine, *name.split("/"))
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.move(path, target)
+                else:
+                    os.remove(path)
+            blob.delete()
+        return not referenced
+
+    def load_state(self, state_path, root):
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        # 別の MEDIA_ROOT を調べたときのものは使わない
+        return state if state.get("root") == root else {}
+
+    def save_state(self, state_path, root, last, stats):
+        temp_path = f"{state_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"root": root, "last": last, "stats": stats}, f)
+        os.replace(temp_path, state_path)
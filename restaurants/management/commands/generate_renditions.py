@@ -0,0 +1,48 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+
+from restaurants.images import make_renditions
+from restaurants.models import VisitImage
+from restaurants.storage import visit_image_storage
+
+
+class Command(BaseCommand):
+    help = "縮小版（restaurants.images）が無い訪問写真の縮小版を作る（--all で作り直す）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="縮小版がある写真も作り直す")
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        queryset = VisitImage.objects.order_by("id")
+        if not options["all"]:
+            queryset = queryset.filter(renditions={}, status="ready")
+
+        batch_size = options["batch_size"]
+        last_id = 0
+        done = failed = 0
+
+        while True:
+            images = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not images:
+                break
+
+            released = []
+            for image in images:
+                try:
+                    old_paths = image.rendition_paths()
+                    image.renditions = make_renditions(image)
+                except (ValidationError, OSError) as e:
+                    failed += 1
+                    self.stderr.write(f"{image.image.name}: {e}")
+                else:
+                    released.extend(old_paths)
+                    done += 1
+
+            VisitImage.objects.bulk_update([image for image in images if image.renditions], ["renditions"])
+            # 作り直す前の縮小版への参照を外す
+            for path in released:
+                visit_image_storage.delete(path)
+            last_id = images[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f"{done} 枚の縮小版を作りました（失敗 {failed} 枚）"))
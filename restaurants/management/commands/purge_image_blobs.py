@@ -0,0 +1,39 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from restaurants.storage import visit_image_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "参照が無くなってから IMAGE_BLOB_PURGE_GRACE 秒たった訪問写真のファイル"
+        "（restaurants.storage）と、参照の行が無いまま同じ時間たったファイルを消す"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace", type=int, help="猶予（秒）。省略時は IMAGE_BLOB_PURGE_GRACE")
+        parser.add_argument("--dry-run", action="store_true", help="消さずに件数だけ数える")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        grace = settings.IMAGE_BLOB_PURGE_GRACE if options["grace"] is None else options["grace"]
+        released_before = timezone.now() - datetime.timedelta(seconds=grace)
+
+        count, size = visit_image_storage.purge(
+            released_before,
+            dry_run=options["dry_run"],
+            batch_size=options["batch_size"],
+        )
+        # 書き出した後でロールバックされ、参照の行が無いファイル
+        orphans, orphan_size = visit_image_storage.purge_orphans(
+            released_before,
+            dry_run=options["dry_run"],
+            batch_size=options["batch_size"],
+        )
+        count += orphans
+        size += orphan_size
+        verb = "消せます" if options["dry_run"] else "消しました"
+        self.stdout.write(self.style.SUCCESS(f"{count} ファイル（{size / 1024 / 1024:.1f}MB）を{verb}"))
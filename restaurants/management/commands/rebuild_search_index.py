@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from restaurants.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "お店検索の索引（SQLite: FTS5）を作り直す"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{type(backend).__name__} の索引を作り直しました"))
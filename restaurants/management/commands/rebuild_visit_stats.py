@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurants import rollups
+
+
+class Command(BaseCommand):
+    help = "訪問集計の集計表（月別・ジャンル別、restaurants.rollups）を訪問履歴から作り直す"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users", help="対象ユーザーのID（複数可）")
+        parser.add_argument("--verify", action="store_true", help="作り直さずに、ずれている行を表示する")
+
+    def handle(self, *args, **options):
+        user_ids = options["users"]
+
+        if options["verify"]:
+            expected = rollups.compute(user_ids)
+            actual = rollups.stored(user_ids)
+            keys = sorted(
+                (key for key in expected.keys() | actual.keys() if expected[key] != actual[key]),
+                key=str,
+            )
+            for kind, user_id, value in keys:
+                self.stdout.write(
+                    f"user={user_id} {kind}={value}: 集計表 {actual[(kind, user_id, value)]} / "
+                    f"訪問履歴 {expected[(kind, user_id, value)]}"
+                )
+            if keys:
+                raise CommandError(f"{len(keys)} 行がずれています（--verify なしで作り直せます）")
+            self.stdout.write(self.style.SUCCESS("集計表は訪問履歴と一致しています"))
+            return
+
+        counts = rollups.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"{len(counts)} 行の集計を作り直しました"))
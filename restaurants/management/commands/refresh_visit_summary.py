@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from restaurants.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = "Restaurant の訪問サマリー（最終訪問日・訪問回数・平均評価・カバー写真）を再計算して補修する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="対象ユーザーのID（省略時は全ユーザー）")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = Restaurant.objects.order_by("id")
+        if options["user"]:
+            queryset = queryset.filter(user_id=options["user"])
+
+        batch_size = options["batch_size"]
+        last_id = 0
+        total = 0
+
+        while True:
+            ids = list(queryset.filter(id__gt=last_id).values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+
+            Restaurant.objects.filter(id__in=ids).refresh_visit_summaries()
+            total += len(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"{total} 件のお店の訪問サマリーを更新しました"))
@@ -0,0 +1,57 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from restaurants.jobs import recover_stale, requeue_dead, run_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "バックグラウンドジョブ（restaurants.jobs）のワーカー。"
+        "Job テーブルを見て、実行できるジョブを順に実行する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="今あるジョブを実行したら終了する")
+        parser.add_argument("--sleep", type=float, default=2.0, help="ジョブが無いときの待ち時間（秒）")
+        parser.add_argument("--max-jobs", type=int, help="この件数を実行したら終了する")
+        parser.add_argument("--requeue-dead", action="store_true", help="DeadJob を待ちに戻して終了する")
+        parser.add_argument("--task", help="--requeue-dead の対象タスク名")
+
+    def handle(self, *args, **options):
+        if options["requeue_dead"]:
+            count = requeue_dead(options["task"])
+            self.stdout.write(self.style.SUCCESS(f"{count} 件のジョブを待ちに戻しました"))
+            return
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        total = 0
+        max_jobs = options["max_jobs"]
+
+        while not self.stopping:
+            recover_stale()
+
+            # 1件ずつ実行し、停止の合図とリクエスト同様の接続の後始末をはさむ
+            done = 0
+            while not self.stopping and (max_jobs is None or total < max_jobs):
+                close_old_connections()
+                if not run_pending(limit=1):
+                    break
+                done += 1
+                total += 1
+
+            if options["once"] or (max_jobs is not None and total >= max_jobs):
+                break
+            if not done:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"{total} 件のジョブを実行しました"))
+
+    def stop(self, signum, frame):
+        # 実行中のジョブは最後まで終わらせる
+        self.stopping = True
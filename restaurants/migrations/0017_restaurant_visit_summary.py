@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, Count, Max, Min
+
+
+def backfill_visit_summaries(apps, schema_editor):
+    """既存のお店の訪問サマリーを埋める（作成時点の RestaurantQuerySet.refresh_visit_summaries の写し）"""
+    Restaurant = apps.get_model("restaurants", "Restaurant")
+    Visit = apps.get_model("restaurants", "Visit")
+    VisitImage = apps.get_model("restaurants", "VisitImage")
+
+    stats = {
+        row["restaurant_id"]: row
+        for row in (
+            Visit.objects
+            .values("restaurant_id")
+            .annotate(count=Count("id"), avg=Avg("rating"), last_date=Max("date"), latest_id=Max("id"))
+            .order_by()
+        )
+    }
+    # カバー写真 = 最新の訪問の1枚目
+    covers = dict(
+        VisitImage.objects
+        .values("visit_id")
+        .annotate(first_id=Min("id"))
+        .values_list("visit_id", "first_id")
+        .order_by()
+    )
+
+    updates = [
+        Restaurant(
+            id=restaurant_id,
+            visit_count=row["count"],
+            avg_rating=row["avg"],
+            last_visit_date=row["last_date"],
+            cover_image_id=covers.get(row["latest_id"]),
+        )
+        for restaurant_id, row in stats.items()
+    ]
+    Restaurant.objects.bulk_update(
+        updates,
+        ["visit_count", "avg_rating", "last_visit_date", "cover_image"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0016_suggestword'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='avg_rating',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='cover_image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='restaurants.visitimage'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='last_visit_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='visit_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['user', '-avg_rating'], name='restaurant_user_rating_idx'),
+        ),
+        migrations.RunPython(backfill_visit_summaries, migrations.RunPython.noop),
+    ]
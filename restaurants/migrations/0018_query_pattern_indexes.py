@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0017_restaurant_visit_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['user', 'status', '-created_at', '-id'], name='restaurant_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='restaurant_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['restaurant', '-date'], name='visit_restaurant_date_idx'),
+        ),
+    ]
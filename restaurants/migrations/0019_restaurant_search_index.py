@@ -0,0 +1,90 @@
+import re
+import unicodedata
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+# restaurants.search.SEARCH_FIELDS と同じ列（休業日はビット列で絞るので索引に入れない）
+SEARCH_COLUMNS = ["genre", "area", "companions", "scene", "tags"]
+
+TRIGRAM_INDEXES = [
+    ("restaurants_restaurant", "genre"),
+    ("restaurants_restaurant", "area"),
+    ("restaurants_restaurant", "companions"),
+    ("restaurants_restaurant", "scene"),
+    ("restaurants_tag", "name"),
+]
+
+_WORD_SPLIT = re.compile(r"[\W_]+")
+
+
+def ngram_tokens(text):
+    """restaurants.search.ngram_tokens の作成時点の写し（後で変わっても移行の結果を変えない）"""
+    tokens = []
+    for word in _WORD_SPLIT.split(unicodedata.normalize("NFKC", text or "").lower()):
+        if not word:
+            continue
+        tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        tokens.append(word[-1])
+    return " ".join(tokens)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+
+    if connection.vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE restaurants_search USING fts5("
+                "owner, " + ", ".join(SEARCH_COLUMNS) + ", tokenize = 'unicode61')"
+            )
+        except OperationalError:
+            # FTS5 が無い SQLite では icontains の検索にフォールバックする
+            return
+
+        Restaurant = apps.get_model("restaurants", "Restaurant")
+        rows = []
+        for restaurant in Restaurant.objects.prefetch_related("tags").iterator(chunk_size=500):
+            document = {field: getattr(restaurant, field) or "" for field in SEARCH_COLUMNS if field != "tags"}
+            document["tags"] = " ".join(tag.name for tag in restaurant.tags.all())
+            rows.append(
+                [restaurant.pk, f"u{restaurant.user_id}"]
+                + [ngram_tokens(document[field]) for field in SEARCH_COLUMNS]
+            )
+
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO restaurants_search (rowid, owner, " + ", ".join(SEARCH_COLUMNS) + ") "
+                "VALUES (" + ", ".join(["%s"] * (len(SEARCH_COLUMNS) + 2)) + ")",
+                rows,
+            )
+
+    elif connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, column in TRIGRAM_INDEXES:
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_{column}_trgm "
+                f"ON {table} USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+
+    if connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS restaurants_search")
+    elif connection.vendor == "postgresql":
+        for table, column in TRIGRAM_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0018_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:12
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+SEARCH_KEY_LENGTH = 200
+
+
+def search_key(word):
+    """restaurants.suggest.search_key の作成時点の写し（カタカナをひらがなにした正規化キー）"""
+    text = unicodedata.normalize("NFKC", word or "").strip().lower()
+    return "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in text)[:SEARCH_KEY_LENGTH]
+
+
+def fill_search_keys(apps, schema_editor):
+    SuggestWord = apps.get_model("restaurants", "SuggestWord")
+    words = list(SuggestWord.objects.all())
+    for word in words:
+        word.search_key = search_key(word.word)
+    SuggestWord.objects.bulk_update(words, ["search_key"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0019_restaurant_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='suggestword',
+            name='search_key',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='suggestword',
+            index=models.Index(fields=['word_type', 'search_key'], name='suggest_type_key_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0020_suggestword_search_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitimage',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:28
+
+import os
+from collections import Counter
+
+import restaurants.storage
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_existing_references(apps, schema_editor):
+    """移行前からあるファイル（ハッシュ名でないもの）にも参照数を付ける
+
+    大きさは MEDIA_ROOT のファイルから直接読む（その時点のストレージのクラスに左右されない）。
+    """
+    VisitImage = apps.get_model("restaurants", "VisitImage")
+    ImageBlob = apps.get_model("restaurants", "ImageBlob")
+
+    counts = Counter()
+    for name, renditions in VisitImage.objects.values_list("image", "renditions").iterator():
+        counts[name] += 1
+        for formats in (renditions or {}).values():
+            counts.update(formats.values())
+
+    blobs = []
+    for name, ref_count in counts.items():
+        try:
+            size = os.path.getsize(os.path.join(settings.MEDIA_ROOT, name))
+        except OSError:
+            size = 0
+        blobs.append(ImageBlob(name=name, size=size, ref_count=ref_count))
+    ImageBlob.objects.bulk_create(blobs, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0022_background_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visitimage',
+            name='image',
+            field=models.ImageField(storage=restaurants.storage.get_visit_image_storage, upload_to='visit_images/'),
+        ),
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'released_at'], name='blob_released_idx')],
+            },
+        ),
+        migrations.RunPython(count_existing_references, migrations.RunPython.noop),
+    ]
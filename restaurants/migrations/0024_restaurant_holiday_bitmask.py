@@ -0,0 +1,125 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:33
+
+import re
+import unicodedata
+
+import restaurants.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+DAYS = [
+    ('月', '月曜日'), ('火', '火曜日'), ('水', '水曜日'), ('木', '木曜日'), ('金', '金曜日'),
+    ('土', '土曜日'), ('日', '日曜日'), ('祝日', '祝日'), ('年中無休', '年中無休'), ('不定休', '不定休'),
+]
+
+SEARCH_COLUMNS = ["genre", "area", "companions", "scene", "tags"]
+
+
+# ★ 以下は作成時点の restaurants.fields / restaurants.search の写し（後で変わっても移行の結果を変えない）
+_SPLIT = re.compile(r"[、,，\s]+")
+_WORD_SPLIT = re.compile(r"[\W_]+")
+
+
+def to_mask(text):
+    bits = {}
+    for bit, (key, label) in enumerate(DAYS):
+        bits[key] = bits[label] = 1 << bit
+
+    mask = 0
+    for item in _SPLIT.split(text):
+        mask |= bits.get(item.strip(), 0)
+    return mask
+
+
+def to_text(mask):
+    return "、".join(key for bit, (key, _) in enumerate(DAYS) if int(mask) & (1 << bit))
+
+
+def ngram_tokens(text):
+    tokens = []
+    for word in _WORD_SPLIT.split(unicodedata.normalize("NFKC", text or "").lower()):
+        if not word:
+            continue
+        tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        tokens.append(word[-1])
+    return " ".join(tokens)
+
+
+def holiday_text_to_mask(apps, schema_editor):
+    """「月、火」のような文字列をビット列にする（知らない語は捨てる）"""
+    Restaurant = apps.get_model("restaurants", "Restaurant")
+    restaurants = list(Restaurant.objects.exclude(holiday__isnull=True).exclude(holiday="").only("id", "holiday"))
+    for restaurant in restaurants:
+        restaurant.holiday_days = to_mask(restaurant.holiday)
+    Restaurant.objects.bulk_update(restaurants, ["holiday_days"], batch_size=500)
+
+
+def holiday_mask_to_text(apps, schema_editor):
+    Restaurant = apps.get_model("restaurants", "Restaurant")
+    restaurants = list(Restaurant.objects.exclude(holiday_days=0).only("id", "holiday_days"))
+    for restaurant in restaurants:
+        restaurant.holiday = to_text(restaurant.holiday_days)
+    Restaurant.objects.bulk_update(restaurants, ["holiday"], batch_size=500)
+
+
+def rebuild_fts_table(apps, schema_editor):
+    """FTS5 の索引を作り直す（以前の 0019 で休業日の列ごと作られた索引から休業日を外す）"""
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'restaurants_search'")
+        if cursor.fetchone() is None:
+            return
+
+    schema_editor.execute("DROP TABLE restaurants_search")
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE restaurants_search USING fts5("
+        "owner, " + ", ".join(SEARCH_COLUMNS) + ", tokenize = 'unicode61')"
+    )
+
+    Restaurant = apps.get_model("restaurants", "Restaurant")
+    rows = []
+    for restaurant in Restaurant.objects.prefetch_related("tags").iterator(chunk_size=500):
+        document = {field: getattr(restaurant, field) or "" for field in SEARCH_COLUMNS if field != "tags"}
+        document["tags"] = " ".join(tag.name for tag in restaurant.tags.all())
+        rows.append([restaurant.pk, f"u{restaurant.user_id}"] + [ngram_tokens(document[field]) for field in SEARCH_COLUMNS])
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO restaurants_search (rowid, owner, " + ", ".join(SEARCH_COLUMNS) + ") "
+            "VALUES (" + ", ".join(["%s"] * (len(SEARCH_COLUMNS) + 2)) + ")",
+            rows,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0023_image_blobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='holiday_days',
+            field=restaurants.fields.DaySetField(blank=True, days=DAYS, verbose_name='休業日'),
+        ),
+        migrations.RunPython(holiday_text_to_mask, holiday_mask_to_text),
+        migrations.RemoveField(
+            model_name='restaurant',
+            name='holiday',
+        ),
+        migrations.RenameField(
+            model_name='restaurant',
+            old_name='holiday_days',
+            new_name='holiday',
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['user', 'holiday'], name='restaurant_user_holiday_idx'),
+        ),
+        migrations.RunPython(rebuild_fts_table, migrations.RunPython.noop),
+    ]
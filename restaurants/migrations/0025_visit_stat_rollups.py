@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+
+def fill_visit_stats(apps, schema_editor):
+    Visit = apps.get_model("restaurants", "Visit")
+    MonthlyVisitStat = apps.get_model("restaurants", "MonthlyVisitStat")
+    GenreVisitStat = apps.get_model("restaurants", "GenreVisitStat")
+
+    monthly = {}
+    genres = {}
+    rows = (
+        Visit.objects
+        .annotate(month=TruncMonth("date"))
+        .values("restaurant__user_id", "restaurant__genre", "month")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    for row in rows:
+        user_id = row["restaurant__user_id"]
+        genre = row["restaurant__genre"] or "未分類"
+        genres[(user_id, genre)] = genres.get((user_id, genre), 0) + row["count"]
+        if row["month"] is not None:
+            monthly[(user_id, row["month"])] = monthly.get((user_id, row["month"]), 0) + row["count"]
+
+    MonthlyVisitStat.objects.bulk_create(
+        [MonthlyVisitStat(user_id=user_id, month=month, count=count) for (user_id, month), count in monthly.items()],
+        batch_size=1000,
+    )
+    GenreVisitStat.objects.bulk_create(
+        [GenreVisitStat(user_id=user_id, genre=genre, count=count) for (user_id, genre), count in genres.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0024_restaurant_holiday_bitmask'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenreVisitStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'genre'), name='genre_visit_stat_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyVisitStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='monthly_visit_stat_unique')],
+            },
+        ),
+        migrations.RunPython(fill_visit_stats, migrations.RunPython.noop),
+    ]
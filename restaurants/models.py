@@ -1,5 +1,10 @@
 from django.db import models
+from django.db.models import Avg, Count, Max, Min, OuterRef, Prefetch, Subquery
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .fields import DaySetField
+from .storage import get_visit_image_storage
 
 User = get_user_model()
 
@@ -10,6 +15,23 @@ STATUS_CHOICES = [
 ]
 
 
+class TagQuerySet(models.QuerySet):
+    def get_or_create_names(self, names):
+        """タグ名のリストから Tag をまとめて取得・作成する（1件ずつ get_or_create しない）"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return []
+
+        tags = {tag.name: tag for tag in self.filter(name__in=names)}
+        missing = [name for name in names if name not in tags]
+        if missing:
+            # 同時に作られても一意制約で弾かれるだけにして、作り直した分を読み直す
+            self.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+            tags.update((tag.name, tag) for tag in self.filter(name__in=missing))
+
+        return [tags[name] for name in names if name in tags]
+
+
 class Tag(models.Model):
     CATEGORY_CHOICES = [
         ('genre', 'ジャンル'),
@@ -22,9 +44,85 @@ class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='custom')  
 
+    objects = TagQuerySet.as_manager()
 
     def __str__(self):
         return self.name
+
+
+class RestaurantQuerySet(models.QuerySet):
+    def with_card_data(self):
+        """一覧カードで使うタグ・最新の訪問・カバー写真を固定回数のクエリで先読みする"""
+        latest_visit_id = (
+            Visit.objects
+            .filter(restaurant=OuterRef("restaurant"))
+            .order_by("-id")
+            .values("id")[:1]
+        )
+        return self.select_related("cover_image").prefetch_related(
+            "tags",
+            Prefetch(
+                "visits",
+                queryset=Visit.objects.filter(id=Subquery(latest_visit_id)),
+                to_attr="latest_visits",
+            ),
+        )
+
+    def touch(self):
+        """updated_at だけ進める（タグの付け外しなど、行を保存しない変更でカードを作り直させる）"""
+        return self.update(updated_at=timezone.now())
+
+    def refresh_visit_summaries(self):
+        """対象のお店の訪問サマリー（最終訪問日・訪問回数・平均評価・カバー写真）を再計算する"""
+        ids = list(self.values_list("id", flat=True))
+        if not ids:
+            return 0
+
+        stats = {
+            row["restaurant_id"]: row
+            for row in (
+                Visit.objects
+                .filter(restaurant_id__in=ids)
+                .values("restaurant_id")
+                .annotate(
+                    count=Count("id"),
+                    avg=Avg("rating"),
+                    last_date=Max("date"),
+                    latest_id=Max("id"),
+                )
+                .order_by()
+            )
+        }
+
+        # カバー写真 = 最新の訪問の1枚目
+        covers = dict(
+            VisitImage.objects
+            .filter(visit_id__in=[row["latest_id"] for row in stats.values()])
+            .values("visit_id")
+            .annotate(first_id=Min("id"))
+            .values_list("visit_id", "first_id")
+            .order_by()
+        )
+
+        now = timezone.now()
+        updates = []
+        for restaurant_id in ids:
+            row = stats.get(restaurant_id)
+            updates.append(Restaurant(
+                id=restaurant_id,
+                visit_count=row["count"] if row else 0,
+                avg_rating=row["avg"] if row else None,
+                last_visit_date=row["last_date"] if row else None,
+                cover_image_id=covers.get(row["latest_id"]) if row else None,
+                updated_at=now,
+            ))
+
+        return Restaurant.objects.bulk_update(
+            updates,
+            ["visit_count", "avg_rating", "last_visit_date", "cover_image", "updated_at"],
+            batch_size=500,
+        )
+
     
 class Restaurant(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -34,11 +132,25 @@ class Restaurant(models.Model):
     genre = models.CharField(max_length=50)
     companions = models.CharField(max_length=50, blank=True, null=True)
     scene = models.CharField(max_length=50, blank=True, null=True)
-    holiday = models.CharField(max_length=50, blank=True, null=True)
     tags = models.ManyToManyField(Tag, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='want', verbose_name='ステータス')
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # ★ 一覧・詳細の ETag / Last-Modified とカードの断片キャッシュの版数
+    # （bulk_update・update()・タグの付け外しのときも更新する）
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # ★ 訪問サマリー（Visit / VisitImage の保存・削除時に更新。refresh_visit_summary コマンドで再計算）
+    last_visit_date = models.DateField(null=True, blank=True)
+    visit_count = models.PositiveIntegerField(default=0)
+    avg_rating = models.FloatField(null=True, blank=True)
+    cover_image = models.ForeignKey(
+        "VisitImage",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
     
     DAY_CHOICES = [
         ('月', '月曜日'),
@@ -53,17 +165,66 @@ class Restaurant(models.Model):
         ('不定休', '不定休'),
     ]
     
-    holiday = models.CharField(
-        max_length=50,
-        blank=True,
-        null=True,
-        verbose_name="休業日"
-    )
+    # ★ DAY_CHOICES の複数選択をビット列で持つ（restaurants.fields）。holiday__has_any=["月", "火"] で検索する
+    holiday = DaySetField(days=DAY_CHOICES, blank=True, verbose_name="休業日")
+
+    objects = RestaurantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-avg_rating"], name="restaurant_user_rating_idx"),
+            # 一覧（user + status で絞って新しい順）とキーセット方式のページ送り
+            models.Index(fields=["user", "status", "-created_at", "-id"], name="restaurant_user_status_idx"),
+            # 検索結果（status を指定しない一覧）
+            models.Index(fields=["user", "-created_at", "-id"], name="restaurant_user_created_idx"),
+            # 休業日の絞り込み（holiday & マスク をテーブルを読まずに索引の上で判定する）
+            models.Index(fields=["user", "holiday"], name="restaurant_user_holiday_idx"),
+            # 一覧の更新確認（件数と最終更新日時を索引だけで数える）
+            models.Index(fields=["user", "status", "updated_at"], name="restaurant_user_updated_idx"),
+        ]
     
     
     def __str__(self):
         return self.store_name
-    
+
+    def refresh_visit_summary(self):
+        Restaurant.objects.filter(pk=self.pk).refresh_visit_summaries()
+
+    def set_tag_names(self, names):
+        """タグを names にそろえる（増えた・減った分だけ中間テーブルを書き換える）"""
+        self.tags.set(Tag.objects.get_or_create_names(names))
+
+    @property
+    def latest_visit(self):
+        """最新の訪問（with_card_data() で先読み済みならクエリしない）"""
+        if hasattr(self, "latest_visits"):
+            return self.latest_visits[0] if self.latest_visits else None
+        return self.visits.order_by("-id").first()
+
+class VisitQuerySet(models.QuerySet):
+    def delete_with_images(self):
+        """訪問と写真をまとめて消す（件数によらず一定回数の SQL）
+
+        通常の delete() なのでシグナルは送られる。batched_visit_changes() の中で消すので、
+        受け取った側の後処理（写真の参照の解放・サマリーと集計表の更新・グラフのキャッシュの更新）は
+        1件ずつではなく最後にまとめて行われる。ファイルの実体は参照が外れたあと purge_image_blobs が消す。
+        呼び出し側で transaction.atomic() に入れて使う。
+        """
+        from .signals import batched_visit_changes
+
+        rows = list(self.values_list("id", "restaurant_id", "restaurant__user_id", "restaurant__genre").order_by())
+        if not rows:
+            return 0
+
+        # 後処理で1件ずつお店を読まないよう、訪問のお店とお店の持ち主・ジャンルを先に渡しておく
+        with batched_visit_changes(
+            visits={visit_id: restaurant_id for visit_id, restaurant_id, _, _ in rows},
+            owners={restaurant_id: (user_id, genre) for _, restaurant_id, user_id, genre in rows},
+        ):
+            _, deleted = Visit.objects.filter(id__in=[row[0] for row in rows]).delete()
+        return deleted.get(Visit._meta.label, 0)
+
+
 class Visit(models.Model):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name="visits")
     date = models.DateField(null=True, blank=True)
@@ -82,18 +243,72 @@ class Visit(models.Model):
         blank=True, null=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = VisitQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # お店ごとの訪問履歴（日付順）と月別集計
+            models.Index(fields=["restaurant", "-date"], name="visit_restaurant_date_idx"),
+        ]
 
     def __str__(self):
         return f"{self.restaurant.store_name} ({self.date})"
 
+    def add_images(self, files):
+        """写真をまとめて登録し、取り込み処理をジョブに積む（INSERT はそれぞれ1回）
+
+        bulk_create は VisitImage のシグナルを送らないため、カバー写真の更新とデータ版数の更新もここで行う。
+        呼び出し側で transaction.atomic() に入れ、さらに visit_image_storage.discard_on_error() で
+        囲んで使う（失敗したときに書き出したファイルを消す。参照数はロールバックで戻る）。
+        """
+        from .charts import bump_data_version
+        from .images import check_image
+        from .jobs import enqueue_many
+
+        # 写真として読めるかだけ確かめる（縮小などの重い処理はワーカーで行う）
+        for file in files:
+            check_image(file)
+
+        images = [VisitImage(visit=self, image=file, status="pending") for file in files]
+        if not images:
+            return []
+
+        VisitImage.objects.bulk_create(images)
+        enqueue_many("process_visit_image", [{"image_id": image.pk} for image in images])
+
+        Restaurant.objects.filter(pk=self.restaurant_id).refresh_visit_summaries()
+        bump_data_version(self.restaurant.user_id)
+        return images
+
 
 class VisitImage(models.Model):
     visit = models.ForeignKey(Visit, on_delete=models.CASCADE, related_name="images")
-    image = models.ImageField(upload_to='visit_images/')
+    # ★ 内容のハッシュで保存する（restaurants.storage）。同じ写真は1つのファイルを共有する
+    image = models.ImageField(upload_to='visit_images/', storage=get_visit_image_storage)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # ★ 縮小版のパス {"card": {"webp": "visit_images/abc.card.webp", "jpg": ...}, ...}
+    renditions = models.JSONField(default=dict, blank=True)
+    # ★ 取り込み処理（restaurants.tasks.process_visit_image）の状態。処理待ちの間はプレースホルダーを出す
+    STATUS_CHOICES = [
+        ("pending", "処理待ち"),
+        ("ready", "完了"),
+        ("failed", "失敗"),
+    ]
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="ready")
 
     def __str__(self):
         return f"Image for {self.visit.restaurant.store_name} ({self.visit.date})"
+
+    def rendition_paths(self):
+        return [path for formats in (self.renditions or {}).values() for path in formats.values()]
+
+    def delete_files(self):
+        """原本と縮小版のファイルへの参照を外す（行は消さない。実体は purge_image_blobs で消える）"""
+        storage = self.image.storage
+        for path in [self.image.name] + self.rendition_paths():
+            storage.delete(path)
     
 
 class SuggestWord(models.Model):
@@ -107,12 +322,108 @@ class SuggestWord(models.Model):
 
     word_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
     word = models.CharField(max_length=50)
+    # ★ 前方一致用の読みキー（restaurants.suggest.search_key）
+    # NFKC で長くなる文字（㍿ → 株式会社 など）があるので word より広く取る
+    search_key = models.CharField(max_length=200, blank=True, default="")
 
     class Meta:
         unique_together = ('word_type', 'word')
+        indexes = [
+            models.Index(fields=["word_type", "search_key"], name="suggest_type_key_idx"),
+        ]
 
     def __str__(self):
         return f"{self.word_type}: {self.word}"
 
 
+# -----------------------------
+# ★ 訪問集計のロールアップ（restaurants.rollups）
+# -----------------------------
+class MonthlyVisitStat(models.Model):
+    """ユーザーの月別の訪問件数（month は月初日）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    month = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "month"], name="monthly_visit_stat_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m}: {self.count}"
+
+
+class GenreVisitStat(models.Model):
+    """ユーザーのジャンル別の訪問件数（ジャンルはお店の genre、空なら「未分類」）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    genre = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "genre"], name="genre_visit_stat_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.genre}: {self.count}"
+
+
+class ImageBlob(models.Model):
+    """ストレージ上のファイル1つと、それを指している参照の数（restaurants.storage）"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # 参照が 0 になった時刻（purge の猶予を数える）
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["ref_count", "released_at"], name="blob_released_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+# -----------------------------
+# ★ バックグラウンドジョブ（restaurants.jobs）
+# -----------------------------
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "待ち"),
+        ("running", "実行中"),
+    ]
 
+    task = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # ワーカーが次のジョブを探す（status = pending AND run_after <= now）
+            models.Index(fields=["status", "run_after"], name="job_status_run_after_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+
+class DeadJob(models.Model):
+    """再試行しても失敗したジョブ（run_jobs --requeue-dead で戻せる）"""
+    task = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.task} ({self.failed_at:%Y-%m-%d %H:%M})"
@@ -0,0 +1,169 @@
+"""ログイン中のユーザーごとのページキャッシュ
+
+一覧（行きたい・行った）と検索画面・検索結果の HTML を、
+  ユーザーID・データ版数（charts.get_data_version）・パス・正規化したクエリ
+をキーにして settings.CACHES の "default" に保存する。お店・訪問・写真・タグが変わると
+シグナルで版数が上がるので、古いページは消さなくても使われなくなる。
+
+キャッシュに当たったときはセッションの中身だけでキーを作り、ユーザーを読み込まない
+（SESSION_ENGINE を cached_db にしておけば、タブを行き来するだけなら DB に触れない）。
+版数・セッションをワーカー間で共有できないキャッシュ（locmem）ではページキャッシュを使わない
+（別のワーカーで上げた版数・ログアウトが見えず、古いページを返してしまうため）。
+
+ブラウザ側のキャッシュには conditional_page() で ETag / Last-Modified を付け、
+内容が変わっていなければ描画せずに 304 を返す（一覧・詳細・マイページ）。
+
+どちらも次の場合は使わない。
+  - 表示待ちのメッセージがある・表示中にメッセージが追加された
+  - CSRF トークンを新しく発行した（Cookie が無い）
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .charts import get_data_version
+
+
+PAGE_CACHE_KEY = "savoiry:page:{user_id}:{version}:{digest}"
+
+
+def normalize_query(querydict):
+    """空の値を除き、キーと値を並べ替えたクエリ文字列（?b=2&a=1 と ?a=1&b=2&c= を同じにする）"""
+    items = []
+    for key in sorted(querydict):
+        items.extend((key, value) for value in sorted(querydict.getlist(key)) if value)
+    return urlencode(items)
+
+
+def page_cache_enabled():
+    """ワーカー間で共有されるキャッシュのときだけ True"""
+    return settings.SHARED_CACHE and not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def cacheable_user_id(request):
+    """キャッシュしてよいリクエストならセッションのユーザーIDを返す（ユーザーは読み込まない）"""
+    if request.method not in ("GET", "HEAD"):
+        return None
+
+    session = request.session
+    user_id = session.get(SESSION_KEY)
+    if user_id is None or session.get("just_signed_up"):
+        return None
+    if len(messages.get_messages(request)):
+        return None
+    return user_id
+
+
+def page_digest(request, *values):
+    raw = "\0".join([
+        request.path,
+        normalize_query(request.GET),
+        # パスワードが変わったセッション・別の CSRF トークンとは共有しない
+        request.session.get(HASH_SESSION_KEY, ""),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        *map(str, values),
+    ])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def page_cache_key(request):
+    """キャッシュのキー（使えないリクエストは None）"""
+    user_id = cacheable_user_id(request)
+    if user_id is None:
+        return None
+    return PAGE_CACHE_KEY.format(
+        user_id=user_id,
+        version=get_data_version(user_id),
+        digest=page_digest(request),
+    )
+
+
+def is_cacheable(request, response):
+    if response.status_code != 200 or response.cookies:
+        return False
+    if len(messages.get_messages(request)):
+        return False
+    if request.META.get("CSRF_COOKIE_NEEDS_UPDATE") and settings.CSRF_COOKIE_NAME not in request.COOKIES:
+        return False
+    return True
+
+
+class UserPageCacheMixin:
+    """ビューの先頭（LoginRequiredMixin より前）に置いて、描画済みの HTML をキャッシュする"""
+
+    page_cache_timeout = None
+
+    def dispatch(self, request, *args, **kwargs):
+        key = page_cache_key(request) if page_cache_enabled() else None
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = super().dispatch(request, *args, **kwargs)
+        timeout = self.page_cache_timeout or settings.PAGE_CACHE_TIMEOUT
+
+        def store(response):
+            if is_cacheable(request, response):
+                cache.set(key, (response.content, response["Content-Type"]), timeout)
+
+        after_render(response, store)
+        return response
+
+
+def after_render(response, callback):
+    """描画が済んでから callback(response) を呼ぶ（TemplateResponse は描画後に回す）"""
+    if hasattr(response, "add_post_render_callback") and not response.is_rendered:
+        response.add_post_render_callback(callback)
+    else:
+        callback(response)
+
+
+def conditional_page(get_validators):
+    """ETag / Last-Modified を付け、変わっていなければ描画せずに 304 を返すデコレーター
+
+    get_validators(user_id, **kwargs) は (最終更新日時, 件数などの値...) を返す。
+    None を返したとき（他人のお店など）はそのままビューに任せる。
+    ETag にはデータ版数も入れるので、updated_at が変わらない変更（タグ名・写真）でも外れる。
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            user_id = cacheable_user_id(request)
+            validators = get_validators(user_id, **kwargs) if user_id is not None else None
+            if validators is None:
+                return view_func(request, *args, **kwargs)
+
+            updated_at, *values = validators
+            version = get_data_version(user_id)
+            etag = quote_etag(page_digest(request, version, updated_at, *values))
+            last_modified = max(int(updated_at.timestamp()) if updated_at else 0, version // 1000)
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+
+            def add_validators(response):
+                if response.status_code == 304 or is_cacheable(request, response):
+                    response["ETag"] = etag
+                    response["Last-Modified"] = http_date(last_modified)
+                    patch_cache_control(response, private=True, no_cache=True)
+
+            after_render(response, add_validators)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """キーセット方式の1ページ分（次ページの位置は cursor で表す）"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """壊れた cursor は None（先頭ページ扱い）にする"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # 注釈（annotate）した値はそのまま JSON に載せる
+        return None
+
+
+def paginate_keyset(queryset, cursor, per_page, ordering):
+    """ordering（例: ("-created_at", "-id")）の並びで cursor の続きから per_page 件を返す
+
+    OFFSET を使わず「前のページの最後の行より後ろ」を WHERE で指定するため、
+    何ページ目でもインデックスを per_page 件分たどるだけで済む。
+    ordering の最後は一意な列（id）にすること。
+    """
+    model = queryset.model
+    names = [name.lstrip("-") for name in ordering]
+    fields = [_field(model, name) for name in names]
+
+    queryset = queryset.order_by(*ordering)
+
+    values = decode_cursor(cursor) if cursor else None
+    if values is not None and len(values) == len(names):
+        try:
+            values = [
+                field.to_python(value) if field is not None else value
+                for field, value in zip(fields, values)
+            ]
+        except ValidationError:
+            values = None
+
+        if values is not None:
+            # (a, b) < (x, y)  ⇔  a < x OR (a = x AND b < y)
+            condition = Q()
+            for i, order in enumerate(ordering):
+                lookup = "lt" if order.startswith("-") else "gt"
+                step = Q(**{f"{names[i]}__{lookup}": values[i]})
+                for j in range(i):
+                    step &= Q(**{names[j]: values[j]})
+                condition |= step
+            queryset = queryset.filter(condition)
+
+    rows = list(queryset[:per_page + 1])
+    if len(rows) <= per_page:
+        return KeysetPage(rows, None)
+
+    rows = rows[:per_page]
+    last = rows[-1]
+    next_values = []
+    for name, field in zip(names, fields):
+        if field is not None:
+            next_values.append(field.value_to_string(last))
+        else:
+            next_values.append(getattr(last, name))
+    return KeysetPage(rows, encode_cursor(next_values))
+
+
+class KeysetPaginationMixin:
+    """ListView を (created_at, id) のキーセット方式でページ分割する
+
+    次のページ用のクエリ文字列を next_page_query としてテンプレートに渡す。
+    keyset_extra_params はカード断片エンドポイント（restaurant_cards）に
+    渡す絞り込み条件（例: {"status": "want"}）。
+    """
+    paginate_by = 20
+    keyset_ordering = ("-created_at", "-id")
+    keyset_extra_params = {}
+    cursor_param = "cursor"
+
+    def paginate_queryset(self, queryset, page_size):
+        page = paginate_keyset(
+            queryset,
+            self.request.GET.get(self.cursor_param),
+            page_size,
+            self.keyset_ordering,
+        )
+        return None, page, page.object_list, page.has_next
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get("page_obj")
+
+        if page is not None and page.has_next:
+            params = self.request.GET.copy()
+            for key, value in self.keyset_extra_params.items():
+                params[key] = value
+            params[self.cursor_param] = page.next_cursor
+            context["next_page_query"] = params.urlencode()
+
+        return context
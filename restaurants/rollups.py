@@ -0,0 +1,124 @@
+"""ユーザーごとの訪問集計（月別・ジャンル別）のロールアップ
+
+グラフ（visit_stats）のたびに訪問履歴を全件集計しないよう、件数を MonthlyVisitStat /
+GenreVisitStat に持ち、訪問の追加・削除・付け替え（日付・お店の変更）とお店のジャンル変更の
+たびに差分だけ足し引きする（restaurants.signals）。
+お店ごとの評価は Restaurant の訪問サマリー（visit_count / avg_rating）が同じ役割を持つ。
+
+ずれたときは manage.py rebuild_visit_stats（--verify で確認だけ）で作り直す。
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+
+from .models import GenreVisitStat, MonthlyVisitStat, Restaurant, Visit
+
+
+UNCATEGORIZED = "未分類"
+
+
+def genre_key(genre):
+    return genre or UNCATEGORIZED
+
+
+def month_key(date):
+    return date.replace(day=1) if date else None
+
+
+def visit_deltas(restaurant_id, date, sign, owner=None):
+    """訪問1件を足す（sign=1）・引く（sign=-1）ときの差分
+
+    owner（お店の (user_id, genre)）を渡せばお店を読まない。
+    """
+    date = Visit._meta.get_field("date").to_python(date)
+    if owner is None:
+        owner = Restaurant.objects.filter(pk=restaurant_id).values_list("user_id", "genre").first()
+    if owner is None:
+        return Counter()
+    user_id, genre = owner
+
+    deltas = Counter({("genre", user_id, genre_key(genre)): sign})
+    if date:
+        deltas[("month", user_id, month_key(date))] += sign
+    return deltas
+
+
+def queryset_deltas(visits, sign=-1):
+    """訪問の queryset をまとめて足す・引くときの差分（集計クエリ1回）"""
+    rows = (
+        visits
+        .annotate(month=TruncMonth("date"))
+        .values("restaurant__user_id", "restaurant__genre", "month")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    deltas = Counter()
+    for row in rows:
+        user_id = row["restaurant__user_id"]
+        deltas[("genre", user_id, genre_key(row["restaurant__genre"]))] += sign * row["count"]
+        if row["month"] is not None:
+            deltas[("month", user_id, row["month"])] += sign * row["count"]
+    return deltas
+
+
+def apply_deltas(deltas):
+    """差分を集計表に反映する（キーごとに UPDATE 1回。無ければ作り、0 以下になった行は消す）"""
+    for (kind, user_id, key), delta in deltas.items():
+        if not delta:
+            continue
+        model, field = (MonthlyVisitStat, "month") if kind == "month" else (GenreVisitStat, "genre")
+        lookup = {"user_id": user_id, field: key}
+
+        with transaction.atomic():
+            updated = model.objects.filter(**lookup).update(count=F("count") + delta)
+            if not updated and delta > 0:
+                _, created = model.objects.get_or_create(**lookup, defaults={"count": delta})
+                if not created:
+                    model.objects.filter(**lookup).update(count=F("count") + delta)
+            elif updated and delta < 0:
+                model.objects.filter(**lookup, count__lte=0).delete()
+
+
+def compute(user_ids=None):
+    """訪問履歴から集計し直した差分（足す向き）を返す"""
+    visits = Visit.objects.all()
+    if user_ids is not None:
+        visits = visits.filter(restaurant__user_id__in=user_ids)
+    return queryset_deltas(visits, sign=1)
+
+
+def stored(user_ids=None):
+    """今の集計表の中身を compute() と同じ形で返す"""
+    counts = Counter()
+    for model, field, kind in ((MonthlyVisitStat, "month", "month"), (GenreVisitStat, "genre", "genre")):
+        queryset = model.objects.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        for user_id, key, count in queryset.values_list("user_id", field, "count"):
+            counts[(kind, user_id, key)] = count
+    return counts
+
+
+def rebuild(user_ids=None):
+    """集計表を訪問履歴から作り直す"""
+    counts = compute(user_ids)
+    with transaction.atomic():
+        for model in (MonthlyVisitStat, GenreVisitStat):
+            queryset = model.objects.all()
+            if user_ids is not None:
+                queryset = queryset.filter(user_id__in=user_ids)
+            queryset.delete()
+
+        MonthlyVisitStat.objects.bulk_create(
+            [MonthlyVisitStat(user_id=user_id, month=key, count=count)
+             for (kind, user_id, key), count in counts.items() if kind == "month"],
+            batch_size=1000,
+        )
+        GenreVisitStat.objects.bulk_create(
+            [GenreVisitStat(user_id=user_id, genre=key, count=count)
+             for (kind, user_id, key), count in counts.items() if kind == "genre"],
+            batch_size=1000,
+        )
+    return counts
@@ -0,0 +1,223 @@
+"""お店検索のバックエンド
+
+SQLite では FTS5、PostgreSQL では pg_trgm（GIN インデックス）を使い、
+どちらも get_search_backend().filter(queryset, criteria) の同じ形で呼び出す。
+criteria は {"genre": "ラーメン", "scene": ["ランチ", "デート"], ...} のような列名と検索語の辞書で、
+列どうしは AND、リストで渡した検索語どうしは OR になる。
+
+日本語は単語の区切りが無いため、SQLite では文字 bigram に分けて索引を作る
+（「ラーメン」→「ラー ーメ メン ン」）。検索語も同じように分けてフレーズ検索する。
+FTS5 の索引には持ち主を表す owner 列（"u<user_id>"）も入れ、他のユーザーのお店を
+全文検索の段階で除外する。休業日はビット列（holiday__has_any）で絞るので索引に入れない。
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Exists, FloatField, OuterRef, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Restaurant
+
+
+SEARCH_FIELDS = ["genre", "area", "companions", "scene", "tags"]
+
+FTS_TABLE = "restaurants_search"
+
+_WORD_SPLIT = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def ngram_tokens(text):
+    """索引用：語ごとの bigram と、末尾1文字（1文字検索用）"""
+    tokens = []
+    for word in _WORD_SPLIT.split(normalize(text)):
+        if not word:
+            continue
+        tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        tokens.append(word[-1])
+    return " ".join(tokens)
+
+
+def ngram_query(text):
+    """検索語を FTS5 の検索式に変換する（語が複数あれば AND）"""
+    parts = []
+    for word in _WORD_SPLIT.split(normalize(text)):
+        if not word:
+            continue
+        if len(word) == 1:
+            parts.append(f"{word}*")
+        else:
+            bigrams = " ".join(word[i:i + 2] for i in range(len(word) - 1))
+            parts.append(f'"{bigrams}"')
+    return " AND ".join(parts)
+
+
+def restaurant_document(restaurant):
+    """索引に載せる各列の値（tags は空白区切りのタグ名）"""
+    document = {field: getattr(restaurant, field) or "" for field in SEARCH_FIELDS if field != "tags"}
+    document["tags"] = " ".join(restaurant.tags.values_list("name", flat=True))
+    return document
+
+
+def _values(value):
+    values = value if isinstance(value, (list, tuple)) else [value]
+    return [v for v in values if v]
+
+
+class SearchBackend:
+    # True のとき filter() は search_rank（小さいほど上位）を注釈することがある
+    # （検索語が記号だけで語が無いときなどは注釈しないので、is_ranked() で確かめる）
+    ranked = False
+
+    def filter(self, queryset, criteria, user=None):
+        """criteria で絞り込んだ queryset を返す（user を渡すとそのユーザーのお店に限定）"""
+        raise NotImplementedError
+
+    def is_ranked(self, queryset):
+        """filter() の結果が search_rank で並べられるか"""
+        return self.ranked and "search_rank" in queryset.query.annotations
+
+    def index(self, restaurant):
+        pass
+
+    def remove(self, restaurant_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """索引を持たない既定の実装（icontains）"""
+
+    def filter(self, queryset, criteria, user=None):
+        if user is not None:
+            queryset = queryset.filter(user=user)
+        for field, value in criteria.items():
+            condition = Q()
+            for v in _values(value):
+                if field == "tags":
+                    # JOIN すると行が重複するので EXISTS で絞る
+                    condition |= Q(Exists(
+                        Restaurant.tags.through.objects.filter(
+                            restaurant_id=OuterRef("pk"),
+                            tag__name__icontains=v,
+                        )
+                    ))
+                else:
+                    condition |= Q(**{f"{field}__icontains": v})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+class SqliteFTS5SearchBackend(SearchBackend):
+    ranked = True
+
+    def filter(self, queryset, criteria, user=None):
+        if user is not None:
+            queryset = queryset.filter(user=user)
+
+        clauses = []
+        for field, value in criteria.items():
+            queries = [q for q in (ngram_query(v) for v in _values(value)) if q]
+            if queries:
+                clauses.append(f"{field} : ({' OR '.join(f'({q})' for q in queries)})")
+        if not clauses:
+            return queryset
+        if user is not None:
+            clauses.insert(0, f"owner : u{user.pk}")
+        match = " AND ".join(clauses)
+
+        table = Restaurant._meta.db_table
+        return queryset.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            search_rank=RawSQL(
+                # owner 列は順位に影響させない（重み 0）
+                f"SELECT bm25({FTS_TABLE}, 0) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    def index(self, restaurant):
+        document = restaurant_document(restaurant)
+        columns = ", ".join(SEARCH_FIELDS)
+        placeholders = ", ".join(["%s"] * len(SEARCH_FIELDS))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [restaurant.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, owner, {columns}) VALUES (%s, %s, {placeholders})",
+                [restaurant.pk, f"u{restaurant.user_id}"]
+                + [ngram_tokens(document[field]) for field in SEARCH_FIELDS],
+            )
+
+    def remove(self, restaurant_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [restaurant_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        for restaurant in Restaurant.objects.prefetch_related("tags").iterator(chunk_size=500):
+            self.index(restaurant)
+
+
+class PostgresTrigramSearchBackend(SearchBackend):
+    """pg_trgm の GIN インデックスで icontains を索引検索にし、類似度で並べる"""
+    ranked = True
+
+    def filter(self, queryset, criteria, user=None):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        if user is not None:
+            queryset = queryset.filter(user=user)
+
+        rank = Value(0.0)
+        for field, value in criteria.items():
+            condition = Q()
+            for v in _values(value):
+                if field == "tags":
+                    condition |= Q(Exists(
+                        Restaurant.tags.through.objects.filter(
+                            restaurant_id=OuterRef("pk"),
+                            tag__name__icontains=v,
+                        )
+                    ))
+                else:
+                    condition |= Q(**{f"{field}__icontains": v})
+                    rank = rank + TrigramSimilarity(field, v)
+            queryset = queryset.filter(condition)
+
+        # 他の実装と同じく「小さいほど上位」にそろえる
+        return queryset.annotate(search_rank=-rank)
+
+
+def fts5_available():
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        if connection.vendor == "postgresql":
+            _backend = PostgresTrigramSearchBackend()
+        elif fts5_available():
+            _backend = SqliteFTS5SearchBackend()
+        else:
+            _backend = DatabaseSearchBackend()
+    return _backend
@@ -0,0 +1,288 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .charts import bump_data_version
+from .models import Restaurant, SuggestWord, Tag, Visit, VisitImage
+from .rollups import apply_deltas, genre_key, visit_deltas
+from .search import get_search_backend
+from .suggest import bump_suggest_version, search_key
+
+
+# -----------------------------
+# ★ まとめて消すときの後処理（VisitQuerySet.delete_with_images）
+# -----------------------------
+_batch = threading.local()
+
+
+class VisitChanges:
+    """batched_visit_changes() の中で受け取ったシグナルの後処理をためておく"""
+
+    def __init__(self, visits, owners):
+        self.visits = dict(visits)          # 訪問ID → お店ID
+        self.owners = dict(owners)          # お店ID → (user_id, genre)
+        self.restaurant_ids = set()
+        self.deltas = Counter()
+        self.names = []
+
+    def owner(self, restaurant_id):
+        if restaurant_id not in self.owners:
+            self.owners[restaurant_id] = (
+                Restaurant.objects.filter(pk=restaurant_id).values_list("user_id", "genre").first()
+            )
+        return self.owners[restaurant_id]
+
+    def flush(self):
+        from .storage import visit_image_storage
+
+        visit_image_storage.release_many(self.names)
+        apply_deltas(self.deltas)
+        restaurants = Restaurant.objects.filter(pk__in=self.restaurant_ids)
+        restaurants.refresh_visit_summaries()
+        for user_id in set(restaurants.values_list("user_id", flat=True)):
+            bump_data_version(user_id)
+
+
+@contextmanager
+def batched_visit_changes(visits=(), owners=()):
+    """中で送られた訪問・写真のシグナルの後処理を、抜けるときにまとめて1回ずつ行う
+
+    visits（訪問ID → お店ID）と owners（お店ID → (user_id, genre)）を渡しておくと、
+    受け取った側はお店を読まずに済む（件数によらず一定回数の SQL になる）。
+    """
+    if getattr(_batch, "changes", None) is not None:
+        # 入れ子は外側でまとめて行う
+        _batch.changes.visits.update(visits)
+        _batch.changes.owners.update(owners)
+        yield _batch.changes
+        return
+
+    changes = _batch.changes = VisitChanges(visits, owners)
+    try:
+        yield changes
+    finally:
+        _batch.changes = None
+    changes.flush()
+
+
+def current_changes():
+    return getattr(_batch, "changes", None)
+
+
+def visit_user_id(visit):
+    """Visit の持ち主のユーザーIDを返す（関連が読み込み済みならクエリしない）"""
+    if Visit.restaurant.is_cached(visit):
+        return visit.restaurant.user_id
+    return (
+        Restaurant.objects
+        .filter(pk=visit.restaurant_id)
+        .values_list("user_id", flat=True)
+        .first()
+    )
+
+
+@receiver([post_save, post_delete], sender=Visit)
+def visit_changed(sender, instance, **kwargs):
+    # 別のお店に付け替えられたときは、前のお店のサマリー（回数・平均・カバー写真）も作り直す
+    restaurant_ids = {instance.restaurant_id}
+    previous = getattr(instance, "_rollup_previous", None)
+    if previous:
+        restaurant_ids.add(previous[0])
+
+    changes = current_changes()
+    if changes is not None:
+        changes.restaurant_ids |= restaurant_ids
+        return
+
+    user_id = visit_user_id(instance)
+    if user_id is not None:
+        bump_data_version(user_id)
+    Restaurant.objects.filter(pk__in=restaurant_ids).refresh_visit_summaries()
+
+
+@receiver([post_save, post_delete], sender=VisitImage)
+def visit_image_changed(sender, instance, **kwargs):
+    # カバー写真が変わる可能性があるため
+    changes = current_changes()
+    if changes is not None and instance.visit_id in changes.visits:
+        changes.restaurant_ids.add(changes.visits[instance.visit_id])
+        return
+
+    restaurants = Restaurant.objects.filter(visits__id=instance.visit_id)
+    restaurants.refresh_visit_summaries()
+    for user_id in restaurants.values_list("user_id", flat=True):
+        bump_data_version(user_id)
+
+
+@receiver(post_delete, sender=VisitImage)
+def release_visit_image_files(sender, instance, **kwargs):
+    # 訪問・お店ごと消えた場合（カスケード）もここを通る
+    changes = current_changes()
+    if changes is not None:
+        changes.names.extend([instance.image.name] + instance.rendition_paths())
+        return
+    instance.delete_files()
+
+
+@receiver([post_save, post_delete], sender=Restaurant)
+def restaurant_changed(sender, instance, **kwargs):
+    # ジャンル変更もグラフに影響するため
+    bump_data_version(instance.user_id)
+
+
+@receiver(post_save, sender=Tag)
+def tag_changed(sender, instance, created, **kwargs):
+    # タグ名の変更はそのタグが付いたお店のカードに出る
+    if created:
+        return
+    restaurants = Restaurant.objects.filter(tags=instance)
+    user_ids = set(restaurants.values_list("user_id", flat=True))
+    restaurants.touch()
+    for user_id in user_ids:
+        bump_data_version(user_id)
+
+
+@receiver(m2m_changed, sender=Restaurant.tags.through)
+def restaurant_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        Restaurant.objects.filter(pk=instance.pk).touch()
+        bump_data_version(instance.user_id)
+    elif pk_set:
+        restaurants = Restaurant.objects.filter(pk__in=pk_set)
+        user_ids = set(restaurants.values_list("user_id", flat=True))
+        restaurants.touch()
+        for user_id in user_ids:
+            bump_data_version(user_id)
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    # パスワード変更・無効化・退会のあと、古いセッションでキャッシュ済みのページを返さないため
+    bump_data_version(instance.pk)
+
+
+# -----------------------------
+# ★ 訪問集計のロールアップ（restaurants.rollups）
+# -----------------------------
+@receiver(pre_save, sender=Visit)
+def remember_visit_keys(sender, instance, update_fields=None, **kwargs):
+    # お店・日付が変わったときに前の値の分を引けるよう、保存前の値を覚えておく
+    instance._rollup_previous = None
+    if instance._state.adding or (update_fields is not None and not {"date", "restaurant"} & set(update_fields)):
+        return
+    instance._rollup_previous = (
+        Visit.objects.filter(pk=instance.pk).values_list("restaurant_id", "date").first()
+    )
+
+
+@receiver(post_save, sender=Visit)
+def update_visit_rollups(sender, instance, created, **kwargs):
+    deltas = Counter()
+    previous = getattr(instance, "_rollup_previous", None)
+    if created:
+        deltas.update(visit_deltas(instance.restaurant_id, instance.date, 1))
+    elif previous and previous != (instance.restaurant_id, instance.date):
+        deltas.update(visit_deltas(*previous, -1))
+        deltas.update(visit_deltas(instance.restaurant_id, instance.date, 1))
+    apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Visit)
+def remove_visit_rollups(sender, instance, **kwargs):
+    changes = current_changes()
+    if changes is not None:
+        owner = changes.owner(instance.restaurant_id)
+        changes.deltas.update(visit_deltas(instance.restaurant_id, instance.date, -1, owner=owner))
+        return
+    apply_deltas(visit_deltas(instance.restaurant_id, instance.date, -1))
+
+
+@receiver(pre_save, sender=Restaurant)
+def remember_restaurant_genre(sender, instance, update_fields=None, **kwargs):
+    instance._rollup_genre = None
+    if instance._state.adding or (update_fields is not None and "genre" not in update_fields):
+        return
+    instance._rollup_genre = Restaurant.objects.filter(pk=instance.pk).values_list("genre", flat=True).first()
+
+
+@receiver(post_save, sender=Restaurant)
+def move_genre_rollups(sender, instance, **kwargs):
+    # ジャンルが変わったら、そのお店の訪問件数を新しいジャンルに移す
+    previous = getattr(instance, "_rollup_genre", None)
+    if previous is None or genre_key(previous) == genre_key(instance.genre):
+        return
+    count = instance.visits.count()
+    if count:
+        apply_deltas(Counter({
+            ("genre", instance.user_id, genre_key(previous)): -count,
+            ("genre", instance.user_id, genre_key(instance.genre)): count,
+        }))
+
+
+# -----------------------------
+# ★ 検索索引の同期
+# -----------------------------
+@receiver(post_save, sender=Restaurant)
+def index_restaurant(sender, instance, **kwargs):
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Restaurant)
+def unindex_restaurant(sender, instance, **kwargs):
+    get_search_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+def reindex_tagged_restaurants(sender, instance, created, **kwargs):
+    if created:
+        return
+    for restaurant in Restaurant.objects.filter(tags=instance):
+        get_search_backend().index(restaurant)
+
+
+@receiver(m2m_changed, sender=Restaurant.tags.through)
+def reindex_restaurant_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        get_search_backend().index(instance)
+    elif pk_set:
+        # タグ側から付け外しされた場合
+        for restaurant in Restaurant.objects.filter(pk__in=pk_set):
+            get_search_backend().index(restaurant)
+
+
+# -----------------------------
+# ★ サジェスト候補
+# -----------------------------
+@receiver(pre_save, sender=SuggestWord)
+def set_suggest_search_key(sender, instance, **kwargs):
+    instance.search_key = search_key(instance.word)
+
+
+@receiver([post_save, post_delete], sender=SuggestWord)
+def suggest_words_changed(sender, instance, **kwargs):
+    bump_suggest_version()
+
+
+# -----------------------------
+# ★ SQLite のプロファイル（settings.DATABASE_PROFILE）
+# -----------------------------
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+
+    pragmas = settings.DATABASE_PROFILES[settings.DATABASE_PROFILE]["PRAGMAS"]
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,54 @@
+document.addEventListener("DOMContentLoaded", () => {
+  if (!("IntersectionObserver" in window)) return;  // 「もっと見る」リンクで代用
+
+  let loading = false;
+
+  /* ---------- カードを種類ごとの一覧に追加する ---------- */
+  function appendCards(fragment) {
+    // 行ったお店はリンクがカードを包んでいるので、リンクごと移す
+    fragment.querySelectorAll(".restaurant-card-want, .card-link-went").forEach(card => {
+      const status = card.classList.contains("card-link-went") ? "went" : "want";
+      const list = document.querySelector(`[data-card-list="${status}"]`);
+      if (list) list.appendChild(card);
+    });
+  }
+
+  function observe(sentinel) {
+    const link = sentinel.querySelector(".more-link");
+    if (link) link.style.display = "none";
+
+    const observer = new IntersectionObserver(entries => {
+      if (!entries[0].isIntersecting || loading) return;
+      loading = true;
+      observer.disconnect();
+
+      fetch(sentinel.dataset.nextUrl, { credentials: "same-origin" })
+        .then(res => res.text())
+        .then(html => {
+          const template = document.createElement("template");
+          template.innerHTML = html;
+          appendCards(template.content);
+
+          // ★ 次のページがあれば新しい目印に差し替える
+          const next = template.content.querySelector(".infinite-scroll");
+          if (next) {
+            sentinel.replaceWith(next);
+            observe(next);
+          } else {
+            sentinel.remove();
+          }
+        })
+        .catch(() => {
+          if (link) link.style.display = "";
+        })
+        .finally(() => {
+          loading = false;
+        });
+    }, { rootMargin: "400px" });
+
+    observer.observe(sentinel);
+  }
+
+  const sentinel = document.querySelector(".infinite-scroll");
+  if (sentinel) observe(sentinel);
+});
@@ -44,7 +44,8 @@ document.addEventListener("DOMContentLoaded", () => {
   document.querySelectorAll(".visit-photo").forEach(img => {
     img.addEventListener("click", () => {
       modal.style.display = "flex";
-      modalImg.src = img.src;
+      // 一覧は縮小版なので、拡大表示は原本（data-full）を使う
+      modalImg.src = img.dataset.full || img.src;
 
       // ★ 写真に埋め込んだ訪問日を取得
       const visitDate = img.dataset.visitDate;
@@ -0,0 +1,64 @@
+/* ===============================
+   サジェスト（入力に合わせて候補を取得）
+   <datalist data-suggest="area"> につながった input に入力があるたびに
+   /restaurants/suggest/ から候補を取り、datalist の中身を入れ替える。
+=============================== */
+(function () {
+  const script = document.currentScript;
+
+  document.addEventListener("DOMContentLoaded", function () {
+    const url = script && script.dataset.suggestUrl;
+    if (!url) return;
+
+    const cache = new Map();  // "type:q" → 候補
+    let timer = null;
+    let latest = "";
+
+    function fill(datalist, words) {
+      datalist.innerHTML = "";
+      words.forEach(word => {
+        const option = document.createElement("option");
+        option.value = word;
+        datalist.appendChild(option);
+      });
+    }
+
+    function load(input) {
+      const datalist = input.list;
+      if (!datalist || !datalist.dataset.suggest) return;
+
+      const type = datalist.dataset.suggest;
+      const q = input.value.trim();
+      const key = `${type}:${q}`;
+      latest = key;
+
+      if (cache.has(key)) {
+        fill(datalist, cache.get(key));
+        return;
+      }
+
+      const params = new URLSearchParams({ type: type, q: q });
+      fetch(`${url}?${params}`, { credentials: "same-origin" })
+        .then(res => res.ok ? res.json() : { words: [] })
+        .then(data => {
+          cache.set(key, data.words);
+          // 遅れて返ってきた古い入力の結果では上書きしない
+          if (latest === key) fill(datalist, data.words);
+        })
+        .catch(() => {});
+    }
+
+    /* ---------- 入力中（追加されたタグ欄も拾えるよう document で受ける） ---------- */
+    document.addEventListener("input", function (e) {
+      if (!(e.target instanceof HTMLInputElement) || !e.target.list) return;
+      clearTimeout(timer);
+      timer = setTimeout(() => load(e.target), 150);
+    });
+
+    /* ---------- フォーカス時は空文字で上位の候補を出しておく ---------- */
+    document.addEventListener("focusin", function (e) {
+      if (!(e.target instanceof HTMLInputElement) || !e.target.list) return;
+      load(e.target);
+    });
+  });
+})();
@@ -0,0 +1,119 @@
+document.addEventListener("DOMContentLoaded", () => {
+  const container = document.getElementById("visit-charts");
+
+  // ★ クライアント描画モード以外では何もしない
+  if (!container) return;
+
+  const FONT = '"Noto Sans CJK JP", "Hiragino Sans", "Meiryo", sans-serif';
+
+  /* ---------- canvas を表示サイズ × 解像度に合わせる ---------- */
+  function setupCanvas(canvas, height) {
+    const ratio = window.devicePixelRatio || 1;
+    const width = canvas.clientWidth || 500;
+
+    canvas.style.height = `${height}px`;
+    canvas.width = width * ratio;
+    canvas.height = height * ratio;
+
+    const ctx = canvas.getContext("2d");
+    ctx.scale(ratio, ratio);
+    ctx.fillStyle = "white";
+    ctx.fillRect(0, 0, width, height);
+    return { ctx, width, height };
+  }
+
+  function drawEmpty(canvas) {
+    const { ctx, width, height } = setupCanvas(canvas, 150);
+    ctx.fillStyle = "black";
+    ctx.font = `16px ${FONT}`;
+    ctx.textAlign = "center";
+    ctx.textBaseline = "middle";
+    ctx.fillText("データがありません", width / 2, height / 2);
+  }
+
+  /* ---------- 月別訪問数（縦棒） ---------- */
+  function drawMonthly(canvas, series) {
+    if (!series.length) return drawEmpty(canvas);
+
+    const { ctx, width, height } = setupCanvas(canvas, 260);
+    const pad = { top: 20, right: 10, bottom: 40, left: 30 };
+    const plotW = width - pad.left - pad.right;
+    const plotH = height - pad.top - pad.bottom;
+    const maxY = Math.max(20, ...series.map(s => s.count));
+    const step = plotW / series.length;
+
+    // 目盛り線
+    ctx.strokeStyle = "rgba(0, 0, 0, 0.15)";
+    ctx.setLineDash([4, 4]);
+    ctx.fillStyle = "#333";
+    ctx.font = `11px ${FONT}`;
+    ctx.textAlign = "right";
+    ctx.textBaseline = "middle";
+    for (let y = 0; y <= maxY; y += 5) {
+      const py = pad.top + plotH - (y / maxY) * plotH;
+      ctx.beginPath();
+      ctx.moveTo(pad.left, py);
+      ctx.lineTo(width - pad.right, py);
+      ctx.stroke();
+      ctx.fillText(String(y), pad.left - 4, py);
+    }
+    ctx.setLineDash([]);
+
+    series.forEach((s, i) => {
+      const barW = step * 0.6;
+      const x = pad.left + step * i + (step - barW) / 2;
+      const barH = (s.count / maxY) * plotH;
+      const y = pad.top + plotH - barH;
+
+      ctx.fillStyle = "#5a8dee";
+      ctx.fillRect(x, y, barW, barH);
+
+      ctx.fillStyle = "#333";
+      ctx.textAlign = "center";
+      ctx.font = `bold 12px ${FONT}`;
+      ctx.textBaseline = "bottom";
+      ctx.fillText(String(s.count), x + barW / 2, y - 2);
+
+      ctx.font = `bold 11px ${FONT}`;
+      ctx.textBaseline = "top";
+      ctx.fillText(s.label, x + barW / 2, pad.top + plotH + 6);
+    });
+  }
+
+  /* ---------- ジャンル別訪問数（横棒） ---------- */
+  function drawGenre(canvas, series) {
+    if (!series.length) return drawEmpty(canvas);
+
+    const rowH = 32;
+    const { ctx, width } = setupCanvas(canvas, series.length * rowH + 20);
+    const labelW = 110;
+    const plotW = width - labelW - 40;
+    const maxX = Math.max(...series.map(s => s.count));
+
+    series.forEach((s, i) => {
+      const y = 10 + i * rowH;
+      const barW = (s.count / maxX) * plotW;
+
+      ctx.fillStyle = "#333";
+      ctx.font = `14px ${FONT}`;
+      ctx.textAlign = "right";
+      ctx.textBaseline = "middle";
+      ctx.fillText(s.genre, labelW - 8, y + rowH / 2);
+
+      ctx.fillStyle = "rgba(74, 108, 247, 0.85)";
+      ctx.fillRect(labelW, y + rowH * 0.25, barW, rowH * 0.5);
+
+      ctx.fillStyle = "#333";
+      ctx.font = `bold 15px ${FONT}`;
+      ctx.textAlign = "left";
+      ctx.fillText(String(s.count), labelW + barW + 6, y + rowH / 2);
+    });
+  }
+
+  fetch(container.dataset.statsUrl, { credentials: "same-origin" })
+    .then(res => res.json())
+    .then(stats => {
+      drawGenre(document.getElementById("chart-genre"), stats.genre);
+      drawMonthly(document.getElementById("chart-monthly"), stats.monthly);
+    });
+});
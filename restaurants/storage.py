@@ -0,0 +1,211 @@
+"""訪問写真のストレージ（内容のハッシュで保存し、参照数で管理する）
+
+同じ写真を何度添付しても、ファイルは内容の SHA-256 を名前にした1つだけを置く
+（visit_images/3f/3fa9…c1.jpg）。名前が内容で決まるので URL の中身は変わらず、
+長期間キャッシュさせてよい。
+
+ファイルごとの参照数は ImageBlob に持つ。
+  - save(): 参照数を1増やし、まだ無いファイルだけ書き出す
+  - delete(): 参照数を1減らすだけ（VisitImage.delete_files / 削除のシグナルから呼ばれる。
+    まとめて消すときは release_many()）
+  - 参照数が 0 のまま IMAGE_BLOB_PURGE_GRACE 秒たったファイルを purge_image_blobs コマンドで消す
+    （消す直前に同じ写真がまた添付されても消さないよう、行の削除とファイルの削除を
+    1つのトランザクションで行う）
+  - 書き出した後で行がロールバックされた（プロセスが落ちた・discard_on_error() を通らなかった）
+    ファイルは、同じ purge で IMAGE_BLOB_PURGE_GRACE 秒たってから消す（purge_orphans()）
+  - 写真を添付するトランザクションは discard_on_error() の中で行う。例外で終わったら、
+    ロールバックで ImageBlob の行が残らなかったファイル（その中で新しく書いたもの）を消す
+"""
+import hashlib
+import os
+import posixpath
+import re
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+# このストレージが付ける名前（ab/<sha256>.jpg）と、書き出し途中の一時ファイル
+CONTENT_NAME_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}(\.[0-9a-z]+)?$")
+PART_NAME_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}(\.[0-9a-z]+)?\.part")
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def __init__(self, directory="blobs", **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        # discard_on_error() の中で新しく書き出したファイル（スレッドごと）
+        self._local = threading.local()
+
+    def content_name(self, name, content):
+        """内容のハッシュから保存先の名前を作る（拡張子だけ元の名前から引き継ぐ）"""
+        sha = hashlib.sha256()
+        for chunk in content.chunks():
+            sha.update(chunk)
+        digest = sha.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        return posixpath.join(self.directory, digest[:2], digest + ext)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        # 先に参照を取ってから有無を確かめる（purge と同時に動いても消されたファイルを指さない）
+        self.acquire(name, content.size)
+        if not self.exists(name):
+            # 同じ内容を同時に書いても壊れないよう、一時ファイルに書いてから置き換える
+            temp_name = super()._save(f"{name}.part", content)
+            os.replace(self.path(temp_name), self.path(name))
+            written = getattr(self._local, "written", None)
+            if written is not None:
+                written.append(name)
+        return name
+
+    def delete(self, name):
+        """参照を外す（ファイルは purge で消す）"""
+        self.release(name)
+
+    def acquire(self, name, size):
+        from .models import ImageBlob
+
+        if ImageBlob.objects.filter(name=name).update(ref_count=F("ref_count") + 1, released_at=None):
+            return
+        _, created = ImageBlob.objects.get_or_create(name=name, defaults={"size": size, "ref_count": 1})
+        if not created:
+            # 同時に作られた
+            ImageBlob.objects.filter(name=name).update(ref_count=F("ref_count") + 1, released_at=None)
+
+    def release(self, name):
+        self.release_many([name])
+
+    def release_many(self, names, batch_size=500):
+        """まとめて参照を外す（外す数が同じ名前ごとに UPDATE 1回）"""
+        from .models import ImageBlob
+
+        by_count = defaultdict(list)
+        for name, count in Counter(name for name in names if name).items():
+            by_count[count].append(name)
+
+        now = timezone.now()
+        for count, group in by_count.items():
+            for start in range(0, len(group), batch_size):
+                ImageBlob.objects.filter(name__in=group[start:start + batch_size], ref_count__gt=0).update(
+                    ref_count=Greatest(F("ref_count") - count, 0),
+                    released_at=now,
+                )
+
+    @contextmanager
+    def discard_on_error(self):
+        """ブロックが例外で終わったら、中で新しく書き出したファイルのうち参照の行が無いものを消す
+
+        transaction.atomic() の外側で使う（参照数はロールバックで元に戻るので触らず、
+        ロールバックが済んでから行の有無を確かめる）。
+        """
+        from .models import ImageBlob
+
+        outer = getattr(self._local, "written", None)
+        written = self._local.written = []
+        try:
+            yield
+        except Exception:
+            kept = set(ImageBlob.objects.filter(name__in=written).values_list("name", flat=True))
+            for name in set(written) - kept:
+                super().delete(name)
+            raise
+        finally:
+            self._local.written = outer
+            if outer is not None:
+                outer.extend(written)
+
+    def purge(self, released_before, dry_run=False, batch_size=500):
+        """released_before より前に参照が無くなったファイルを消し、消した (件数, バイト数) を返す"""
+        from .models import ImageBlob
+
+        queryset = ImageBlob.objects.filter(ref_count=0, released_at__lt=released_before)
+        count = size = 0
+        last_id = 0
+        while True:
+            blobs = list(queryset.filter(id__gt=last_id).order_by("id")[:batch_size])
+            if not blobs:
+                break
+            last_id = blobs[-1].id
+
+            for blob in blobs:
+                if dry_run:
+                    count += 1
+                    size += blob.size
+                    continue
+                with transaction.atomic():
+                    # 数えてから今までの間に参照されたものは残す
+                    deleted, _ = queryset.filter(pk=blob.pk).delete()
+                    if deleted:
+                        super().delete(blob.name)
+                        count += 1
+                        size += blob.size
+        return count, size
+
+    def purge_orphans(self, written_before, dry_run=False, batch_size=500):
+        """ImageBlob の行が無いまま written_before より前に書かれたファイルを消し、(件数, バイト数) を返す
+
+        行の無いファイルは、書き出した後でトランザクションがロールバックされたもの。
+        消す間は仮の行を作っておき、同じ内容を同時に保存しようとする処理を待たせる。
+        このストレージが付けた名前のファイルだけを見る（それ以外は gc_media で扱う）。
+        """
+        from .models import ImageBlob
+
+        count = size = 0
+        for batch in self._candidates(written_before.timestamp(), batch_size):
+            kept = set(ImageBlob.objects.filter(name__in=[name for name, _ in batch]).values_list("name", flat=True))
+            for name, file_size in batch:
+                if name in kept:
+                    continue
+                if dry_run:
+                    count += 1
+                    size += file_size
+                    continue
+                if PART_NAME_RE.match(name.split("/", 1)[1]):
+                    # 書き出し途中で止まった一時ファイル（どこからも参照されない）
+                    super().delete(name)
+                else:
+                    with transaction.atomic():
+                        blob, created = ImageBlob.objects.get_or_create(name=name, defaults={"size": file_size})
+                        if not created:
+                            # 数えてから今までの間に参照された
+                            continue
+                        super().delete(name)
+                        blob.delete()
+                count += 1
+                size += file_size
+        return count, size
+
+    def _candidates(self, written_before, batch_size):
+        root = self.path(self.directory)
+        batch = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                relative = os.path.relpath(path, root).replace(os.sep, "/")
+                if not (CONTENT_NAME_RE.match(relative) or PART_NAME_RE.match(relative)):
+                    continue
+                stat = os.stat(path)
+                if stat.st_mtime >= written_before:
+                    continue
+                batch.append((posixpath.join(self.directory, relative), stat.st_size))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+
+visit_image_storage = ContentAddressedStorage(directory="visit_images")
+
+
+def get_visit_image_storage():
+    return visit_image_storage
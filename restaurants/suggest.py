@@ -0,0 +1,242 @@
+"""サジェスト（入力補完）
+
+SuggestWord.search_key に「NFKC → 小文字 → カタカナをひらがな」にそろえた読みキーを持たせ、
+(word_type, search_key) のインデックスを前方一致の範囲検索でたどる。
+ローマ字で入力された検索語はかなに変換したキーでも探す（「ra-men」→「らーめん」）。
+
+結果はプロセス内の LRU と共有キャッシュ（django cache）の二段で保持し、
+どちらのキーにも語彙の版数を入れる。SuggestWord が増減したら版数を上げるだけで
+古い結果は使われなくなる。
+"""
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import SuggestWord
+
+
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+SUGGEST_CACHE_TIMEOUT = 60 * 60 * 24
+SUGGEST_LOCAL_SIZE = 512
+
+SUGGEST_VERSION_KEY = "savoiry:suggest_version"
+SUGGEST_RESULT_KEY = "savoiry:suggest:{version}:{word_type}:{limit}:{digest}"
+
+WORD_TYPES = {word_type for word_type, _ in SuggestWord.TYPE_CHOICES}
+
+
+# -----------------------------
+# ★ 読みキー
+# -----------------------------
+def to_hiragana(text):
+    return "".join(
+        chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c
+        for c in text
+    )
+
+
+SEARCH_KEY_LENGTH = SuggestWord._meta.get_field("search_key").max_length
+
+
+def search_key(word):
+    """保存・検索の両方で使う正規化キー（列の長さで切る。前方一致なので先頭だけで足りる）"""
+    return to_hiragana(unicodedata.normalize("NFKC", word or "").strip().lower())[:SEARCH_KEY_LENGTH]
+
+
+_ROMAJI = {
+    "a": "あ", "i": "い", "u": "う", "e": "え", "o": "お",
+    "ka": "か", "ki": "き", "ku": "く", "ke": "け", "ko": "こ",
+    "ga": "が", "gi": "ぎ", "gu": "ぐ", "ge": "げ", "go": "ご",
+    "sa": "さ", "si": "し", "shi": "し", "su": "す", "se": "せ", "so": "そ",
+    "za": "ざ", "zi": "じ", "ji": "じ", "zu": "ず", "ze": "ぜ", "zo": "ぞ",
+    "ta": "た", "ti": "ち", "chi": "ち", "tu": "つ", "tsu": "つ", "te": "て", "to": "と",
+    "da": "だ", "di": "ぢ", "du": "づ", "de": "で", "do": "ど",
+    "na": "な", "ni": "に", "nu": "ぬ", "ne": "ね", "no": "の",
+    "ha": "は", "hi": "ひ", "hu": "ふ", "fu": "ふ", "he": "へ", "ho": "ほ",
+    "ba": "ば", "bi": "び", "bu": "ぶ", "be": "べ", "bo": "ぼ",
+    "pa": "ぱ", "pi": "ぴ", "pu": "ぷ", "pe": "ぺ", "po": "ぽ",
+    "ma": "ま", "mi": "み", "mu": "む", "me": "め", "mo": "も",
+    "ya": "や", "yu": "ゆ", "yo": "よ",
+    "ra": "ら", "ri": "り", "ru": "る", "re": "れ", "ro": "ろ",
+    "wa": "わ", "wo": "を", "nn": "ん", "-": "ー",
+    "kya": "きゃ", "kyu": "きゅ", "kyo": "きょ",
+    "gya": "ぎゃ", "gyu": "ぎゅ", "gyo": "ぎょ",
+    "sha": "しゃ", "shu": "しゅ", "sho": "しょ", "she": "しぇ",
+    "sya": "しゃ", "syu": "しゅ", "syo": "しょ",
+    "ja": "じゃ", "ju": "じゅ", "jo": "じょ", "je": "じぇ",
+    "zya": "じゃ", "zyu": "じゅ", "zyo": "じょ",
+    "cha": "ちゃ", "chu": "ちゅ", "cho": "ちょ", "che": "ちぇ",
+    "tya": "ちゃ", "tyu": "ちゅ", "tyo": "ちょ",
+    "nya": "にゃ", "nyu": "にゅ", "nyo": "にょ",
+    "hya": "ひゃ", "hyu": "ひゅ", "hyo": "ひょ",
+    "bya": "びゃ", "byu": "びゅ", "byo": "びょ",
+    "pya": "ぴゃ", "pyu": "ぴゅ", "pyo": "ぴょ",
+    "mya": "みゃ", "myu": "みゅ", "myo": "みょ",
+    "rya": "りゃ", "ryu": "りゅ", "ryo": "りょ",
+    "fa": "ふぁ", "fi": "ふぃ", "fe": "ふぇ", "fo": "ふぉ",
+    "thi": "てぃ", "dhi": "でぃ", "va": "ゔぁ", "vi": "ゔぃ", "vu": "ゔ",
+}
+_VOWELS = set("aiueo")
+
+
+def romaji_to_kana(text):
+    """ローマ字をひらがなにする（変換できない文字はそのまま残す）"""
+    result = []
+    i = 0
+    while i < len(text):
+        for size in (3, 2, 1):
+            chunk = text[i:i + size]
+            if chunk in _ROMAJI:
+                result.append(_ROMAJI[chunk])
+                i += size
+                break
+        else:
+            c = text[i]
+            nxt = text[i + 1:i + 2]
+            if c == "n" and nxt and nxt not in _VOWELS and nxt != "y":
+                result.append("ん")
+            elif c.isalpha() and c not in _VOWELS and nxt == c:
+                # 促音（"tt" → "っt"）
+                result.append("っ")
+            else:
+                result.append(c)
+            i += 1
+    return "".join(result)
+
+
+def query_keys(query):
+    """検索語から探す読みキーの候補（そのまま・ローマ字→かな）"""
+    key = search_key(query)
+    keys = [key] if key else []
+    if key and key.isascii() and any(c.isalpha() for c in key):
+        kana = romaji_to_kana(key)
+        # 入力途中の子音（"ra-m" の "m"）は捨てて、その手前までで前方一致させる
+        kana = kana.rstrip("abcdefghijklmnopqrstuvwxyz")
+        if kana and kana != key:
+            keys.append(kana)
+    return keys
+
+
+# -----------------------------
+# ★ 版数
+# -----------------------------
+def get_suggest_version():
+    version = cache.get(SUGGEST_VERSION_KEY)
+    if version is None:
+        version = time.time_ns() // 1_000_000
+        cache.add(SUGGEST_VERSION_KEY, version, None)
+        version = cache.get(SUGGEST_VERSION_KEY, version)
+    return version
+
+
+def bump_suggest_version():
+    """SuggestWord が増減したときに呼び、キャッシュ済みの候補を無効にする"""
+    version = max(time.time_ns() // 1_000_000, (cache.get(SUGGEST_VERSION_KEY) or 0) + 1)
+    cache.set(SUGGEST_VERSION_KEY, version, None)
+    return version
+
+
+# -----------------------------
+# ★ 登録
+# -----------------------------
+def save_suggest_words(pairs):
+    """(word_type, word) のリストをまとめて登録する（既にある語は飛ばす）
+
+    bulk_create はシグナルを送らないため、読みキーの設定と版数の更新もここで行う。
+    既存の確認は IN 1回、登録は INSERT 1回。
+    """
+    pairs = list(dict.fromkeys(
+        (word_type, word.strip()) for word_type, word in pairs if word and word.strip()
+    ))
+    if not pairs:
+        return 0
+
+    existing = set(
+        SuggestWord.objects
+        .filter(word__in={word for _, word in pairs})
+        .values_list("word_type", "word")
+    )
+    missing = [pair for pair in pairs if pair not in existing]
+    if not missing:
+        return 0
+
+    SuggestWord.objects.bulk_create(
+        [
+            SuggestWord(word_type=word_type, word=word, search_key=search_key(word))
+            for word_type, word in missing
+        ],
+        ignore_conflicts=True,
+    )
+    # コミット前に上げると、他のリクエストが古い候補を新しい版数で保存してしまう
+    transaction.on_commit(bump_suggest_version)
+    return len(missing)
+
+
+# -----------------------------
+# ★ 検索
+# -----------------------------
+_local_cache = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _local_get(key):
+    with _local_lock:
+        words = _local_cache.get(key)
+        if words is not None:
+            _local_cache.move_to_end(key)
+        return words
+
+
+def _local_set(key, words):
+    with _local_lock:
+        _local_cache[key] = words
+        _local_cache.move_to_end(key)
+        while len(_local_cache) > SUGGEST_LOCAL_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def lookup_words(word_type, query, limit=SUGGEST_LIMIT):
+    """前方一致する語を短い順に最大 limit 件（キャッシュを通さない）"""
+    found = {}
+    keys = query_keys(query) or [""]
+    for key in keys:
+        queryset = SuggestWord.objects.filter(word_type=word_type)
+        if key:
+            # LIKE ではなく範囲条件にして (word_type, search_key) のインデックスを使う
+            queryset = queryset.filter(search_key__gte=key, search_key__lt=key + "\U0010ffff")
+        for search_key_, word in queryset.order_by("search_key").values_list("search_key", "word")[:limit * 4]:
+            found.setdefault(word, search_key_)
+
+    words = sorted(found, key=lambda word: (len(found[word]), found[word]))
+    return words[:limit]
+
+
+def suggest(word_type, query, limit=SUGGEST_LIMIT):
+    """サジェスト候補（プロセス内 → 共有キャッシュ → DB の順に探す）"""
+    normalized = search_key(query)
+    version = get_suggest_version()
+    key = SUGGEST_RESULT_KEY.format(
+        version=version,
+        word_type=word_type,
+        limit=limit,
+        # memcached のキーに使えない文字が入らないようハッシュにする
+        digest=hashlib.sha1(normalized.encode()).hexdigest(),
+    )
+
+    words = _local_get(key)
+    if words is not None:
+        return words
+
+    words = cache.get(key)
+    if words is None:
+        words = lookup_words(word_type, normalized, limit)
+        cache.set(key, words, SUGGEST_CACHE_TIMEOUT)
+
+    _local_set(key, words)
+    return words
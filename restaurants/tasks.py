@@ -0,0 +1,48 @@
+"""バックグラウンドジョブのタスク（restaurants.jobs.register で登録する）"""
+from django.core.exceptions import ValidationError
+
+from .images import ingest, make_renditions
+from .jobs import register
+from .models import VisitImage
+
+
+def visit_image_failed(image_id):
+    """再試行しても取り込めなかった写真を失敗にする（プレースホルダーを出し続けない）"""
+    image = VisitImage.objects.filter(pk=image_id, status="pending").first()
+    if image is not None:
+        image.status = "failed"
+        image.save(update_fields=["status"])
+
+
+@register("process_visit_image", on_dead=visit_image_failed)
+def process_visit_image(image_id):
+    """アップロードされたままの原本を作り直し、縮小版を作る"""
+    image = VisitImage.objects.filter(pk=image_id).first()
+    if image is None or image.status == "ready":
+        # 先に消された・処理済み
+        return
+
+    storage = image.image.storage
+    raw_name = image.image.name
+
+    try:
+        with image.image.open("rb") as file:
+            ingested = ingest(file)
+    except ValidationError:
+        # 壊れた写真は何度やっても同じなので再試行しない
+        image.status = "failed"
+        image.save(update_fields=["status"])
+        return
+
+    image.image.save(ingested.file.name, ingested.file, save=False)
+    try:
+        image.renditions = make_renditions(image, ingested.image)
+        image.status = "ready"
+        image.save(update_fields=["image", "renditions", "status"])
+    except Exception:
+        # 再試行で作り直すので、今回書き出した分は消しておく
+        image.delete_files()
+        raise
+
+    # 作り直す前の（EXIF 入りの）ファイルは残さない
+    storage.delete(raw_name)
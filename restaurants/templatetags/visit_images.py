@@ -0,0 +1,39 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from ..images import rendition_sources
+
+register = template.Library()
+
+
+@register.simple_tag
+def visit_picture(visit_image, rendition, **attrs):
+    """縮小版を <picture>（AVIF / WebP と JPEG のフォールバック）で出す
+
+    {% visit_picture image "card" class="thumbnail-went" alt=restaurant.store_name %}
+    属性名の _ は - にする（data_visit_date → data-visit-date）。
+    data-full には拡大表示用の原本の URL を入れる。
+    取り込み処理が終わっていない写真はプレースホルダーを、取り込めなかった写真は
+    失敗の表示を出す（どちらも EXIF 入りの原本は見せない）。
+    """
+    attrs = {name.replace("_", "-"): value for name, value in attrs.items()}
+    attrs.setdefault("loading", "lazy")
+
+    if visit_image.status != "ready":
+        placeholder = "photo_failed.svg" if visit_image.status == "failed" else "photo_pending.svg"
+        return format_html(
+            "<img src=\"{}\"{}>",
+            static(f"restaurants/img/{placeholder}"),
+            format_html_join("", " {}=\"{}\"", attrs.items()),
+        )
+
+    sources, fallback = rendition_sources(visit_image, rendition)
+    attrs.setdefault("data-full", visit_image.image.url)
+
+    return format_html(
+        "<picture>{}<img src=\"{}\"{}></picture>",
+        format_html_join("", "<source type=\"{}\" srcset=\"{}\">", sources),
+        fallback,
+        format_html_join("", " {}=\"{}\"", attrs.items()),
+    )
@@ -1,3 +1,1134 @@
-from django.test import TestCase
+import copy
+import datetime
+import io
+import os
+import pickle
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.models.signals import post_delete
+from django.http import Http404
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from PIL import Image
+
+from accounts.models import User
+from savoiry_project.assets import compress, serve_asset
+from .charts import bump_data_version, visit_stats
+from .jobs import TASKS, enqueue, register, run_pending
+from .models import Restaurant, Visit, VisitImage, Tag, SuggestWord, Job, DeadJob, ImageBlob
+
+
+class CardQueryCountTests(TestCase):
+    """一覧・検索結果のクエリ数がお店の件数に比例して増えないこと"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+        self.tag = Tag.objects.create(name="個室")
+
+    def add_restaurants(self, count):
+        for i in range(count):
+            want = Restaurant.objects.create(
+                user=self.user, store_name=f"want{i}", area="渋谷", genre="ラーメン", status="want",
+            )
+            want.tags.add(self.tag)
+
+            went = Restaurant.objects.create(
+                user=self.user, store_name=f"went{i}", area="渋谷", genre="カフェ", status="went",
+            )
+            went.tags.add(self.tag)
+            for day in (1, 2):
+                visit = Visit.objects.create(restaurant=went, date=datetime.date(2025, 1, day), rating=4)
+                VisitImage.objects.create(visit=visit, image=f"visit_images/{i}_{day}.jpg")
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant(self):
+        urls = [
+            reverse("restaurants:restaurant_list_want"),
+            reverse("restaurants:restaurant_list_went"),
+            reverse("restaurants:restaurant_search_results") + "?status=all",
+            reverse("restaurants:restaurant_search_results") + "?status=went",
+            reverse("restaurants:restaurant_search_results") + "?status=want&tag=個室",
+        ]
+
+        self.add_restaurants(1)
+        small = [self.count_queries(url) for url in urls]
+
+        self.add_restaurants(20)
+        large = [self.count_queries(url) for url in urls]
+
+        self.assertEqual(small, large)
+
+    def test_went_card_shows_latest_visit_image(self):
+        self.add_restaurants(1)
+        response = self.client.get(reverse("restaurants:restaurant_list_went"))
+        self.assertContains(response, "visit_images/0_2.jpg")
+        self.assertNotContains(response, "visit_images/0_1.jpg")
+
+
+    def test_cards_keep_list_markup(self):
+        want = Restaurant.objects.create(
+            user=self.user, store_name="麺屋", area="渋谷", genre="ラーメン", scene="ランチ", status="want",
+        )
+        want.tags.add(self.tag, Tag.objects.create(name="カウンター"))
+        went = Restaurant.objects.create(user=self.user, store_name="喫茶", area="渋谷", genre="カフェ", status="went")
+        Visit.objects.create(restaurant=went, date=datetime.date(2025, 1, 1))
+
+        html = self.client.get(reverse("restaurants:restaurant_list_want")).content.decode()
+        # 区切りは全角スペース
+        self.assertRegex(html, r"渋谷　\s*ラーメン　\s*ランチ　")
+        self.assertRegex(html, r"(個室|カウンター)　\s*(個室|カウンター)")
+
+        html = self.client.get(reverse("restaurants:restaurant_list_went")).content.decode()
+        # リンクがカードを包み、評価の無い訪問には星を出さない
+        self.assertRegex(html, r'class="card-link-went">\s*<div class="restaurant-card-went">')
+        self.assertNotIn("stars-went", html)
+
+
+class VisitSummaryTests(TestCase):
+    """Restaurant の訪問サマリーが Visit / VisitImage の変更に追従すること"""
+
+    def setUp(self):
+        user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.restaurant = Restaurant.objects.create(user=user, store_name="s", area="a", genre="g")
+
+    def test_summary_follows_visits(self):
+        first = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 1), rating=2)
+        second = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 3, 1), rating=4)
+        image = VisitImage.objects.create(visit=second, image="visit_images/a.jpg")
+
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.visit_count, 2)
+        self.assertEqual(self.restaurant.avg_rating, 3)
+        self.assertEqual(self.restaurant.last_visit_date, datetime.date(2025, 3, 1))
+        self.assertEqual(self.restaurant.cover_image, image)
+
+        second.delete()
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.visit_count, 1)
+        self.assertEqual(self.restaurant.avg_rating, 2)
+        self.assertEqual(self.restaurant.last_visit_date, first.date)
+        self.assertIsNone(self.restaurant.cover_image)
+
+    def test_summary_follows_reassigned_visit(self):
+        other = Restaurant.objects.create(user=self.restaurant.user, store_name="t", area="a", genre="g")
+        visit = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 1), rating=5)
+        image = VisitImage.objects.create(visit=visit, image="visit_images/a.jpg")
+
+        visit.restaurant = other
+        visit.save()
+
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.visit_count, 0)
+        self.assertIsNone(self.restaurant.avg_rating)
+        self.assertIsNone(self.restaurant.cover_image)
+        other.refresh_from_db()
+        self.assertEqual((other.visit_count, other.avg_rating, other.cover_image), (1, 5, image))
+
+    def test_stat_rollups_follow_visits(self):
+        user = self.restaurant.user
+        other = Restaurant.objects.create(user=user, store_name="t", area="a", genre="カフェ")
+        first = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 5), rating=2)
+        Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 20), rating=4)
+        Visit.objects.create(restaurant=other, date=datetime.date(2025, 2, 1), rating=3)
+
+        # 付け替え（日付とお店の変更）・ジャンル変更・削除
+        first.date = datetime.date(2025, 2, 10)
+        first.restaurant = other
+        first.save()
+        self.restaurant.genre = "ラーメン"
+        self.restaurant.save()
+        Visit.objects.filter(restaurant=other, date=datetime.date(2025, 2, 1)).delete_with_images()
+
+        stats = visit_stats(user)
+        self.assertEqual(
+            [(row["month"], row["count"]) for row in stats["monthly"]],
+            [("2025-01", 1), ("2025-02", 1)],
+        )
+        self.assertEqual(
+            [(row["genre"], row["count"]) for row in stats["genre"]],
+            [("カフェ", 1), ("ラーメン", 1)],
+        )
+        call_command("rebuild_visit_stats", "--verify", stdout=io.StringIO())
+
+
+class ChartCacheTests(TestCase):
+    """グラフPNGの指紋つきキャッシュと ETag（restaurants.charts.cached_chart）"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+        self.restaurant = Restaurant.objects.create(user=self.user, store_name="麺屋", area="渋谷", genre="ラーメン")
+        self.visit = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 1), rating=4)
+        self.url = reverse("restaurants:visit_chart_monthly")
+
+        # 描画エンジンの代わり（呼ばれた回数 = キャッシュに当たらなかった回数）
+        patcher = mock.patch("restaurants.chart_render.render_chart", return_value=b"\x89PNG chart")
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_png_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+
+        self.assertEqual(self.render.call_count, 1)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second["Content-Type"], "image/png")
+        self.assertEqual(second.content, b"\x89PNG chart")
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_matching_etag_returns_304(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_visit_changes_invalidate_chart(self):
+        def edit_date():
+            # 件数は変わらない変更
+            self.visit.date = datetime.date(2025, 3, 1)
+            self.visit.save()
+
+        changes = [
+            ("create", lambda: Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 2, 1))),
+            ("edit", edit_date),
+            ("delete", lambda: self.visit.delete()),
+        ]
+        etag = self.client.get(self.url)["ETag"]
+        for calls, (name, change) in enumerate(changes, start=2):
+            change()
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, name)
+            self.assertNotEqual(response["ETag"], etag, name)
+            self.assertEqual(self.render.call_count, calls, name)
+            etag = response["ETag"]
+
+
+class ChartRenderTests(TestCase):
+    """描画エンジンの混雑・タイムアウト（restaurants.chart_render）"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+
+    def test_timeout_returns_503(self):
+        future = mock.Mock()
+        future.result.side_effect = FutureTimeoutError
+        pool = mock.Mock()
+        pool.submit.return_value = future
+
+        with (
+            override_settings(CHART_RENDER_WORKERS=2, CHART_RENDER_TIMEOUT=1),
+            mock.patch("restaurants.chart_render._get_pool", return_value=(pool, threading.BoundedSemaphore(8))),
+        ):
+            response = self.client.get(reverse("restaurants:visit_chart_genre"))
+            # 503 はキャッシュされず、次の要求でもう一度描画する
+            self.client.get(reverse("restaurants:visit_chart_genre"))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "2")
+        future.result.assert_called_with(timeout=1)
+        future.cancel.assert_called()
+        self.assertEqual(pool.submit.call_count, 2)
+
+
+    def test_matplotlib_is_not_imported_by_views(self):
+        # 同じプロセスでは他のテストが読み込み済みなので、新しいインタープリターで確かめる
+        code = (
+            "import sys, django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns; "
+            "import accounts.views, restaurants.views; "
+            "print('matplotlib' in sys.modules)"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "savoiry_project.settings"}
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+class VisitStatsTests(TestCase):
+    """マイページのグラフ用の集計JSONと描画方法の切り替え"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+        self.url = reverse("restaurants:visit_stats")
+
+    def test_empty_user(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"monthly": [], "genre": [], "top3_genre": []})
+
+    def test_populated_user(self):
+        ramen = Restaurant.objects.create(user=self.user, store_name="麺屋", area="渋谷", genre="ラーメン")
+        cafe = Restaurant.objects.create(user=self.user, store_name="喫茶", area="渋谷", genre="カフェ")
+        Visit.objects.create(restaurant=ramen, date=datetime.date(2025, 1, 5))
+        Visit.objects.create(restaurant=ramen, date=datetime.date(2025, 2, 1))
+        Visit.objects.create(restaurant=cafe, date=datetime.date(2025, 2, 9))
+
+        genre = [{"genre": "ラーメン", "count": 2}, {"genre": "カフェ", "count": 1}]
+        self.assertEqual(self.client.get(self.url).json(), {
+            "monthly": [
+                {"month": "2025-01", "label": "2025年1月", "count": 1},
+                {"month": "2025-02", "label": "2025年2月", "count": 2},
+            ],
+            "genre": genre,
+            "top3_genre": genre,
+        })
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse("accounts:login"), response["Location"])
+
+    def test_mypage_chart_modes(self):
+        url = reverse("accounts:mypage")
+
+        client_mode = self.client.get(url, {"charts": "client"})
+        self.assertEqual(client_mode.context["chart_mode"], "client")
+        self.assertContains(client_mode, f'data-stats-url="{self.url}"')
+        self.assertContains(client_mode, "visit_charts")
+        self.assertNotContains(client_mode, reverse("restaurants:visit_chart_monthly"))
+
+        with override_settings(CHART_RENDER_MODE="server"):
+            server_mode = self.client.get(url, {"charts": "unknown"})
+        self.assertEqual(server_mode.context["chart_mode"], "server")
+        self.assertContains(server_mode, reverse("restaurants:visit_chart_monthly"))
+        self.assertNotContains(server_mode, "data-stats-url")
+
+
+def make_jpeg(size=(64, 48), exif=None):
+    buffer = io.BytesIO()
+    options = {"exif": exif} if exif is not None else {}
+    Image.new("RGB", size, (200, 120, 60)).save(buffer, "JPEG", **options)
+    return buffer.getvalue()
+
+
+class VisitWriteTests(TestCase):
+    """訪問と写真の保存が1つのトランザクションで行われること"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+        self.restaurant = Restaurant.objects.create(user=self.user, store_name="s", area="a", genre="g")
+
+    def post_visit(self, photos):
+        files = [SimpleUploadedFile(f"p{i}.jpg", make_jpeg(), content_type="image/jpeg") for i in range(photos)]
+        return self.client.post(
+            reverse("restaurants:restaurant_detail", args=[self.restaurant.pk]),
+            {"date": "2025-01-01", "rating": 4, "images": files},
+        )
+
+    def test_visit_with_photos_updates_summary(self):
+        response = self.post_visit(3)
+        self.assertEqual(response.status_code, 302)
+
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.status, "went")
+        self.assertEqual(self.restaurant.visit_count, 1)
+        self.assertEqual(self.restaurant.cover_image, VisitImage.objects.order_by("id").first())
+
+    def test_failed_image_insert_rolls_back_visit(self):
+        with mock.patch.object(VisitImage.objects, "bulk_create", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.post_visit(2)
+
+        self.assertFalse(Visit.objects.exists())
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.status, "want")
+
+    def test_failed_job_insert_removes_only_new_files(self):
+        shared = make_jpeg()
+        self.client.post(
+            reverse("restaurants:restaurant_detail", args=[self.restaurant.pk]),
+            {"date": "2025-01-01", "images": [SimpleUploadedFile("a.jpg", shared, content_type="image/jpeg")]},
+        )
+        blob = ImageBlob.objects.get()
+
+        # 写真の INSERT の後、ジョブの INSERT で本物の IntegrityError が起きる
+        with mock.patch("restaurants.jobs.enqueue_many", side_effect=lambda *args: Job.objects.create(task=None)):
+            with self.assertRaises(IntegrityError):
+                self.client.post(
+                    reverse("restaurants:restaurant_detail", args=[self.restaurant.pk]),
+                    {"date": "2025-02-01", "images": [
+                        SimpleUploadedFile("b.jpg", shared, content_type="image/jpeg"),
+                        SimpleUploadedFile("c.jpg", make_jpeg((30, 20)), content_type="image/jpeg"),
+                    ]},
+                )
+
+        self.assertEqual(Visit.objects.count(), 1)
+        # 参照数はロールバックで戻り、先に保存済みのファイルは残り、新しく書いたファイルだけ消える
+        self.assertEqual(list(ImageBlob.objects.values_list("name", "ref_count")), [(blob.name, 1)])
+        self.assertEqual(
+            [name for _, _, names in os.walk(self.media.name) for name in names],
+            [os.path.basename(blob.name)],
+        )
+
+    def test_photos_are_normalized_with_renditions(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # 右に90度回転して表示する写真
+        exif[0x010F] = "PhoneMaker"
+        upload = SimpleUploadedFile("big.jpg", make_jpeg((3000, 1000), exif.tobytes()), content_type="image/jpeg")
+
+        response = self.client.post(
+            reverse("restaurants:restaurant_detail", args=[self.restaurant.pk]),
+            {"date": "2025-01-01", "rating": 4, "images": [upload]},
+        )
+        self.assertEqual(response.status_code, 302)
+
+        # 取り込みが終わるまではプレースホルダー
+        image = VisitImage.objects.get()
+        self.assertEqual(image.status, "pending")
+        html = self.client.get(reverse("restaurants:restaurant_list_went")).content.decode()
+        self.assertIn("photo_pending.svg", html)
+        self.assertNotIn(image.image.url, html)
+
+        raw_path = image.image.path
+        with override_settings(VISIT_IMAGE_MAX_EDGE=1200):
+            call_command("run_jobs", "--once", stdout=io.StringIO())
+
+        image.refresh_from_db()
+        self.assertEqual(image.status, "ready")
+        # EXIF 入りの原本は参照が外れ、purge で消える
+        call_command("purge_image_blobs", "--grace", "-1", stdout=io.StringIO())
+        self.assertFalse(os.path.exists(raw_path))
+        with Image.open(image.image.path) as original:
+            # 向きを画素に反映して縦長になり、長辺が上限に収まり、EXIF は残らない
+            self.assertEqual(original.size, (400, 1200))
+            self.assertEqual(len(original.getexif()), 0)
+
+        self.assertEqual(set(image.renditions), {"card", "thumb"})
+        self.assertIn("jpg", image.renditions["card"])
+        with Image.open(image.image.storage.path(image.renditions["card"]["jpg"])) as card:
+            self.assertEqual(card.size, (960, 540))
+
+        html = self.client.get(reverse("restaurants:restaurant_list_went")).content.decode()
+        self.assertIn("<picture>", html)
+        self.assertIn(image.renditions["card"]["jpg"], html)
+
+    @override_settings(JOB_MAX_ATTEMPTS=1)
+    def test_photo_shows_failure_when_job_dies(self):
+        self.post_visit(1)
+        with mock.patch("restaurants.tasks.make_renditions", side_effect=OSError("disk full")):
+            call_command("run_jobs", "--once", stdout=io.StringIO())
+
+        self.assertTrue(DeadJob.objects.exists())
+        image = VisitImage.objects.get()
+        self.assertEqual(image.status, "failed")
+        html = self.client.get(reverse("restaurants:restaurant_list_went")).content.decode()
+        self.assertIn("photo_failed.svg", html)
+        self.assertNotIn("photo_pending.svg", html)
+
+    def test_same_photo_is_stored_once(self):
+        photo = make_jpeg()
+        for _ in range(2):
+            self.client.post(
+                reverse("restaurants:restaurant_detail", args=[self.restaurant.pk]),
+                {"date": "2025-01-01", "rating": 4, "images": [SimpleUploadedFile("p.jpg", photo)]},
+            )
+        first, second = VisitImage.objects.order_by("id")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(ImageBlob.objects.get(name=first.image.name).ref_count, 2)
+
+        # 片方の訪問を消しても、もう片方が使っているファイルは残る
+        first.visit.delete()
+        call_command("purge_image_blobs", "--grace", "-1", stdout=io.StringIO())
+        self.assertTrue(os.path.exists(second.image.path))
+
+        second.visit.delete()
+        call_command("purge_image_blobs", "--grace", "-1", stdout=io.StringIO())
+        self.assertFalse(os.path.exists(second.image.path))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_purge_removes_files_left_by_rollback(self):
+        visit = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 1), rating=4)
+        kept = VisitImage.objects.create(visit=visit, image=SimpleUploadedFile("a.jpg", make_jpeg()))
+        # discard_on_error() を通らずにロールバックされた保存（ファイルだけ残る）
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                upload = SimpleUploadedFile("b.jpg", make_jpeg((30, 20)))
+                rolled_back = VisitImage.objects.create(visit=visit, image=upload)
+                raise DatabaseError
+        legacy = os.path.join(self.media.name, "visit_images", "legacy.jpg")
+        with open(legacy, "wb") as f:
+            f.write(b"x")
+        self.assertTrue(os.path.exists(rolled_back.image.path))
+
+        # 猶予の間は残す
+        call_command("purge_image_blobs", stdout=io.StringIO())
+        self.assertTrue(os.path.exists(rolled_back.image.path))
+
+        call_command("purge_image_blobs", "--grace", "-1", stdout=io.StringIO())
+        self.assertFalse(os.path.exists(rolled_back.image.path))
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertEqual(ImageBlob.objects.get().name, kept.image.name)
+        # このストレージが付けた名前でないファイルは gc_media に任せる
+        self.assertTrue(os.path.exists(legacy))
+
+    def test_gc_media_removes_only_unreferenced_files(self):
+        # 移行前の（ImageBlob の無い）写真と縮小版、どこからも参照されないファイル
+        visit = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 1), rating=4)
+        VisitImage.objects.create(
+            visit=visit, image="visit_images/legacy.jpg",
+            renditions={"card": {"webp": "visit_images/legacy.card.webp"}},
+        )
+        directory = os.path.join(self.media.name, "visit_images")
+        os.makedirs(directory)
+        old = time.time() - 2 * 24 * 60 * 60
+        for name in ("legacy.jpg", "legacy.card.webp", "orphan.jpg", "recent.jpg"):
+            path = os.path.join(directory, name)
+            with open(path, "wb") as f:
+                f.write(b"x")
+            if name != "recent.jpg":
+                os.utime(path, (old, old))
+
+        quarantine = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, quarantine)
+        state = os.path.join(self.media.name, "gc.json")
+
+        call_command("gc_media", "--dry-run", "--state", state, stdout=io.StringIO())
+        self.assertEqual(len(os.listdir(directory)), 4)
+
+        call_command("gc_media", "--index", "bloom", "--quarantine", quarantine, "--state", state, stdout=io.StringIO())
+        self.assertEqual(sorted(os.listdir(directory)), ["legacy.card.webp", "legacy.jpg", "recent.jpg"])
+        self.assertTrue(os.path.exists(os.path.join(quarantine, "visit_images", "orphan.jpg")))
+        self.assertFalse(os.path.exists(state))
+
+    def test_gc_media_keeps_files_referenced_after_indexing(self):
+        directory = os.path.join(self.media.name, "visit_images")
+        os.makedirs(directory)
+        old = time.time() - 2 * 24 * 60 * 60
+        for name in ("image.jpg", "image.card.webp", "blob.jpg", "orphan.jpg"):
+            path = os.path.join(directory, name)
+            with open(path, "wb") as f:
+                f.write(b"x")
+            os.utime(path, (old, old))
+
+        # 索引を作った後で、古いファイルがまた参照される（同じ内容の写真が添付された）
+        def index_then_reference(command, kind):
+            index = set()
+            visit = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 1))
+            VisitImage.objects.create(
+                visit=visit, image="visit_images/image.jpg",
+                renditions={"card": {"webp": "visit_images/image.card.webp"}},
+            )
+            ImageBlob.objects.create(name="visit_images/blob.jpg", ref_count=1)
+            return index
+
+        state = os.path.join(self.media.name, "gc.json")
+        with mock.patch(
+            "restaurants.management.commands.gc_media.Command.build_index",
+            autospec=True, side_effect=index_then_reference,
+        ):
+            call_command("gc_media", "--state", state, stdout=io.StringIO())
+
+        self.assertEqual(sorted(os.listdir(directory)), ["blob.jpg", "image.card.webp", "image.jpg"])
+        # 確かめるための仮の行は残さない
+        self.assertEqual(list(ImageBlob.objects.values_list("name", flat=True)), ["visit_images/blob.jpg"])
+
+    def test_reset_deletes_visits_in_fixed_queries(self):
+        def add_visits(count):
+            for _ in range(count):
+                visit = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 1), rating=4)
+                for i in range(2):
+                    VisitImage.objects.create(visit=visit, image=SimpleUploadedFile("p.jpg", make_jpeg()))
+
+        # シグナルは1件ずつ送られる（後から足した受け取り側も動く）
+        deleted = []
+        receiver = lambda sender, instance, **kwargs: deleted.append(sender)  # noqa: E731
+        post_delete.connect(receiver, sender=Visit)
+        post_delete.connect(receiver, sender=VisitImage)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Visit)
+        self.addCleanup(post_delete.disconnect, receiver, sender=VisitImage)
+
+        url = reverse("restaurants:restaurant_reset", args=[self.restaurant.pk])
+        counts = []
+        for visits in (1, 5):
+            add_visits(visits)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(url)
+            counts.append(len(queries))
+
+            self.assertFalse(Visit.objects.exists())
+            self.assertFalse(VisitImage.objects.exists())
+            self.restaurant.refresh_from_db()
+            self.assertEqual((self.restaurant.status, self.restaurant.visit_count), ("want", 0))
+            self.assertIsNone(self.restaurant.cover_image_id)
+            # 写真の参照は外れ、ファイルは purge で消える
+            self.assertFalse(ImageBlob.objects.filter(ref_count__gt=0).exists())
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(deleted.count(Visit), 6)
+        self.assertEqual(deleted.count(VisitImage), 12)
+
+    def test_unreadable_photo_is_rejected(self):
+        upload = SimpleUploadedFile("fake.jpg", b"not an image", content_type="image/jpeg")
+        response = self.client.post(
+            reverse("restaurants:restaurant_detail", args=[self.restaurant.pk]),
+            {"date": "2025-01-01", "rating": 4, "images": [upload]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Visit.objects.exists())
+
+
+@override_settings(VISIT_PHOTO_MAX_FILE_SIZE=64 * 1024)
+class VisitPhotoUploadTests(TestCase):
+    """受信中に枚数・サイズ・形式を確かめ、超えたら訪問を保存しないこと"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+        self.restaurant = Restaurant.objects.create(user=self.user, store_name="s", area="a", genre="g")
+
+    def post_files(self, files):
+        return self.client.post(
+            reverse("restaurants:restaurant_detail", args=[self.restaurant.pk]),
+            {"date": "2025-01-01", "rating": 4, "images": files},
+        )
+
+    def assert_rejected(self, response, message):
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(message, [str(m) for m in response.context["messages"]])
+        self.assertFalse(Visit.objects.exists())
+        self.assertFalse(VisitImage.objects.exists())
+
+    def test_sixth_photo_is_rejected(self):
+        files = [SimpleUploadedFile(f"p{i}.jpg", make_jpeg()) for i in range(6)]
+        self.assert_rejected(self.post_files(files), "写真は1回の訪問につき最大5枚まで登録できます。")
+
+    def test_oversized_photo_is_rejected(self):
+        big = SimpleUploadedFile("big.jpg", b"\xff\xd8\xff\xe0" + os.urandom(100 * 1024))
+        self.assert_rejected(self.post_files([big]), "写真は1枚64KBまでです。")
+
+    def test_non_image_bytes_are_rejected(self):
+        fake = SimpleUploadedFile("fake.jpg", b"<html>" + b" " * 100)
+        self.assert_rejected(self.post_files([fake]), "fake.jpg は写真（JPEG / PNG / WebP など）ではありません。")
+
+    def test_csrf_is_still_checked(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(
+            reverse("restaurants:restaurant_detail", args=[self.restaurant.pk]),
+            {"date": "2025-01-01", "rating": 4, "images": [SimpleUploadedFile("p.jpg", make_jpeg())]},
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class DatabaseProfileTests(TestCase):
+    """接続ごとに適用する SQLite の設定（settings.DATABASE_PROFILE）"""
+
+    PRAGMAS = ("journal_mode", "synchronous", "busy_timeout")
+
+    def read_pragmas(self, cursor):
+        values = {}
+        for name in self.PRAGMAS:
+            cursor.execute(f"PRAGMA {name}")
+            values[name] = cursor.fetchone()[0]
+        return values
+
+    def connect(self, profile):
+        """テスト用DB（メモリー上）ではなく新しいファイルに、プロファイルの設定で接続する"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_dict = {
+            **connection.settings_dict,
+            **{key: value for key, value in settings.DATABASE_PROFILES[profile].items() if key != "PRAGMAS"},
+            "NAME": os.path.join(directory, "db.sqlite3"),
+        }
+        wrapper = type(connections["default"])(settings_dict, alias=f"profile_{profile}")
+        self.addCleanup(wrapper.close)
+        with override_settings(DATABASE_PROFILE=profile):
+            wrapper.ensure_connection()
+        with wrapper.cursor() as cursor:
+            return self.read_pragmas(cursor)
+
+    def test_tuned_profile(self):
+        self.assertEqual(self.connect("tuned"), {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 20000})
+
+    def test_default_profile_leaves_sqlite_defaults(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        plain = sqlite3.connect(os.path.join(directory, "db.sqlite3"))
+        self.addCleanup(plain.close)
+
+        self.assertEqual(self.connect("default"), self.read_pragmas(plain.cursor()))
+
+
+class KeysetPaginationTests(TestCase):
+    """キーセット方式のページ送りで全件が1回ずつ返ること"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+
+        # created_at が同じ行が並んでも id で順序が決まること
+        same_time = timezone.now()
+        for i in range(45):
+            restaurant = Restaurant.objects.create(
+                user=self.user, store_name=f"店{i:02d}", area="a", genre="g", status="want",
+            )
+            if i % 3 == 0:
+                Restaurant.objects.filter(pk=restaurant.pk).update(created_at=same_time)
+
+    def test_cards_endpoint_walks_all_pages(self):
+        response = self.client.get(reverse("restaurants:restaurant_list_want"))
+        names = [r.store_name for r in response.context["restaurants"]]
+        query = response.context.get("next_page_query")
+
+        while query:
+            response = self.client.get(reverse("restaurants:restaurant_cards") + "?" + query)
+            self.assertTemplateUsed(response, "restaurants/partials/card_page.html")
+            names += [r.store_name for r in response.context["restaurants"]]
+            query = response.context.get("next_page_query")
+
+        expected = list(
+            Restaurant.objects.filter(user=self.user)
+            .order_by("-created_at", "-id")
+            .values_list("store_name", flat=True)
+        )
+        self.assertEqual(names, expected)
+
+    def test_broken_cursor_starts_from_first_page(self):
+        response = self.client.get(reverse("restaurants:restaurant_list_want") + "?cursor=%%%")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["restaurants"]), 20)
+
+
+class RestaurantSearchTests(TestCase):
+    """検索バックエンド（SQLite では FTS5）での絞り込みと並び順"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        other = User.objects.create_user(email="other@example.com", password="pass1234")
+        self.client.force_login(self.user)
+
+        self.ramen = Restaurant.objects.create(user=self.user, store_name="麺屋", area="渋谷", genre="ラーメン")
+        self.ramen.tags.add(Tag.objects.create(name="個室"), Tag.objects.create(name="個室あり"))
+        self.tsukemen = Restaurant.objects.create(user=self.user, store_name="つけ麺屋", area="新宿", genre="つけ麺・ラーメン")
+        Restaurant.objects.create(user=self.user, store_name="喫茶", area="渋谷", genre="カフェ")
+        Restaurant.objects.create(user=other, store_name="他人の店", area="渋谷", genre="ラーメン")
+
+    def search(self, query):
+        response = self.client.get(reverse("restaurants:restaurant_search_results") + "?" + query)
+        self.assertEqual(response.status_code, 200)
+        return [r.store_name for r in response.context["restaurants"]]
+
+    def test_partial_japanese_match(self):
+        self.assertEqual(sorted(self.search("genre=メン")), ["つけ麺屋", "麺屋"])
+        self.assertEqual(self.search("genre=ラーメン&area=渋谷"), ["麺屋"])
+        self.assertEqual(self.search("area=谷"), ["喫茶", "麺屋"])
+
+    def test_closer_match_ranks_first(self):
+        # 件数が少なすぎると bm25 の IDF が効かないため、無関係なお店を足しておく
+        for i in range(10):
+            Restaurant.objects.create(user=self.user, store_name=f"店{i}", area="天神", genre="焼肉")
+        Restaurant.objects.create(user=self.user, store_name="何でも屋", area="天神", genre="カレー・ナン・タンドリーチキン")
+        Restaurant.objects.create(user=self.user, store_name="カレー屋", area="天神", genre="カレー")
+
+        self.assertEqual(self.search("genre=カレー"), ["カレー屋", "何でも屋"])
+
+    def test_punctuation_only_query_is_ignored(self):
+        # 記号だけの検索語は語にならないので絞り込まず、新しい順のまま
+        for query in ("genre=!!!", "genre=-", "area=・&tag=！"):
+            self.assertEqual(self.search(query), ["喫茶", "つけ麺屋", "麺屋"])
+
+    def test_tag_match_has_no_duplicates(self):
+        self.assertEqual(self.search("tag=個室"), ["麺屋"])
+
+    def test_index_follows_edits(self):
+        self.ramen.genre = "そば"
+        self.ramen.save()
+        self.assertEqual(self.search("genre=ラーメン"), ["つけ麺屋"])
+        self.assertEqual(self.search("genre=そば"), ["麺屋"])
+
+    def test_holiday_bitmask(self):
+        # 編集フォームの複数選択がビット列で保存される
+        self.client.post(reverse("restaurants:restaurant_edit", args=[self.ramen.pk]), {
+            "store_name": "麺屋", "area": "渋谷", "genre": "ラーメン", "holiday": ["月", "祝日"],
+        })
+        self.ramen.refresh_from_db()
+        self.assertEqual(list(self.ramen.holiday), ["月", "祝日"])
+        self.assertEqual(str(self.ramen.holiday), "月、祝日")
+
+        Restaurant.objects.filter(pk=self.tsukemen.pk).update(holiday=["火", "水"])
+        self.assertEqual(sorted(self.search("holiday=月&holiday=火")), ["つけ麺屋", "麺屋"])
+        self.assertEqual(self.search("holiday=祝日&genre=ラーメン"), ["麺屋"])
+        # 「日」で「祝日」に当たらない
+        self.assertEqual(self.search("holiday=日"), [])
+        self.assertEqual(list(Restaurant.objects.filter(holiday__has_all=["火", "水"])), [self.tsukemen])
+
+    def test_holiday_survives_pickle_and_copy(self):
+        Restaurant.objects.filter(pk=self.ramen.pk).update(holiday=["月", "祝日"])
+        restaurant = Restaurant.objects.get(pk=self.ramen.pk)
+
+        for restored in (
+            pickle.loads(pickle.dumps(restaurant)).holiday,
+            copy.copy(restaurant.holiday),
+            copy.deepcopy(restaurant).holiday,
+        ):
+            self.assertEqual(restored, restaurant.holiday)
+            self.assertEqual(str(restored), "月、祝日")
+
+
+class PageCacheTests(TestCase):
+    """一覧・検索のページキャッシュ（restaurants.page_cache）"""
+
+    def setUp(self):
+        # ワーカー間で共有されるキャッシュ（file）のときだけ有効になる
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        shared = override_settings(
+            CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": self.cache_dir,
+            }},
+            SHARED_CACHE=True,
+            SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+        self.restaurant = Restaurant.objects.create(user=self.user, store_name="麺屋", area="渋谷", genre="ラーメン")
+
+    def test_warm_page_skips_database(self):
+        url = reverse("restaurants:restaurant_search_results")
+        self.client.get(url + "?genre=ラーメン&status=all&area=")
+
+        # 並び順や空の値が違っても同じページ
+        with self.assertNumQueries(0):
+            response = self.client.get(url + "?status=all&genre=ラーメン")
+        self.assertContains(response, "麺屋")
+
+    def test_changes_invalidate_page(self):
+        url = reverse("restaurants:restaurant_search_results") + "?status=want"
+        self.client.get(url)
+
+        self.restaurant.store_name = "中華そば"
+        self.restaurant.save()
+        self.assertContains(self.client.get(url), "中華そば")
+
+        tag = Tag.objects.create(name="個室")
+        self.restaurant.tags.add(tag)
+        tag.name = "半個室"
+        tag.save()
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_card_fragment_follows_tag_changes(self):
+        url = reverse("restaurants:restaurant_list_want")
+        self.client.get(url)
+
+        # 行を保存しないタグの付け外しでもカードを作り直す
+        tag = Tag.objects.create(name="個室")
+        self.restaurant.tags.add(tag)
+        self.assertContains(self.client.get(url), "個室")
+
+        tag.name = "半個室"
+        tag.save()
+        self.assertContains(self.client.get(url), "半個室")
+
+    def test_card_fragment_follows_visit_edit(self):
+        self.restaurant.status = "went"
+        self.restaurant.save()
+        visit = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 1), comment="普通")
+        url = reverse("restaurants:restaurant_list_went")
+        self.assertContains(self.client.get(url), "普通")
+
+        self.client.post(
+            reverse("restaurants:visit_edit", args=[visit.pk]),
+            {"date": "2025-01-01", "comment": "また行きたい", "rating": 5},
+        )
+        html = self.client.get(url).content.decode()
+        self.assertIn("また行きたい", html)
+        self.assertNotIn("普通", html)
+        self.assertIn("★", html)
+
+    def test_version_bumped_by_another_worker(self):
+        url = reverse("restaurants:restaurant_search_results") + "?status=want"
+        self.client.get(url)
+
+        # 別のワーカー（同じ場所を見る別のキャッシュのインスタンス）で更新される
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(store_name="中華そば", updated_at=timezone.now())
+        other_worker = FileBasedCache(self.cache_dir, {})
+        with mock.patch("restaurants.charts.cache", other_worker):
+            bump_data_version(self.user.pk)
+
+        self.assertContains(self.client.get(url), "中華そば")
+
+    def test_disabled_without_shared_cache(self):
+        url = reverse("restaurants:restaurant_search_results") + "?status=want"
+        with override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+            SHARED_CACHE=False,
+        ):
+            self.client.get(url)
+            Restaurant.objects.filter(pk=self.restaurant.pk).update(store_name="中華そば", updated_at=timezone.now())
+            self.assertContains(self.client.get(url), "中華そば")
+
+    def test_pages_are_per_user(self):
+        url = reverse("restaurants:restaurant_list_want")
+        self.client.get(url)
+
+        other = User.objects.create_user(email="other@example.com", password="pass1234")
+        self.client.force_login(other)
+        self.assertNotContains(self.client.get(url), "麺屋")
+
+    def test_pending_message_is_not_cached(self):
+        session = self.client.session
+        session["just_signed_up"] = True
+        session.save()
+
+        url = reverse("restaurants:restaurant_search")
+        response = self.client.get(url)
+        self.assertEqual([str(m) for m in response.context["messages"]], ["login_first"])
+
+        # メッセージ入りのページは保存していないので描画し直す
+        response = self.client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertEqual(list(response.context["messages"]), [])
+
+
+class ConditionalGetTests(TestCase):
+    """一覧・詳細・マイページの ETag / Last-Modified"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+        self.restaurant = Restaurant.objects.create(
+            user=self.user, store_name="麺屋", area="渋谷", genre="ラーメン", status="went",
+        )
+        self.visit = Visit.objects.create(restaurant=self.restaurant, date=datetime.date(2025, 1, 1), rating=4)
+
+    def revalidate(self, url):
+        # 最初の表示で CSRF の Cookie を受け取ってから
+        self.client.get(url)
+        etag = self.client.get(url)["ETag"]
+        return etag, self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_return_304(self):
+        for url in (
+            reverse("restaurants:restaurant_list_went"),
+            reverse("restaurants:restaurant_detail_went", args=[self.restaurant.pk]),
+            reverse("accounts:mypage"),
+        ):
+            _, response = self.revalidate(url)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b"")
+
+    def test_visit_edit_changes_etag(self):
+        url = reverse("restaurants:restaurant_detail_went", args=[self.restaurant.pk])
+        etag, _ = self.revalidate(url)
+
+        self.visit.comment = "また行きたい"
+        self.visit.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_other_users_restaurant_is_not_validated(self):
+        other = User.objects.create_user(email="other@example.com", password="pass1234")
+        self.client.force_login(other)
+        response = self.client.get(reverse("restaurants:restaurant_detail_went", args=[self.restaurant.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header("ETag"))
+
+
+class StaticAssetTests(TestCase):
+    """圧縮済みの静的ファイルの配信（savoiry_project.assets）"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, "js"))
+        self.path = os.path.join(self.root, "js", "app.js")
+        with open(self.path, "w") as f:
+            f.write("console.log('savoiry');\n" * 100)
+
+    def get(self, path, **headers):
+        with override_settings(STATIC_ROOT=self.root):
+            return serve_asset(RequestFactory().get("/static/" + path, headers=headers), path)
+
+    def test_precompressed_file_is_negotiated(self):
+        self.assertEqual(compress(self.path)[0], self.path + ".gz")
+
+        response = self.get("js/app.js", accept_encoding="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/javascript")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        response.close()
+
+        response = self.get("js/app.js")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response.close()
+
+    def test_paths_outside_static_root_are_404(self):
+        for path in ("../manage.py", "js/app.js.gz", "js/missing.js"):
+            with self.assertRaises(Http404):
+                self.get(path)
+
+
+class SuggestTests(TestCase):
+    """サジェスト API：前方一致（かな・ローマ字）と、語の追加でキャッシュが無効になること"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+        for word in ("ラーメン", "ラム肉", "カフェ", "らーめん横丁"):
+            SuggestWord.objects.create(word_type="genre", word=word)
+        SuggestWord.objects.create(word_type="area", word="ラーメン通り")
+
+    def suggest(self, word_type, q):
+        response = self.client.get(reverse("restaurants:suggest"), {"type": word_type, "q": q})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["words"]
+
+    def test_prefix_match_with_kana_and_romaji(self):
+        self.assertEqual(self.suggest("genre", "らーめ"), ["ラーメン", "らーめん横丁"])
+        self.assertEqual(self.suggest("genre", "ra-men"), ["ラーメン", "らーめん横丁"])
+        self.assertEqual(self.suggest("genre", "ﾗﾑ"), ["ラム肉"])
+        self.assertEqual(self.suggest("genre", "メン"), [])
+
+    def test_new_word_invalidates_cache(self):
+        self.assertEqual(self.suggest("genre", "カ"), ["カフェ"])
+        SuggestWord.objects.create(word_type="genre", word="カレー")
+        self.assertEqual(self.suggest("genre", "カ"), ["カフェ", "カレー"])
+
+    def test_long_key_after_nfkc(self):
+        # ㍿ は NFKC で「株式会社」になるので、50 文字の語でもキーは 200 文字になる
+        SuggestWord.objects.create(word_type="genre", word="㍿" * 50)
+        self.assertEqual(len(SuggestWord.objects.get(word="㍿" * 50).search_key), 200)
+        self.assertEqual(self.suggest("genre", "株式会社"), ["㍿" * 50])
+
+    def test_unknown_type(self):
+        response = self.client.get(reverse("restaurants:suggest"), {"type": "owner", "q": "a"})
+        self.assertEqual(response.status_code, 400)
+
+
+class TagAndSuggestBulkSaveTests(TestCase):
+    """登録・編集でタグとサジェストをまとめて保存すること"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pass1234")
+        self.client.force_login(self.user)
+
+    def post_add(self, tags):
+        data = {"store_name": "麺屋", "area": "渋谷", "genre": "ラーメン", "companions": "友人", "scene": "ランチ", "tags": tags}
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(reverse("restaurants:restaurant_add"), data)
+        self.assertEqual(response.status_code, 302)
+        return len(ctx.captured_queries)
+
+    def test_create_query_count_does_not_grow_with_tags(self):
+        few = self.post_add(["t0"])
+        many = self.post_add([f"t{i}" for i in range(10)])
+        self.assertEqual(few, many)
+
+        self.assertEqual(Tag.objects.count(), 10)
+        self.assertEqual(SuggestWord.objects.filter(word_type="tag").count(), 10)
+        self.assertEqual(SuggestWord.objects.exclude(word_type="tag").count(), 4)
+        self.assertEqual(SuggestWord.objects.get(word="ラーメン").search_key, "らーめん")
+
+    def test_edit_only_touches_changed_tags(self):
+        self.post_add(["個室", "駅近", "深夜"])
+        restaurant = Restaurant.objects.get()
+        through = Restaurant.tags.through
+        kept = set(through.objects.filter(tag__name__in=["個室", "駅近"]).values_list("id", flat=True))
+
+        data = {"store_name": "麺屋", "area": "渋谷", "genre": "ラーメン", "tags": ["個室", "駅近", "禁煙"]}
+        response = self.client.post(reverse("restaurants:restaurant_edit", args=[restaurant.pk]), data)
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(sorted(restaurant.tags.values_list("name", flat=True)), ["個室", "禁煙", "駅近"])
+        # 残したタグの中間テーブルの行は作り直さない
+        self.assertTrue(kept <= set(through.objects.values_list("id", flat=True)))
+
+
+class JobQueueTests(TestCase):
+    """失敗したジョブは間隔を空けて再試行し、上限を超えたら DeadJob に移ること"""
+
+    def setUp(self):
+        self.calls = []
+
+        @register("test_flaky")
+        def flaky(fail_times):
+            self.calls.append(fail_times)
+            if len(self.calls) <= fail_times:
+                raise RuntimeError("boom")
+
+        self.addCleanup(TASKS.pop, "test_flaky")
+        # 失敗時の警告ログを出力せずに受け止める
+        self.enterContext(self.assertLogs("restaurants.jobs", "WARNING"))
+
+    def run_due(self):
+        # 再試行待ちのジョブを今すぐ実行できるようにする
+        Job.objects.update(run_after=timezone.now())
+        return run_pending()
+
+    def test_retry_then_success(self):
+        enqueue("test_flaky", fail_times=2)
+        self.run_due()
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ("pending", 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn("boom", job.last_error)
+
+        self.run_due()
+        self.run_due()
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(len(self.calls), 3)
+
+    @override_settings(JOB_MAX_ATTEMPTS=2)
+    def test_dead_letter_and_requeue(self):
+        enqueue("test_flaky", fail_times=5)
+        self.run_due()
+        self.run_due()
+        self.assertFalse(Job.objects.exists())
+        dead = DeadJob.objects.get()
+        self.assertEqual((dead.task, dead.attempts, dead.payload), ("test_flaky", 2, {"fail_times": 5}))
+
+        call_command("run_jobs", "--requeue-dead", stdout=io.StringIO())
+        self.assertFalse(DeadJob.objects.exists())
+        self.assertEqual(Job.objects.get().attempts, 0)
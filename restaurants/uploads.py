@@ -0,0 +1,115 @@
+"""訪問写真のアップロード受信
+
+Django の既定では全ファイルを受け取り終えてから枚数を数えるため、大きすぎる・多すぎる
+アップロードでもメモリ（2.5MB まで）とディスクを使い切ってしまう。
+VisitPhotoUploadHandler は受信しながら
+  - 1リクエストの写真の枚数（VISIT_PHOTO_MAX_FILES）
+  - 1枚あたり・1リクエストあたりのバイト数（VISIT_PHOTO_MAX_FILE_SIZE / VISIT_PHOTO_MAX_REQUEST_SIZE）
+  - 先頭のバイト列（JPEG / PNG / GIF / WebP / AVIF のシグネチャ）
+を確かめ、超えた・合わないファイルはその場で読み捨てる（他の項目はそのまま受け取る）。
+受け取るファイルは常に一時ファイルに書くので、大きさに関係なくメモリの使用量は一定。
+弾いた理由は request.upload_errors に入る。
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+
+# 判定に使う先頭のバイト数
+HEAD_SIZE = 12
+
+
+def is_image_header(head):
+    return (
+        head.startswith(b"\xff\xd8\xff")                         # JPEG
+        or head.startswith(b"\x89PNG\r\n\x1a\n")                 # PNG
+        or head[:6] in (b"GIF87a", b"GIF89a")                    # GIF
+        or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")       # WebP
+        or (head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"))  # AVIF
+    )
+
+
+def format_size(size):
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):g}MB"
+    return f"{size // 1024}KB"
+
+
+class VisitPhotoUploadHandler(TemporaryFileUploadHandler):
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.file_count = 0
+        self.total_size = 0
+        self.writing = False
+        self.errors = request.upload_errors = []
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # 本文の長さが上限を超えていれば、どのファイルもディスクに書かずに読み捨てる
+        self.request_too_large = content_length > settings.VISIT_PHOTO_MAX_REQUEST_SIZE
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        self.file_count += 1
+        if self.file_count > settings.VISIT_PHOTO_MAX_FILES:
+            self.reject(f"写真は1回の訪問につき最大{settings.VISIT_PHOTO_MAX_FILES}枚まで登録できます。")
+        if getattr(self, "request_too_large", False):
+            self.reject(f"写真の合計は{format_size(settings.VISIT_PHOTO_MAX_REQUEST_SIZE)}までです。")
+
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.writing = True
+        self.file_size = 0
+        self.head = b""
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file_size += len(raw_data)
+        self.total_size += len(raw_data)
+        if self.file_size > settings.VISIT_PHOTO_MAX_FILE_SIZE:
+            self.reject(f"写真は1枚{format_size(settings.VISIT_PHOTO_MAX_FILE_SIZE)}までです。")
+        if self.total_size > settings.VISIT_PHOTO_MAX_REQUEST_SIZE:
+            self.reject(f"写真の合計は{format_size(settings.VISIT_PHOTO_MAX_REQUEST_SIZE)}までです。")
+
+        # 先頭のバイト列が揃った時点で形式を確かめる（チャンクの境目をまたいでもよい）
+        if self.head is not None:
+            self.head += raw_data[:HEAD_SIZE]
+            if len(self.head) >= HEAD_SIZE:
+                if not is_image_header(self.head):
+                    self.reject(f"{self.file_name} は写真（JPEG / PNG / WebP など）ではありません。")
+                self.head = None
+
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        self.writing = False
+        if self.head is not None and not is_image_header(self.head):
+            # 先頭のバイト数に満たない小さなファイル（ここでは SkipFile を使えない）
+            self.add_error(f"{self.file_name} は写真（JPEG / PNG / WebP など）ではありません。")
+            self.file.close()
+            return None
+        return super().file_complete(file_size)
+
+    def add_error(self, message):
+        if message not in self.errors:
+            self.errors.append(message)
+
+    def reject(self, message):
+        """このファイルを読み捨てる"""
+        self.add_error(message)
+        if not self.writing:
+            # 受け取り済みの前のファイルまで閉じられないよう参照を外す
+            # （SkipFile を受けたパーサーは handler.file を閉じる）
+            self.__dict__.pop("file", None)
+        raise SkipFile
+
+
+class VisitPhotoUploadMixin:
+    """写真を受け取るビューのアップロードを VisitPhotoUploadHandler で受ける
+
+    CSRF の検証で request.POST が読まれる前に差し替える必要があるため、
+    dispatch は csrf_exempt にして、差し替えたあとで csrf_protect を通す。
+    """
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        request.upload_handlers = [VisitPhotoUploadHandler(request)]
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
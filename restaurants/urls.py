@@ -27,6 +27,7 @@ urlpatterns = [
     path("went/<int:pk>/", WentRestaurantDetailView.as_view(), name="restaurant_detail_went"),
     path("search/", RestaurantSearchView.as_view(), name="restaurant_search"),
     path("search/results/", RestaurantSearchResultView.as_view(), name="restaurant_search_results"),
+    path("cards/", views.RestaurantCardsView.as_view(), name="restaurant_cards"),
     path("tags/add/", TagCreateView.as_view(), name="tag_add"),
     path("visit_chart/monthly/", views.visit_chart_monthly, name="visit_chart_monthly"),
     path("visit_chart/genre_top3/", views.visit_chart_top3_genre, name="visit_chart_top3_genre"),
@@ -35,6 +36,8 @@ urlpatterns = [
     path("visit/<int:pk>/edit/", VisitUpdateView.as_view(), name="visit_edit"),
     path("visit/<int:pk>/delete/", views.VisitDeleteView.as_view(), name="visit_delete"),
     path("visit_chart/genre/", views.visit_chart_genre, name="visit_chart_genre"),
+    path("visit_stats/", views.visit_stats_json, name="visit_stats"),
+    path("suggest/", views.suggest_words, name="suggest"),
     path("<int:pk>/", RestaurantDetailView.as_view(), name="restaurant_detail"),
     path("restaurant/<int:pk>/edit/",views.RestaurantEditView.as_view(),name="restaurant_edit"),
     path("visit/image/<int:image_id>/delete/", views.delete_visit_image, name="delete_visit_image"),
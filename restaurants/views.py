@@ -3,25 +3,28 @@ from django.views.generic import CreateView, ListView, DeleteView, UpdateView, T
 from django.urls import reverse_lazy, reverse
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Restaurant, Visit, VisitImage, Tag, SuggestWord
+from .models import Restaurant, Visit, VisitImage, Tag
 from .forms import RestaurantForm, VisitForm
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-plt.rcParams["font.family"] = "MS Gothic"
+from .charts import cached_chart, chart_response, visit_stats
+from .page_cache import UserPageCacheMixin, conditional_page
+from .pagination import KeysetPaginationMixin
+from .search import get_search_backend
+from .storage import visit_image_storage
+from .uploads import VisitPhotoUploadMixin
+from .suggest import SUGGEST_LIMIT, SUGGEST_MAX_LIMIT, WORD_TYPES, save_suggest_words, suggest
 from django.http import HttpResponse, JsonResponse 
 import io
 from django.db.models.functions import TruncMonth
-from django.db.models import Count, Avg, Q
+from django.db.models import Count, Avg, Max, Q
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-import matplotlib
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.decorators import method_decorator
 from django.http import HttpResponseForbidden
 import datetime
 
-matplotlib.rcParams['font.family'] = ['Noto Sans CJK JP', 'IPAexGothic', 'TakaoGothic', 'Meiryo', 'sans-serif']
-
 
 class RestaurantCreateView(LoginRequiredMixin, CreateView):
     model = Restaurant
@@ -29,18 +32,6 @@ class RestaurantCreateView(LoginRequiredMixin, CreateView):
     template_name = "restaurants/restaurant_form.html"
     success_url = reverse_lazy("restaurants:restaurant_search")
 
-    # ★ サジェスト候補
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-
-        context["area_list"] = SuggestWord.objects.filter(word_type="area").values_list("word", flat=True)
-        context["genre_list"] = SuggestWord.objects.filter(word_type="genre").values_list("word", flat=True)
-        context["group_list"] = SuggestWord.objects.filter(word_type="group").values_list("word", flat=True)
-        context["scene_list"] = SuggestWord.objects.filter(word_type="scene").values_list("word", flat=True)
-        context["tag_list"] = SuggestWord.objects.filter(word_type="tag").values_list("word", flat=True)
-
-        return context
-
     def form_valid(self, form):
        
         restaurant = form.save(commit=False)
@@ -49,46 +40,27 @@ class RestaurantCreateView(LoginRequiredMixin, CreateView):
         restaurant.user = self.request.user
         restaurant.status = "want"
 
-        # -----------------------------
-        # ★ 休業日の複数選択を文字列に変換して保存
-        # -----------------------------
-        holidays = self.request.POST.getlist("holiday")
-        restaurant.holiday = "、".join(holidays)
+        with transaction.atomic():
+            restaurant.save()
 
-        restaurant.save()
+            # ManyToMany の tags は save_m2m() が必要
+            form.save_m2m()
 
-        # ManyToMany の tags は save_m2m() が必要
-        form.save_m2m()
+            # -----------------------------
+            # ★ タグ・サジェストをまとめて保存
+            # -----------------------------
+            tags_input = [t.strip() for t in self.request.POST.getlist("tags") if t.strip()]
+            restaurant.set_tag_names(tags_input)
 
-        # -----------------------------
-        # ★ サジェスト保存処理
-        # -----------------------------
-        def save_suggest(word_type, value):
-            if value:
-                value = value.strip()
-                if value:
-                    SuggestWord.objects.get_or_create(
-                        word_type=word_type,
-                        word=value
-                    )
-
-        # 固定項目
-        save_suggest("area", restaurant.area)
-        save_suggest("genre", restaurant.genre)
-        save_suggest("group", restaurant.companions)
-        save_suggest("scene", restaurant.scene)
-
-        # タグ保存
-        tags_input = self.request.POST.getlist("tags")
-        if tags_input:
-            for tag_name in tags_input:
-                tag_name = tag_name.strip()
-                if not tag_name:
-                    continue
-
-                tag_obj, _ = Tag.objects.get_or_create(name=tag_name)
-                restaurant.tags.add(tag_obj)
-                save_suggest("tag", tag_name)
+            save_suggest_words(
+                [
+                    ("area", restaurant.area),
+                    ("genre", restaurant.genre),
+                    ("group", restaurant.companions),
+                    ("scene", restaurant.scene),
+                ]
+                + [("tag", tag_name) for tag_name in tags_input]
+            )
 
         messages.success(self.request, "restaurant_added")
 
@@ -109,11 +81,12 @@ class VisitCreateView(LoginRequiredMixin, CreateView):
 
 
         form.instance.restaurant = restaurant
-        response = super().form_valid(form)
 
+        with transaction.atomic():
+            response = super().form_valid(form)
 
-        restaurant.status = "went"
-        restaurant.save()
+            restaurant.status = "went"
+            restaurant.save(update_fields=["status"])
 
         return response
 
@@ -121,26 +94,52 @@ class VisitCreateView(LoginRequiredMixin, CreateView):
         return reverse_lazy("restaurants:restaurant_detail", kwargs={"pk": self.object.restaurant.pk})
 
 
-class WantRestaurantListView(LoginRequiredMixin, ListView):
+# -----------------------------
+# ★ 条件付き GET（ETag / Last-Modified）の検証値。変わっていなければ描画せずに 304
+# -----------------------------
+def restaurant_list_validators(status):
+    def get_validators(user_id, **kwargs):
+        # (user, status, updated_at) の索引だけで数える
+        row = Restaurant.objects.filter(user_id=user_id, status=status).aggregate(
+            updated_at=Max("updated_at"), count=Count("id"),
+        )
+        return row["updated_at"], row["count"]
+    return get_validators
+
+
+def restaurant_detail_validators(user_id, pk):
+    restaurant = Restaurant.objects.filter(pk=pk, user_id=user_id).values_list("updated_at", flat=True).first()
+    if restaurant is None:
+        return None
+    visits = Visit.objects.filter(restaurant_id=pk).aggregate(updated_at=Max("updated_at"), count=Count("id"))
+    return max(filter(None, [restaurant, visits["updated_at"]])), visits["count"]
+
+
+@method_decorator(conditional_page(restaurant_list_validators("want")), name="dispatch")
+class WantRestaurantListView(UserPageCacheMixin, LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Restaurant
     template_name = "restaurants/restaurant_list_want.html"
     context_object_name = "restaurants"
+    keyset_extra_params = {"status": "want"}
 
     def get_queryset(self):
-        return Restaurant.objects.filter(user=self.request.user, status="want").order_by("-created_at")
+        return Restaurant.objects.filter(user=self.request.user, status="want").with_card_data().order_by("-created_at", "-id")
 
 
-class WentRestaurantListView(LoginRequiredMixin, ListView):
+@method_decorator(conditional_page(restaurant_list_validators("went")), name="dispatch")
+class WentRestaurantListView(UserPageCacheMixin, LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Restaurant
     template_name = "restaurants/restaurant_list_went.html"
     context_object_name = "restaurants"
+    keyset_extra_params = {"status": "went"}
 
     def get_queryset(self):
-        return Restaurant.objects.filter(user=self.request.user, status="went").prefetch_related("visits").order_by("-created_at")
+        return Restaurant.objects.filter(user=self.request.user, status="went").with_card_data().order_by("-created_at", "-id")
 
 
 
-class RestaurantDetailView(LoginRequiredMixin, View):
+@method_decorator(conditional_page(restaurant_detail_validators), name="dispatch")
+class RestaurantDetailView(VisitPhotoUploadMixin, LoginRequiredMixin, View):
     def get(self, request, pk):
         restaurant = get_object_or_404(Restaurant, pk=pk, user=request.user)
         form = VisitForm()
@@ -160,9 +159,10 @@ class RestaurantDetailView(LoginRequiredMixin, View):
             # ★ 画像を取得（ここが最重要）
             images = request.FILES.getlist("images")
 
-            # ★ 5枚を超えていたらエラーを出して return
-            if len(images) > 5:
-                messages.error(request, "写真は1回の訪問につき最大5枚まで登録できます。")
+            # ★ 5枚を超えていた・受信中に弾いた写真があればエラーを出して return
+            if len(images) > 5 or request.upload_errors:
+                for message in request.upload_errors or ["写真は1回の訪問につき最大5枚まで登録できます。"]:
+                    messages.error(request, message)
 
                 visits = Visit.objects.filter(restaurant=restaurant).order_by('-date')
                 return render(request, "restaurants/restaurant_detail.html", {
@@ -178,19 +178,22 @@ class RestaurantDetailView(LoginRequiredMixin, View):
             if not visit.date:
                 visit.date = timezone.now().date()
 
-            visit.save()
-
-            # ★ 画像の保存処理
-            for image in images:
-                VisitImage.objects.create(visit=visit, image=image)
-
-            # ステータス更新
-            if restaurant.status == 'want':
-                restaurant.status = 'went'
-                restaurant.save()
-
-            messages.success(request, "went_added")
-            return redirect("restaurants:restaurant_list_went")
+            # ★ 訪問・画像・ステータスを1つのトランザクションで保存
+            try:
+                with visit_image_storage.discard_on_error(), transaction.atomic():
+                    visit.save()
+                    visit.add_images(images)
+
+                    # ステータス更新（サマリー列を古い値で上書きしないよう status だけ保存）
+                    if restaurant.status == 'want':
+                        restaurant.status = 'went'
+                        restaurant.save(update_fields=["status"])
+            except ValidationError as e:
+                # 写真として読めないファイルがあれば訪問ごと保存しない
+                messages.error(request, e.messages[0])
+            else:
+                messages.success(request, "went_added")
+                return redirect("restaurants:restaurant_list_went")
 
         # フォームエラー時
         visits = Visit.objects.filter(restaurant=restaurant).order_by('-date')
@@ -213,7 +216,10 @@ class RestaurantDeleteView(LoginRequiredMixin, View):
         restaurant = get_object_or_404(Restaurant, pk=pk, user=request.user)
 
         restaurant_name = restaurant.store_name
-        restaurant.delete()
+        # 訪問と写真は1件ずつのカスケードではなくまとめて消す
+        with transaction.atomic():
+            restaurant.visits.all().delete_with_images()
+            restaurant.delete()
 
         messages.success(request, f" {restaurant_name} を「気になる」から削除しました。")
 
@@ -226,13 +232,13 @@ class RestaurantResetView(LoginRequiredMixin, View):
     def post(self, request, pk):
         restaurant = get_object_or_404(Restaurant, pk=pk, user=request.user)
 
-        visits = restaurant.visits.all()
-        for visit in visits:
-            visit.images.all().delete()
-        visits.delete()
+        # 訪問と写真を件数によらず一定回数の SQL で消す（ファイルは purge_image_blobs が後で消す）
+        with transaction.atomic():
+            restaurant.visits.all().delete_with_images()
 
-        restaurant.status = "want"
-        restaurant.save()
+            # サマリー列を古い値で上書きしないよう status だけ保存
+            restaurant.status = "want"
+            restaurant.save(update_fields=["status"])
 
         messages.success(request, f" {restaurant.store_name} を「気になる」に戻しました。")
 
@@ -240,7 +246,7 @@ class RestaurantResetView(LoginRequiredMixin, View):
 
 
 
-class RestaurantSearchView(LoginRequiredMixin, TemplateView):
+class RestaurantSearchView(UserPageCacheMixin, LoginRequiredMixin, TemplateView):
     template_name = "restaurants/restaurant_search.html"
 
     def get_context_data(self, **kwargs):
@@ -253,12 +259,6 @@ class RestaurantSearchView(LoginRequiredMixin, TemplateView):
         context["want_count"] = Restaurant.objects.filter(user=user, status="want").count()
         context["went_count"] = Restaurant.objects.filter(user=user, status="went").count()
 
-        context["area_list"] = SuggestWord.objects.filter(word_type="area").values_list("word", flat=True)
-        context["genre_list"] = SuggestWord.objects.filter(word_type="genre").values_list("word", flat=True)
-        context["group_list"] = SuggestWord.objects.filter(word_type="group").values_list("word", flat=True)
-        context["scene_list"] = SuggestWord.objects.filter(word_type="scene").values_list("word", flat=True)
-        context["tag_list"] = SuggestWord.objects.filter(word_type="tag").values_list("word", flat=True)
-
         # ★ 休業日の選択肢（検索画面用）
         context["holiday_choices"] = Restaurant.DAY_CHOICES
 
@@ -268,37 +268,40 @@ class RestaurantSearchView(LoginRequiredMixin, TemplateView):
         return context
 
 
-class RestaurantSearchResultView(LoginRequiredMixin, ListView):
+class RestaurantSearchResultView(UserPageCacheMixin, LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Restaurant
     context_object_name = "restaurants"
 
     def get_queryset(self):
-        queryset = Restaurant.objects.filter(user=self.request.user).order_by("-created_at")
+        queryset = Restaurant.objects.with_card_data()
+
+        # ---- 個別フィルター（検索バックエンドで全文検索）----
+        criteria = {}
+        for field, param in (
+            ("genre", "genre"),
+            ("area", "area"),
+            ("companions", "companions"),
+            ("scene", "scene"),
+            ("tags", "tag"),
+        ):
+            value = self.request.GET.get(param)
+            if value:
+                criteria[field] = value
 
-        genre = self.request.GET.get("genre")
-        area = self.request.GET.get("area")
-        companions = self.request.GET.get("companions")
-        scene = self.request.GET.get("scene")
-        holidays = self.request.GET.getlist("holiday")
-        tag = self.request.GET.get("tag")
-        status = self.request.GET.get("status")  # ← 追加フィルター対象
+        backend = get_search_backend()
+        queryset = backend.filter(queryset, criteria, user=self.request.user)
 
-        # ---- 個別フィルター ----
-        if genre:
-            queryset = queryset.filter(genre__icontains=genre)
-        if area:
-            queryset = queryset.filter(area__icontains=area)
-        if companions:
-            queryset = queryset.filter(companions__icontains=companions)
-        if scene:
-            queryset = queryset.filter(scene__icontains=scene)
+        # ---- 休業日（いずれかの曜日が休み）はビット列の条件1つで絞る ----
+        holidays = self.request.GET.getlist("holiday")
         if holidays:
-            q_obj = Q()
-            for h in holidays:
-                q_obj |= Q(holiday__icontains=h)
-            queryset = queryset.filter(q_obj)
-        if tag:
-            queryset = queryset.filter(tags__name__icontains=tag)
+            queryset = queryset.filter(holiday__has_any=holidays)
+
+        # 検索語で絞り込めたときは一致度順（同点は新しい順）
+        if backend.is_ranked(queryset):
+            self.keyset_ordering = ("search_rank", "-created_at", "-id")
+        queryset = queryset.order_by(*self.keyset_ordering)
+
+        status = self.request.GET.get("status")  # ← 追加フィルター対象
 
         # ---- ★ステータスフィルター（改善版）----
         if status == "want":
@@ -328,15 +331,22 @@ class RestaurantSearchResultView(LoginRequiredMixin, ListView):
         return ["restaurants/restaurant_search_result_all.html"]
 
 
+class RestaurantCardsView(RestaurantSearchResultView):
+    """無限スクロール用：次のページのカードだけを返す（絞り込み条件は検索結果と同じ）"""
+
+    def get_template_names(self):
+        return ["restaurants/partials/card_page.html"]
+
+
 
 
-class RestaurantListView(LoginRequiredMixin, ListView):
+class RestaurantListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Restaurant
     template_name = "restaurants/restaurant_list.html"
     context_object_name = "restaurants"
 
     def get_queryset(self):
-        queryset = Restaurant.objects.filter(user=self.request.user).order_by("-created_at")
+        queryset = Restaurant.objects.filter(user=self.request.user).order_by("-created_at", "-id")
 
 
         tag = self.request.GET.get("tag")
@@ -351,6 +361,7 @@ class RestaurantListView(LoginRequiredMixin, ListView):
         return context
 
 
+@method_decorator(conditional_page(restaurant_detail_validators), name="dispatch")
 class WentRestaurantDetailView(LoginRequiredMixin, View):
     def get(self, request, pk):
         restaurant = get_object_or_404(Restaurant, pk=pk, user=request.user)
@@ -369,7 +380,7 @@ class WentRestaurantDetailView(LoginRequiredMixin, View):
 
 
 
-class VisitUpdateView(LoginRequiredMixin, UpdateView):
+class VisitUpdateView(VisitPhotoUploadMixin, LoginRequiredMixin, UpdateView):
     model = Visit
     form_class = VisitForm
     template_name = "restaurants/restaurant_visit_form.html"
@@ -409,10 +420,19 @@ class VisitUpdateView(LoginRequiredMixin, UpdateView):
             messages.error(self.request, "写真は1回の訪問につき最大5枚まで登録できます。")
             return self.form_invalid(form)
 
-        response = super().form_valid(form)
+        # 受信中に弾いた写真（枚数・サイズ・形式）
+        if self.request.upload_errors:
+            for message in self.request.upload_errors:
+                messages.error(self.request, message)
+            return self.form_invalid(form)
 
-        for image in new_images:
-            VisitImage.objects.create(visit=visit, image=image)
+        try:
+            with visit_image_storage.discard_on_error(), transaction.atomic():
+                response = super().form_valid(form)
+                visit.add_images(new_images)
+        except ValidationError as e:
+            messages.error(self.request, e.messages[0])
+            return self.form_invalid(form)
 
         return response
 
@@ -423,7 +443,7 @@ class VisitUpdateView(LoginRequiredMixin, UpdateView):
             kwargs={"pk": restaurant.pk}
         )
 
-class VisitRevisitStoreView(LoginRequiredMixin, View):
+class VisitRevisitStoreView(VisitPhotoUploadMixin, LoginRequiredMixin, View):
 
     def get(self, request, pk):
         restaurant = get_object_or_404(Restaurant, pk=pk, user=request.user)
@@ -443,17 +463,21 @@ class VisitRevisitStoreView(LoginRequiredMixin, View):
             images = request.FILES.getlist("images")
 
             # ★ ここが一番重要（5枚制限）★
-            if len(images) > 5:
-                messages.error(request, "写真は1回の訪問につき最大5枚まで登録できます。")
+            if len(images) > 5 or request.upload_errors:
+                for message in request.upload_errors or ["写真は1回の訪問につき最大5枚まで登録できます。"]:
+                    messages.error(request, message)
                 return redirect(request.path)
 
             visit = form.save(commit=False)
             visit.restaurant = restaurant
-            visit.save()
 
-            # 画像保存
-            for img in images:
-                VisitImage.objects.create(visit=visit, image=img)
+            try:
+                with visit_image_storage.discard_on_error(), transaction.atomic():
+                    visit.save()
+                    visit.add_images(images)
+            except ValidationError as e:
+                messages.error(request, e.messages[0])
+                return redirect(request.path)
 
             return redirect("restaurants:restaurant_detail_went", pk=restaurant.pk)
 
@@ -479,7 +503,8 @@ class VisitDeleteView(LoginRequiredMixin, View):
             return HttpResponseForbidden()
 
         restaurant_id = visit.restaurant.id
-        visit.delete()
+        with transaction.atomic():
+            Visit.objects.filter(pk=visit.pk).delete_with_images()
 
         messages.success(request, "訪問記録を削除しました")
 
@@ -502,11 +527,6 @@ class RestaurantEditView(LoginRequiredMixin, UpdateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["area_list"] = SuggestWord.objects.filter(word_type="area").values_list("word", flat=True)
-        context["genre_list"] = SuggestWord.objects.filter(word_type="genre").values_list("word", flat=True)
-        context["group_list"] = SuggestWord.objects.filter(word_type="group").values_list("word", flat=True)
-        context["scene_list"] = SuggestWord.objects.filter(word_type="scene").values_list("word", flat=True)
-        context["tag_list"] = SuggestWord.objects.filter(word_type="tag").values_list("word", flat=True)
 
         # タグ（編集時）
         restaurant = self.object
@@ -514,209 +534,77 @@ class RestaurantEditView(LoginRequiredMixin, UpdateView):
         return context
 
     def form_valid(self, form):
-    # ▼ 休業日の複数選択を保存
-        holidays = self.request.POST.getlist("holiday")
-        form.instance.holiday = "、".join(holidays)
-
     # ▼ ★ None文字列対策（ここが重要）
         if form.instance.companions in [None, "None"]:
             form.instance.companions = ""
         if form.instance.scene in [None, "None"]:
             form.instance.scene = ""
 
-        response = super().form_valid(form)
+        with transaction.atomic():
+            response = super().form_valid(form)
 
-        # ▼ タグ更新処理
-        restaurant = self.object
-        tags = self.request.POST.getlist("tags")
-        tags = [t.strip() for t in tags if t.strip()]
-        restaurant.tags.clear()
-
-        from .models import Tag
-        for tagname in tags:
-            tag_obj, _ = Tag.objects.get_or_create(name=tagname)
-            restaurant.tags.add(tag_obj)
+            # ▼ タグ更新処理（差分だけ付け外し）
+            tags = self.request.POST.getlist("tags")
+            tags = [t.strip() for t in tags if t.strip()]
+            self.object.set_tag_names(tags)
 
         return response
 
 
+@cached_chart("monthly")
 def visit_chart_monthly(request):
-    import matplotlib.pyplot as plt
-    import io
-    from django.http import HttpResponse
-    from django.db.models.functions import TruncMonth
-    from django.db.models import Count
-
-    plt.close("all")
-
     if not request.user.is_authenticated:
-        fig, ax = plt.subplots(figsize=(6, 3))
-        ax.text(0.5, 0.5, "ログインが必要です", fontsize=40, ha="center", va="center")
-        ax.axis("off")
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight", facecolor="white")
-        plt.close("all")
-        buf.seek(0)
-        return HttpResponse(buf.getvalue(), content_type="image/png")
-
-    visits_by_month = (
-        Visit.objects
-        .filter(restaurant__user=request.user)
-        .annotate(month=TruncMonth("date"))
-        .exclude(month=None)
-        .values("month")
-        .annotate(count=Count("id"))
-        .order_by("month")
-    )
+        return chart_response("message", {"text": "ログインが必要です", "fontsize": 40})
 
-    if not visits_by_month:
-        fig, ax = plt.subplots(figsize=(6, 3))
-        ax.text(0.5, 0.5, "データがありません", fontsize=20, ha="center", va="center")
-        ax.axis("off")
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight", facecolor="white")
-        plt.close("all")
-        buf.seek(0)
-        return HttpResponse(buf.getvalue(), content_type="image/png")
-
-    months = [f"{v['month'].year}年{v['month'].month}月" for v in visits_by_month]
-    counts = [v["count"] for v in visits_by_month]
-
-    fig, ax = plt.subplots(figsize=(9, 4))
-    x_positions = range(len(months))
-    bars = ax.bar(x_positions, counts, color="#5a8dee", width=0.6)
-
-    ax.set_title("月別訪問数", fontsize=30, fontweight="bold")
-
-    ax.tick_params(axis='x', labelsize=30, width=1.2)
-    ax.tick_params(axis='y', labelsize=30, width=1.2)
-
-    ax.set_xticks(x_positions)
-    ax.set_xticklabels(months, fontsize=30, fontweight="bold")
-
-    ax.set_ylim(0, 20)
-    ax.set_yticks(range(0, 21, 5))
-
-    ax.grid(axis="y", linestyle="--", alpha=0.4)
-    ax.set_facecolor("white")
-    fig.patch.set_facecolor("white")
-
-    for bar in bars:
-        height = bar.get_height()
-        ax.text(
-            bar.get_x() + bar.get_width() / 2,
-            height + 0.4,
-            f"{int(height)}",
-            ha="center",
-            va="bottom",
-            fontsize=30,
-            fontweight="bold",
-            color="#333"
-        )
+    series = visit_stats(request.user)["monthly"]
+    if not series:
+        return chart_response("message", {"text": "データがありません", "fontsize": 20})
 
-    plt.tight_layout()
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight", facecolor="white")
-    plt.close("all")
-    buf.seek(0)
-    return HttpResponse(buf.getvalue(), content_type="image/png")
+    return chart_response("monthly", series)
 
 
 
+@cached_chart("top3_genre")
 def visit_chart_top3_genre(request):
-    import matplotlib.pyplot as plt
-    import io
-    from django.http import HttpResponse
-    from django.db.models import Count
-
-    plt.close("all")
-
-    visits_by_genre = (
-        Visit.objects
-        .filter(restaurant__user=request.user)
-        .values("restaurant__genre")
-        .annotate(count=Count("id"))
-        .order_by("-count")[:3]
-    )
-
-    genres = [v["restaurant__genre"] or "未分類" for v in visits_by_genre]
-    counts = [v["count"] for v in visits_by_genre]
-
-    fig, ax = plt.subplots(figsize=(5, 3))
-    ax.bar(genres, counts, color="orange")
-    for i, v in enumerate(counts):
-        ax.text(i, v + 0.2, str(v), ha="center")
-
-    plt.tight_layout()
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight", facecolor="white")
-    plt.close("all")
-    buf.seek(0)
-    return HttpResponse(buf.getvalue(), content_type="image/png")
+    return chart_response("top3_genre", visit_stats(request.user)["top3_genre"])
 
 
+@cached_chart("genre")
 def visit_chart_genre(request):
-    from django.db.models import Count
-    import matplotlib.pyplot as plt
-    import io
-    from django.http import HttpResponse
-
-    plt.close("all")
-
-    genre_counts = (
-        Visit.objects.filter(restaurant__user=request.user)
-        .values("restaurant__genre")
-        .annotate(count=Count("id"))
-        .order_by("-count")
-    )
+    series = visit_stats(request.user)["genre"]
+    if not series:
+        return chart_response("message", {
+            "text": "データがありません",
+            "fontsize": 16,
+            "figsize": (5, 3),
+            "dpi": 150,
+        })
 
-    if not genre_counts.exists():
-        fig, ax = plt.subplots(figsize=(5, 3))
-        ax.text(
-            0.5, 0.5,
-            "データがありません",
-            ha="center", va="center",
-            fontsize=16, color="black"
-            
-        )
-        ax.set_axis_off()
+    return chart_response("genre", series)
 
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight", facecolor="white", dpi=150)
-        plt.close("all")
-        buf.seek(0)
-        return HttpResponse(buf.getvalue(), content_type="image/png")
 
-    genres = [g["restaurant__genre"] or "未分類" for g in genre_counts]
-    counts = [g["count"] for g in genre_counts]
+@login_required
+@cached_chart("stats")
+def visit_stats_json(request):
+    """マイページのグラフをブラウザ側で描画するための集計データ"""
+    return JsonResponse(visit_stats(request.user))
 
-    fig, ax = plt.subplots(figsize=(5, 3))
-    bars = ax.barh(genres, counts, color="#4a6cf7", alpha=0.85, height=0.5)
-    
-    ax.set_title("")
-    fig.text(0, 0.95, "ジャンル別訪問数", fontsize=19, fontweight="bold", ha="left", va="center")
-    
-    ax.tick_params(axis='y', labelsize=16, length=0)
-    ax.tick_params(axis='x', bottom=False, labelbottom=False)
-    ax.invert_yaxis()
-
-    for i, bar in enumerate(bars):
-        ax.text(bar.get_width() + 0.05, bar.get_y() + bar.get_height() / 2,
-                str(counts[i]), va='center', fontsize=20, fontweight="bold", color="#333")
-
-    ax.set_xlabel("")
-    ax.set_ylabel("")
-    ax.grid(False)
-    for spine in ax.spines.values():
-        spine.set_visible(False)
-
-    plt.subplots_adjust(left=0.2, right=0.95, top=0.9, bottom=0.1)
-
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight", facecolor="white", dpi=150)
-    plt.close("all")
-    buf.seek(0)
-    return HttpResponse(buf.getvalue(), content_type="image/png")
+
+@login_required
+def suggest_words(request):
+    """入力中の文字から補完候補を返す（?type=area&q=しぶ&limit=10）"""
+    word_type = request.GET.get("type")
+    if word_type not in WORD_TYPES:
+        return JsonResponse({"error": "unknown type"}, status=400)
+
+    try:
+        limit = int(request.GET.get("limit", SUGGEST_LIMIT))
+    except ValueError:
+        limit = SUGGEST_LIMIT
+    limit = min(max(limit, 1), SUGGEST_MAX_LIMIT)
+
+    words = suggest(word_type, request.GET.get("q", ""), limit)
+    return JsonResponse({"words": words})
 
 
 @login_required
@@ -0,0 +1,120 @@
+"""静的ファイルの配信（ハッシュ付きの名前・圧縮済みファイル・長期キャッシュ）
+
+本番（DEBUG = False）では collectstatic（manage.py build_assets）で
+  - 中身のハッシュを入れた名前（css/base.3f2a….css）と staticfiles.json を作る
+  - CSS / JS / SVG などは .gz と（brotli が入っていれば）.br も並べて置く
+serve_asset() はそれを Accept-Encoding に合わせて返し、ハッシュ付きの名前には
+1年・immutable のキャッシュヘッダーを付ける（中身が変われば名前が変わるため）。
+Web サーバー側で STATIC_ROOT を直接配信している場合は、そちらの設定が使われる。
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # 任意（無ければ .gz だけ作る）
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt", ".html", ".map")
+# 元の 95% より小さくならないものは圧縮版を置かない
+MIN_COMPRESSION_RATIO = 0.95
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+# ハッシュの無い名前（staticfiles.json に無いもの）は短めにする
+MUTABLE_MAX_AGE = 60 * 10
+
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+def compress(path):
+    """path の隣に .gz / .br を作り、作ったファイルのパスを返す"""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    variants = [(".gz", lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", lambda: brotli.compress(data)))
+
+    written = []
+    for suffix, compressor in variants:
+        compressed = compressor()
+        if len(compressed) >= len(data) * MIN_COMPRESSION_RATIO:
+            continue
+        with open(path + suffix, "wb") as f:
+            f.write(compressed)
+        written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ハッシュ付きの名前で保存し、圧縮できるものは圧縮版も置く"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        for name in set(self.hashed_files.values()):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = self.path(name)
+            # 名前が中身で決まるので、作成済みなら作り直さない
+            if os.path.exists(path + ".gz"):
+                continue
+            compress(path)
+
+
+_immutable_names = None
+
+
+def is_immutable(name):
+    """staticfiles.json に載っているハッシュ付きの名前か"""
+    global _immutable_names
+    if _immutable_names is None:
+        _immutable_names = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+    return name in _immutable_names
+
+
+def serve_asset(request, path):
+    """STATIC_ROOT のファイルを圧縮済みのものがあればそれで返す（本番の urls.py から使う）"""
+    name = posixpath.normpath(path).lstrip("/")
+    if name.startswith("..") or name.endswith((".gz", ".br")):
+        raise Http404
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    accepted = {
+        value.split(";")[0].strip().lower()
+        for value in request.headers.get("Accept-Encoding", "").split(",")
+    }
+    encoding = None
+    for candidate, suffix in ENCODINGS:
+        if candidate in accepted and os.path.isfile(full_path + suffix):
+            encoding = candidate
+            full_path += suffix
+            break
+
+    response = FileResponse(open(full_path, "rb"), content_type=content_type or "application/octet-stream")
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+
+    if is_immutable(name):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=MUTABLE_MAX_AGE)
+    return response
@@ -88,6 +88,43 @@ DATABASES = {
     }
 }
 
+# ★ データベースの性能プロファイル
+# "tuned": WAL・mmap・接続の使い回し（本番向け） / "default": Django の既定のまま
+# PRAGMAS は接続のたびに restaurants.signals で SQLite に適用する
+DATABASE_PROFILES = {
+    "default": {
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "OPTIONS": {},
+        "PRAGMAS": {},
+    },
+    "tuned": {
+        # 接続をリクエストをまたいで使い回す（使う前に生きているか確認）
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # ロック待ちの上限（秒）。すぐに "database is locked" にしない
+            "timeout": 20,
+            # 読んでから書くトランザクションが WAL で待たずに失敗するのを防ぐ
+            "transaction_mode": "IMMEDIATE",
+        },
+        "PRAGMAS": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -32000,       # 約32MB（負の値は KiB 単位）
+            "mmap_size": 268435456,     # 256MB
+            "temp_store": "MEMORY",
+        },
+    },
+}
+DATABASE_PROFILE = "tuned"
+
+DATABASES['default'].update({
+    key: value
+    for key, value in DATABASE_PROFILES[DATABASE_PROFILE].items()
+    if key != "PRAGMAS"
+})
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,6 +176,23 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# ★ 本番は manage.py build_assets（アイコンの WebP 化 + collectstatic）で
+# ハッシュ付きの名前と .gz / .br を作り、savoiry_project.assets.serve_asset で長期キャッシュさせる
+# （DEBUG 中は元の名前のまま runserver が配信する）
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage" if DEBUG
+            else "savoiry_project.assets.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
+# アイコンの WebP の長辺（px）。表示は最大 100px なので高解像度の画面向けに2倍
+ICON_WEBP_SIZE = 200
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -149,8 +203,88 @@ AUTH_USER_MODEL = 'accounts.User'
 # settings.py
 SESSION_COOKIE_AGE = 10800
 
+# ★ キャッシュ（グラフ・サジェスト・ページキャッシュ・カードの断片・セッション）
+# 環境変数 SAVOIRY_CACHE で切り替える。プロセスをまたいで共有するなら file か redis にする
+CACHE_PROFILES = {
+    # プロセスごとのメモリ（開発・テスト用）
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "savoiry",
+        # 既定の 300 件ではカードの断片キャッシュ（1枚1件）がすぐ追い出される
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("SAVOIRY_CACHE_DIR", os.path.join(BASE_DIR, ".cache")),
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    },
+    # Redis 互換のサーバー（Valkey・KeyDB など手元で動かすものでもよい）。redis パッケージが必要
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("SAVOIRY_REDIS_URL", "redis://127.0.0.1:6379/1"),
+    },
+}
+CACHE_PROFILE = os.environ.get("SAVOIRY_CACHE", "locmem")
+
+CACHES = {"default": CACHE_PROFILES[CACHE_PROFILE]}
+
+# locmem はワーカー（プロセス）ごとに別物で、あるワーカーで上げたデータ版数・消したセッションが
+# 他のワーカーに伝わらない。共有できるキャッシュ（file / redis）のときだけ
+#   - セッションをキャッシュから読む（無ければ DB）
+#   - 一覧・検索画面のページキャッシュ（restaurants.page_cache）を使う
+SHARED_CACHE = CACHE_PROFILE != "locmem"
+SESSION_ENGINE = (
+    "django.contrib.sessions.backends.cached_db" if SHARED_CACHE
+    else "django.contrib.sessions.backends.db"
+)
+
+# 一覧・検索画面のページキャッシュの保持期間（秒）。キーにデータ版数が入るので短くなくてよい
+PAGE_CACHE_TIMEOUT = 60 * 10
+
 LOGIN_URL = "accounts:login"
 LOGIN_REDIRECT_URL = reverse_lazy('restaurants:restaurant_search')
 LOGOUT_REDIRECT_URL = "accounts:login"
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# マイページのグラフ描画方法
+# "server": matplotlib で描いたPNGを表示 / "client": 集計JSONを取得してブラウザで描画
+CHART_RENDER_MODE = "server"
+
+# グラフ描画用プロセスプール（0 にするとリクエスト内で描画）
+CHART_RENDER_WORKERS = 2
+# 同時に受け付ける描画の上限（超えた分は 503）
+CHART_RENDER_MAX_QUEUE = 8
+# 1枚あたりの描画待ち時間の上限（秒）
+CHART_RENDER_TIMEOUT = 10
+
+# ★ 訪問写真の取り込み（restaurants.images）
+# 原本の長辺の上限（px）
+VISIT_IMAGE_MAX_EDGE = 2048
+# 縮小版の名前と固定サイズ（幅, 高さ）。card: 一覧・検索のカード / thumb: 詳細のギャラリー
+VISIT_IMAGE_RENDITIONS = {
+    "card": (960, 540),
+    "thumb": (400, 300),
+}
+# 縮小版の形式（書けない形式は飛ばす。JPEG はフォールバック用に必ず作る）
+VISIT_IMAGE_FORMATS = ["avif", "webp"]
+# 参照が無くなったファイルを purge_image_blobs で消すまでの猶予（秒）
+IMAGE_BLOB_PURGE_GRACE = 60 * 60
+
+# ★ 訪問写真のアップロード（restaurants.uploads）。超えたファイルは受信中に読み捨てる
+# 1回の訪問で受け付ける枚数
+VISIT_PHOTO_MAX_FILES = 5
+# 1枚あたりの上限（バイト）
+VISIT_PHOTO_MAX_FILE_SIZE = 15 * 1024 * 1024
+# 1リクエストの合計の上限（バイト）
+VISIT_PHOTO_MAX_REQUEST_SIZE = 50 * 1024 * 1024
+
+# ★ バックグラウンドジョブ（restaurants.jobs / manage.py run_jobs）
+# True にするとワーカーを動かさず、積んだ直後（コミット後）にリクエスト内で実行する（開発用）
+JOB_QUEUE_EAGER = False
+# 失敗したジョブの最大試行回数（超えたら DeadJob へ）
+JOB_MAX_ATTEMPTS = 5
+# 再試行までの待ち時間（秒）。失敗するたびに倍になる
+JOB_RETRY_DELAY = 30
+# 実行中のまま止まったジョブを待ちに戻すまでの時間（秒）
+JOB_STALE_TIMEOUT = 600
@@ -15,10 +15,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from accounts.views import HomeView, TemplateView
 from django.conf import settings
 from django.conf.urls.static import static
+from .assets import serve_asset
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -29,4 +30,9 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+else:
+    # ハッシュ付きの静的ファイルを圧縮版・長期キャッシュで返す（Web サーバーが配信しない場合）
+    urlpatterns += [
+        re_path(rf"^{settings.STATIC_URL.lstrip('/')}(?P<path>.+)$", serve_asset),
+    ]
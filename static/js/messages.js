@@ -0,0 +1,95 @@
+// base.html の window.__sv_messages（Django の messages）をモーダル・トーストで出す
+// ★ テンプレートに埋め込まず静的ファイルにして、ブラウザにキャッシュさせる
+function showModal(content) {
+  const modal = document.createElement("div");
+  modal.classList.add("modal-overlay");
+  modal.innerHTML = `
+    <div class="modal">
+      <p class="modal-title">${content.l1}</p>
+      <p class="modal-message">${content.l2}</p>
+      ${content.buttonText ? `<button class="modal-btn">${content.buttonText}</button>` : ""}
+    </div>
+  `;
+  document.body.appendChild(modal);
+
+  const button = modal.querySelector(".modal-btn");
+  if (button && content.action) {
+    button.addEventListener("click", content.action);
+  }
+
+  modal.addEventListener("click", (e) => {
+    if (e.target === modal) modal.remove();
+  });
+}
+
+(function () {
+  const map = {
+    email_changed: {
+      l1: "メールアドレスを変更しました",
+      l2: "次回ログイン時は新しいメールアドレスをご使用ください",
+      buttonText: "OK",
+      action: () => document.querySelector(".modal-overlay").remove(),
+    },
+    password_changed: {
+      l1: "パスワードを変更しました",
+      l2: "次回ログイン時は新しいパスワードをご使用ください",
+      buttonText: "OK",
+      action: () => document.querySelector(".modal-overlay").remove(),
+    },
+    login_first: {
+      l1: "Savoiryへようこそ！！<br>アカウント登録が完了しました。",
+      l2: "✓ 気になるお店を登録する<br>✓ 実際にお店を訪問する<br>✓ 行った感想を記録する",
+      buttonText: "OK",
+      action: () => window.location.href = "/savoiry/restaurants/search/",
+    },
+    restaurant_added: {
+      l1: "✓ お店を登録しました！",
+      l2: "・『気になる』一覧で確認できます",
+      buttonText: "閉じる",
+      action: () => document.querySelector(".modal-overlay").remove(),
+    },
+    went_added: {
+      l1: "『行った』お店が増えました！",
+      l2: "行った一覧ページで確認できます。",
+      buttonText: "閉じる",
+      action: () => window.location.href = "/savoiry/restaurants/went/",
+    },
+  };
+
+  // トーストに出さないもの（モーダルで出すもの・各画面のフォームに出すもの）
+  const notToasted = [
+    "login_first", "email_changed", "password_changed", "restaurant_added",
+    "メールアドレス変更に失敗しました", "パスワード変更に失敗しました",
+    "went_added", "アカウント登録に失敗しました。",
+  ];
+
+  const messages = window.__sv_messages || [];
+
+  for (const key of messages) {
+    if (map[key]) {
+      showModal(map[key]);
+      break;
+    }
+  }
+
+  const toasts = messages.filter(msg => !notToasted.includes(msg));
+  if (!toasts.length) return;
+
+  const toastContainer = document.createElement("div");
+  toastContainer.id = "toast-container";
+  document.body.appendChild(toastContainer);
+
+  for (const msg of toasts) {
+    const toast = document.createElement("div");
+    toast.className = "toast";
+    toast.textContent = msg;
+    toastContainer.appendChild(toast);
+    setTimeout(() => {
+      toast.classList.add("show");
+    }, 100);
+    setTimeout(() => {
+      toast.classList.remove("show");
+      setTimeout(() => toast.remove(), 300);
+    }, 3000);
+  }
+})();